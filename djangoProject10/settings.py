@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv  # Добавлено для поддержки .env
 
+from weightloss.database import database_settings
+
 # Загрузка переменных окружения из .env, если он есть
 load_dotenv()
 
@@ -45,13 +47,13 @@ INSTALLED_APPS = [
     'django.contrib.sitemaps',
     'weightloss',
     'django_ckeditor_5',
-    'debug_toolbar',
     'corsheaders',
     'crispy_forms',
     'crispy_bootstrap4',
 ]
 
 MIDDLEWARE = [
+    'weightloss.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,9 +63,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Debug Toolbar подключается только в режиме отладки, в рабочем режиме
+# запросы замеряет weightloss.profiling.ProfilingMiddleware
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 # Debug Toolbar settings
 INTERNAL_IPS = [
     '127.0.0.1',
@@ -85,6 +92,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'weightloss.views.notifications_processor',
                 'weightloss.context_processors.seo_processor',
+                'weightloss.context_processors.site_stats_processor',
             ],
         },
     },
@@ -96,11 +104,166 @@ WSGI_APPLICATION = 'djangoProject10.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Базу выбирает DATABASE_URL (по умолчанию SQLite в BASE_DIR / 'db.sqlite3'),
+# пул соединений и PRAGMA SQLite — см. weightloss/database.py
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': database_settings(BASE_DIR),
+}
+
+
+# Cache
+# Кэш общий для всех процессов сервера: версии разделов кэша страниц, индекс
+# продуктов и шина уведомлений должны видеть изменения, сделанные в другом
+# процессе Passenger или командой manage.py. По умолчанию это файловый кэш
+# в DJANGO_CACHE_DIR (BASE_DIR / '.cache'), для нескольких серверов — Redis.
+# Кэш в памяти процесса (DJANGO_CACHE_DIR=locmem) годится только для разработки
+# с одним процессом.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHE_DIR = os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / '.cache'))
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif CACHE_DIR == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+            # По умолчанию 300 записей — меньше, чем страниц с пагинацией
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Общий ли кэш для процессов сервера (см. weightloss/page_cache.py). Счетчик
+# непрочитанных уведомлений и кэш страниц рассчитаны на общий кэш: с кэшем в
+# памяти процесса счетчик хранится 30 секунд и после изменений из других
+# процессов (process_notifications) может отставать на это время.
+SHARED_CACHE = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# Ключи повторных просмотров (weightloss/view_counter.py): много коротких записей,
+# которые не должны вытеснять страницы из общего кэша и писать файл на каждый
+# просмотр. Без Redis повторы отсекаются в памяти каждого процесса.
+if REDIS_URL:
+    CACHES['views'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'views',
     }
+else:
+    CACHES['views'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'views',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+
+# Время жизни кэша страниц в секундах. Записи устаревают раньше,
+# как только сигналы увеличивают версию раздела (см. weightloss/page_cache.py)
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Счетчик просмотров (см. weightloss/view_counter.py): просмотры копятся в памяти
+# процесса и записываются в базу раз в VIEW_COUNTER_FLUSH_INTERVAL секунд
+# или когда в буфере набралось VIEW_COUNTER_MAX_PENDING объектов.
+VIEW_COUNTER_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL', 30))
+VIEW_COUNTER_MAX_PENDING = 500
+# Повторные просмотры того же посетителя в течение этого срока не учитываются, секунды
+VIEW_COUNTER_DEDUP_TIMEOUT = 60 * 60 * 24
+
+
+# Notifications
+# Уведомления создаются командой process_notifications из очереди событий
+# (см. weightloss/notifications.py). При NOTIFICATIONS_EAGER=1 очередь
+# разбирается сразу после запроса — удобно при разработке без отдельного процесса.
+
+NOTIFICATIONS_EAGER = os.environ.get('NOTIFICATIONS_EAGER', '0') == '1'
+
+# Доставка уведомлений в браузер (см. weightloss/notification_bus.py).
+# InProcessBus работает в пределах одного процесса; чтобы события доходили из
+# process_notifications и других процессов сервера, нужен общий кэш и CacheBus.
+NOTIFICATION_BUS = os.environ.get(
+    'NOTIFICATION_BUS',
+    'weightloss.notification_bus.CacheBus' if SHARED_CACHE else 'weightloss.notification_bus.InProcessBus',
+)
+NOTIFICATION_BUS_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_BUS_POLL_INTERVAL', 1))
+# Интервал комментариев-пингов в потоке SSE, секунд
+NOTIFICATION_STREAM_HEARTBEAT = 25
+# Максимальная длительность одного соединения SSE, секунд
+NOTIFICATION_STREAM_MAX_AGE = 600
+# Сколько long-poll запрос ждет событий. Под Passenger ожидающий запрос занимает
+# процесс целиком, поэтому по умолчанию ожидание включено только с Redis;
+# при 0 клиент просто опрашивает счетчик раз в NOTIFICATION_POLL_INTERVAL секунд.
+NOTIFICATION_LONG_POLL_TIMEOUT = int(os.environ.get('NOTIFICATION_LONG_POLL_TIMEOUT', 25 if REDIS_URL else 0))
+NOTIFICATION_POLL_INTERVAL = 60
+
+
+# Profiling
+# Выборочные замеры запросов (см. weightloss/profiling.py). Отчет для персонала:
+# /management/profiling/, JSON: /api/profiling/.
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') == '1'
+# Доля запросов, которые замеряются (0.05 — каждый двадцатый)
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.05))
+# Сколько последних замеров хранит каждый процесс
+PROFILING_BUFFER_SIZE = 2000
+# Сколько самых медленных SQL-запросов сохраняется в замере
+PROFILING_SLOW_QUERIES = 5
+# Отчеты cProfile по заголовку X-Profile: сколько хранить, сколько строк
+# pstats выводить и сколько секунд действует подписанный токен
+PROFILING_CAPTURES = 20
+PROFILING_STATS_LINES = 60
+PROFILING_TOKEN_MAX_AGE = 60 * 60 * 24
+
+
+# Logging
+# Модули приложения пишут в логгеры weightloss.* (см. weightloss/log.py).
+# LOG_LEVEL=DEBUG включает отладочные записи, LOG_FORMAT=json — вывод
+# по одному JSON-объекту в строке для сборщиков журналов.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+        'json': {
+            '()': 'weightloss.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'text',
+        },
+    },
+    'loggers': {
+        'weightloss': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        # Ошибки запросов (в том числе 500) попадают в тот же вывод и без DEBUG
+        'django': {
+            'handlers': ['console'],
+            'level': 'INFO' if DEBUG else 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -148,6 +311,24 @@ WHITENOISE_MAX_AGE = 31536000  # 1 год в секундах
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загрузки сохраняются под именами с хэшем содержимого (weightloss/storage.py)
+DEFAULT_FILE_STORAGE = 'weightloss.storage.HashedMediaStorage'
+
+# Отдача медиафайлов (weightloss/media.py). MEDIA_ACCEL=x-accel передает
+# файл nginx через внутренний location MEDIA_ACCEL_PREFIX, x-sendfile —
+# Apache (mod_xsendfile) или lighttpd; без значения файл отдает Django
+MEDIA_ACCEL = os.environ.get('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Срок кэширования файлов без хэша в имени (загруженных раньше), секунды
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 60 * 60))
+MEDIA_STREAM_BLOCK_SIZE = 256 * 1024
+
+# Карта сайта (weightloss/sitemaps.py): готовые сжатые файлы, адресов на страницу
+# (протокол допускает до 50 000) и срок кэширования ответа, секунды
+SITEMAP_ROOT = os.environ.get('SITEMAP_ROOT', BASE_DIR / 'sitemaps')
+SITEMAP_PAGE_SIZE = int(os.environ.get('SITEMAP_PAGE_SIZE', 10000))
+SITEMAP_MAX_AGE = int(os.environ.get('SITEMAP_MAX_AGE', 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -165,7 +346,7 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # В разр
 # CKEditor Configuration
 CKEDITOR_5_UPLOAD_PATH = "uploads/"
 CKEDITOR_5_URL_PREFIX = "media/uploads/"
-CKEDITOR_5_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+CKEDITOR_5_FILE_STORAGE = "weightloss.storage.HashedMediaStorage"
 CKEDITOR_5_CONFIGS = {
     'default': {
         'toolbar': ['heading', '|', 'bold', 'italic', 'link', 'bulletedList', 'numberedList', 'blockQuote', 'imageUpload'],
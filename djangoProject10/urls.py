@@ -14,26 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.contrib.sitemaps.views import sitemap
-from djangoProject10.sitemaps import (
-    StaticViewSitemap, BlogPostSitemap, RecipeSitemap, CategorySitemap,
-    ChallengeSitemap, ForumCategorySitemap, ForumTopicSitemap
-)
-
-# Определение карт сайта
-sitemaps = {
-    'static': StaticViewSitemap,
-    'posts': BlogPostSitemap,
-    'recipes': RecipeSitemap,
-    'categories': CategorySitemap,
-    'challenges': ChallengeSitemap,
-    'forum_categories': ForumCategorySitemap,
-    'forum_topics': ForumTopicSitemap,
-}
+from weightloss.media import serve_media
+from weightloss.sitemaps import serve_sitemap
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -41,10 +29,14 @@ urlpatterns = [
     path('ckeditor5/', include('django_ckeditor_5.urls')),
     
     # SEO-маршруты
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', serve_sitemap, name='sitemap'),
+    re_path(r'^sitemap-(?P<section>[a-z_]+)-(?P<page>[1-9]\d*)\.xml$', serve_sitemap, name='sitemap_section'),
 
 ]
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Загруженные файлы: кэширование, условные запросы, Range и передача веб-серверу
+urlpatterns.append(
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media')
+)
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 if settings.DEBUG:
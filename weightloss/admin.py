@@ -109,10 +109,26 @@ class NotificationAdmin(admin.ModelAdmin):
     actions = ['mark_as_read']
     
     def mark_as_read(self, request, queryset):
+        recipients = set(queryset.values_list('recipient_id', flat=True))
         updated = queryset.update(is_read=True)
+        Notification.reset_unread(*recipients)
         self.message_user(request, f'{updated} уведомлений отмечено как прочитанные.')
     
     mark_as_read.short_description = "Отметить выбранные уведомления как прочитанные"
+    
+    # Изменения из админки меняют число непрочитанных, счетчики в кэше сбрасываются
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Notification.reset_unread(obj.recipient_id)
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Notification.reset_unread(obj.recipient_id)
+    
+    def delete_queryset(self, request, queryset):
+        recipients = set(queryset.values_list('recipient_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Notification.reset_unread(*recipients)
 
 @admin.register(VIPPost)
 class VIPPostAdmin(admin.ModelAdmin):
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class WeightlossConfig(AppConfig):
@@ -8,5 +9,9 @@ class WeightlossConfig(AppConfig):
     def ready(self):
         """
         Импортирует обработчики сигналов при запуске приложения
+        и подключает настройку новых соединений с базой
         """
         import weightloss.signals
+        from weightloss.database import configure_connection
+
+        connection_created.connect(configure_connection, dispatch_uid='weightloss.configure_connection')
@@ -0,0 +1,424 @@
+"""
+Замер запросов к базе на всех именованных маршрутах приложения.
+
+seed_fixtures наполняет (тестовую) базу воспроизводимым набором данных:
+тысячи статей, комментариев, сообщений форума и продуктов, ветки
+комментариев с несколькими уровнями вложенности. Данные пишутся
+bulk_create, поэтому сигналы не срабатывают — счетчики, итоги планов
+питания и поисковый индекс после этого пересчитываются целиком.
+
+run_benchmark обходит маршруты из weightloss/urls.py тестовым клиентом
+от имени пользователя с правами персонала и VIP-статусом и для каждого
+записывает код ответа, число запросов, время в базе, время рендеринга
+шаблона и размер ответа. Кэш перед каждым запросом очищается, так что
+замер показывает холодный путь страницы.
+
+Число запросов не зависит от времени выполнения и объема данных
+(если в представлении нет N+1), поэтому именно оно сравнивается
+с бюджетами из BUDGETS_PATH; время и размер записываются для справки.
+Замер страницы с ошибкой ничего не говорит о ее запросах, поэтому
+маршрут с кодом ответа, отличным от ожидаемого (ROUTE_STATUS, по
+умолчанию 200), считается сбоем прогона, и бюджеты не записываются.
+"""
+import json
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.template.backends.django import Template
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from .profiling import QueryRecorder
+
+BUDGETS_PATH = Path(__file__).resolve().parent / 'benchmarks' / 'query_budgets.json'
+
+# Маршруты, которые нельзя вызывать тестовым клиентом в общем проходе
+SKIPPED_ROUTES = {
+    'logout': 'завершает сессию клиента',
+}
+
+WORDS = (
+    'питание', 'белок', 'калории', 'тренировка', 'похудение', 'завтрак', 'овощи',
+    'рецепт', 'вес', 'здоровье', 'сон', 'вода', 'бег', 'йога', 'сахар', 'клетчатка',
+)
+
+
+def _text(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+class Fixtures:
+    """Объекты, на которых строятся адреса маршрутов с параметрами"""
+
+    def __init__(self, **objects):
+        self.__dict__.update(objects)
+
+
+def _bulk_thread(model, owner_field, owners, authors, total, rng, hot=None, hot_share=0.2):
+    """
+    Создает total узлов веток для объектов owners слоями по глубине:
+    у узла нового слоя родитель выбирается среди уже созданных узлов
+    того же объекта. Часть узлов (hot_share) достается объекту hot.
+    """
+    layers = [0.5, 0.25, 0.15, 0.1]
+    nodes = {}
+    created = 0
+    for depth, share in enumerate(layers):
+        batch = []
+        for _ in range(int(total * share)):
+            owner = hot if hot is not None and rng.random() < hot_share else rng.choice(owners)
+            parents = nodes.get(owner.pk)
+            if depth and not parents:
+                continue
+            parent = rng.choice(parents) if depth else None
+            batch.append(model(
+                **{owner_field: owner},
+                author=rng.choice(authors),
+                parent=parent,
+                depth=parent.depth + 1 if parent else 0,
+                content=_text(rng),
+            ))
+        for node in model.objects.bulk_create(batch):
+            nodes.setdefault(getattr(node, f'{owner_field}_id'), []).append(node)
+        created += len(batch)
+    return created
+
+
+def seed_fixtures(scale=1, seed=0):
+    """
+    Наполняет базу данными для замеров. scale=1 — около двух тысяч статей,
+    шести тысяч комментариев, четырех тысяч сообщений форума и полутора
+    тысяч продуктов.
+
+    Возвращает:
+        Fixtures с представительными объектами для параметров маршрутов
+    """
+    from .counters import rebuild_counters
+    from .meal_plans import build_item, create_week
+    from .models import (
+        Category, Challenge, Comment, Food, FoodCategory, ForumCategory, ForumPost,
+        ForumTopic, MealItem, MealPlan, Notification, NutritionGoal, Post, Recipe,
+        RecipeComment, UserProfile, VIPComment, VIPPost,
+    )
+    from .nutrition import rebuild_plan_totals
+    from .related import rebuild_related_posts, rebuild_related_recipes
+    from .search import rebuild_index
+
+    rng = random.Random(seed)
+
+    user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    users = [user] + User.objects.bulk_create([
+        User(username=f'bench-user-{i}', email=f'bench-user-{i}@example.com')
+        for i in range(30 * scale)
+    ])
+    UserProfile.objects.bulk_create([
+        UserProfile(user=member, is_vip=member is user, current_weight=80, goal_weight=70)
+        for member in users
+    ])
+
+    categories = Category.objects.bulk_create([
+        Category(name=f'Категория {i}', slug=f'bench-category-{i}') for i in range(8)
+    ])
+    posts = Post.objects.bulk_create([
+        Post(
+            title=_text(rng, 5), slug=f'bench-post-{i}', author=rng.choice(users),
+            category=rng.choice(categories), content=_text(rng, 120),
+            status='published' if i % 10 else rng.choice(('draft', 'pending')),
+            is_featured=i % 50 == 0,
+        ) for i in range(2000 * scale)
+    ])
+    post = posts[1]
+    Post.objects.filter(pk=post.pk).update(author=user)
+    _bulk_thread(Comment, 'post', posts, users, 6000 * scale, rng, hot=post)
+
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            title=_text(rng, 4), slug=f'bench-recipe-{i}', author=rng.choice(users),
+            image='recipes/benchmark.jpg', calories=rng.randint(100, 800),
+            protein=rng.randint(5, 50), carbs=rng.randint(5, 90), fat=rng.randint(2, 40),
+            preparation_time=rng.randint(5, 90), ingredients=_text(rng, 30),
+            instructions=_text(rng, 60), status='published' if i % 8 else 'draft',
+        ) for i in range(300 * scale)
+    ])
+    recipe = recipes[1]
+    Recipe.objects.filter(pk=recipe.pk).update(author=user)
+    _bulk_thread(RecipeComment, 'recipe', recipes, users, 1000 * scale, rng, hot=recipe)
+
+    challenges = Challenge.objects.bulk_create([
+        Challenge(title=_text(rng, 3), slug=f'bench-challenge-{i}', description=_text(rng, 40),
+                  duration=rng.choice((7, 14, 30)))
+        for i in range(20)
+    ])
+
+    forum_categories = ForumCategory.objects.bulk_create([
+        ForumCategory(name=f'Раздел {i}', slug=f'bench-forum-{i}', order=i) for i in range(6)
+    ])
+    topics = ForumTopic.objects.bulk_create([
+        ForumTopic(
+            title=_text(rng, 5), slug=f'bench-topic-{i}', category=rng.choice(forum_categories),
+            author=rng.choice(users), content=_text(rng, 60),
+        ) for i in range(400 * scale)
+    ])
+    topic = topics[1]
+    _bulk_thread(ForumPost, 'topic', topics, users, 4000 * scale, rng, hot=topic)
+
+    vip_post = VIPPost.objects.create(title='VIP статья', slug='bench-vip-post', content=_text(rng, 80), author=user)
+    _bulk_thread(VIPComment, 'post', [vip_post], users, 100, rng)
+
+    food_categories = FoodCategory.objects.bulk_create([
+        FoodCategory(name=name, slug=f'bench-food-{i}', order=i)
+        for i, name in enumerate(('Мясо и птица', 'Рыба и морепродукты', 'Крупы и злаки', 'Овощи',
+                                  'Фрукты и ягоды', 'Молочные продукты', 'Орехи и семена', 'Напитки'))
+    ])
+    foods = Food.objects.bulk_create([
+        Food(
+            name=f'{_text(rng, 2)} {i}', category=rng.choice(food_categories),
+            calories=rng.randint(20, 600), protein=rng.uniform(0, 30),
+            fats=rng.uniform(0, 30), carbs=rng.uniform(0, 70),
+            user=user if i % 100 == 0 else None, is_custom=i % 100 == 0,
+        ) for i in range(1500 * scale)
+    ])
+    food = next(item for item in foods if item.user_id == user.pk)
+
+    goal = NutritionGoal(user=user, gender='male', age=30, height=180, weight=80,
+                         activity_level='moderate', goal='lose_slow')
+    goal.save()
+    plan = MealPlan.objects.create(user=user, name='План для замеров', nutrition_goal=goal)
+    meals = create_week(plan)
+    MealItem.objects.bulk_create([
+        build_item(meal.pk, rng.choice(foods), rng.choice((50, 100, 150)))
+        for meal in meals
+        for _ in range(3)
+    ])
+    meal = meals[0]
+    meal_item = meal.meal_items.first()
+
+    notifications = Notification.objects.bulk_create([
+        Notification(recipient=user, sender=rng.choice(users), notification_type='comment',
+                     title='Новый комментарий', message=_text(rng, 10), is_read=i % 3 == 0,
+                     url=post.get_absolute_url())
+        for i in range(200)
+    ])
+
+    rebuild_counters()
+    rebuild_plan_totals()
+    rebuild_index()
+    rebuild_related_recipes()
+    rebuild_related_posts()
+
+    return Fixtures(
+        user=user, post=post, comment=post.comments.filter(parent=None).first(),
+        category=post.category, recipe=recipe,
+        recipe_comment=recipe.recipe_comments.filter(parent=None).first(),
+        challenge=challenges[0], forum_category=topic.category, topic=topic,
+        forum_post=topic.forum_posts.filter(parent=None).first(), vip_post=vip_post,
+        vip_comment=vip_post.comments.filter(parent=None).first(), food=food, goal=goal,
+        plan=plan, meal=meal, meal_item=meal_item, notification=notifications[-1],
+    )
+
+
+# Параметры маршрутов: имя маршрута -> функция, строящая kwargs по Fixtures
+ROUTE_KWARGS = {
+    'edit_post': lambda f: {'slug': f.post.slug},
+    'post_detail': lambda f: {'slug': f.post.slug},
+    'comment_reply': lambda f: {'slug': f.post.slug, 'comment_id': f.comment.pk},
+    'category_detail': lambda f: {'slug': f.category.slug},
+    'nutrition_goal_detail': lambda f: {'pk': f.goal.pk},
+    'nutrition_goal_edit': lambda f: {'pk': f.goal.pk},
+    'nutrition_goal_delete': lambda f: {'pk': f.goal.pk},
+    'meal_plan_detail': lambda f: {'pk': f.plan.pk},
+    'meal_plan_edit': lambda f: {'pk': f.plan.pk},
+    'meal_plan_delete': lambda f: {'pk': f.plan.pk},
+    'meal_create': lambda f: {'plan_id': f.plan.pk},
+    'meal_plan_auto_fill': lambda f: {'meal_plan_id': f.plan.pk},
+    'meal_edit': lambda f: {'pk': f.meal.pk},
+    'meal_delete': lambda f: {'pk': f.meal.pk},
+    'meal_item_create': lambda f: {'meal_id': f.meal.pk},
+    'meal_item_edit': lambda f: {'pk': f.meal_item.pk},
+    'meal_item_delete': lambda f: {'pk': f.meal_item.pk},
+    'food_edit': lambda f: {'pk': f.food.pk},
+    'food_delete': lambda f: {'pk': f.food.pk},
+    'vip_post_update': lambda f: {'slug': f.vip_post.slug},
+    'vip_post_delete': lambda f: {'slug': f.vip_post.slug},
+    'vip_detail': lambda f: {'slug': f.vip_post.slug},
+    'vip_comment_reply': lambda f: {'slug': f.vip_post.slug, 'comment_id': f.vip_comment.pk},
+    'vip_comment_reply_form': lambda f: {'slug': f.vip_post.slug, 'comment_id': f.vip_comment.pk},
+    'edit_recipe': lambda f: {'slug': f.recipe.slug},
+    'delete_recipe': lambda f: {'slug': f.recipe.slug},
+    'admin_recipe_update': lambda f: {'slug': f.recipe.slug},
+    'recipe_comment_reply': lambda f: {'slug': f.recipe.slug, 'comment_id': f.recipe_comment.pk},
+    'recipe_detail': lambda f: {'slug': f.recipe.slug},
+    'challenge_detail': lambda f: {'slug': f.challenge.slug},
+    'user_profile': lambda f: {'username': f.user.username},
+    'create_topic_in_category': lambda f: {'category_slug': f.forum_category.slug},
+    'forum_category': lambda f: {'slug': f.forum_category.slug},
+    'forum_topic_detail': lambda f: {'category_slug': f.forum_category.slug, 'slug': f.topic.slug},
+    'create_post_reply': lambda f: {'category_slug': f.forum_category.slug, 'topic_slug': f.topic.slug},
+    'forum_post_reply': lambda f: {'post_id': f.forum_post.pk},
+    'forum_post_delete': lambda f: {'post_id': f.forum_post.pk},
+    'password_reset_confirm': lambda f: {'uidb64': 'MQ', 'token': 'set-password'},
+    'mark_notification_read': lambda f: {'pk': f.notification.pk},
+}
+
+# Строка запроса для маршрутов, которым без нее нечего делать
+ROUTE_QUERY = {
+    'search_results': '?q=питание',
+    'forum_search': '?q=питание',
+    'food_search_api': '?q=калории',
+    'food_list': '?search=калории',
+}
+
+# Ожидаемый код ответа на GET, если он не 200
+ROUTE_STATUS = {
+    # Принимают только POST
+    'nutrition_calculate_api': 405,
+    'food_create_api': 405,
+    'vip_comment_reply': 405,
+    'forum_post_reply': 405,
+    'forum_post_delete': 405,
+    # Выполняют действие и перенаправляют обратно
+    'meal_plan_auto_fill': 302,
+    'mark_notification_read': 302,
+    'mark_all_notifications_read': 302,
+    # Без ASGI поток SSE не открывается, клиент переходит на long-poll
+    'api_notifications_stream': 204,
+}
+
+
+def named_routes():
+    """Имена маршрутов weightloss/urls.py в порядке объявления, без повторов"""
+    from . import urls
+
+    names = []
+    for pattern in urls.urlpatterns:
+        if isinstance(pattern, URLPattern) and pattern.name and pattern.name not in names:
+            names.append(pattern.name)
+    return names
+
+
+@contextmanager
+def render_timer():
+    """
+    Считает время рендеринга шаблонов верхнего уровня. Вложенные вызовы
+    (include, виджеты форм) уже входят во время внешнего шаблона.
+    """
+    timings = []
+    depth = [0]
+    original = Template.render
+
+    def timed_render(self, *args, **kwargs):
+        depth[0] += 1
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            depth[0] -= 1
+            if not depth[0]:
+                timings.append(time.perf_counter() - started)
+
+    Template.render = timed_render
+    try:
+        yield timings
+    finally:
+        Template.render = original
+
+
+def measure(client, url):
+    """Выполняет GET-запрос и возвращает метрики ответа"""
+    cache.clear()
+    queries = QueryRecorder()
+    with connection.execute_wrapper(queries), render_timer() as renders:
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+    if response.streaming:
+        size = None
+    else:
+        size = len(response.content)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'queries': queries.count,
+        'db_ms': round(queries.seconds * 1000, 2),
+        'render_ms': round(sum(renders) * 1000, 2),
+        'time_ms': round(elapsed * 1000, 2),
+        'size': size,
+    }
+
+
+def run_benchmark(fixtures, routes=None):
+    """
+    Замеряет маршруты routes (по умолчанию все именованные).
+
+    Возвращает:
+        Словарь {имя маршрута: метрики} и словарь {имя маршрута: причина пропуска}
+    """
+    # Ошибки представлений не прерывают замер, маршрут получает код 500
+    client = Client(raise_request_exception=False)
+    client.force_login(fixtures.user)
+    results, skipped = {}, {}
+    for name in routes or named_routes():
+        if name in SKIPPED_ROUTES:
+            skipped[name] = SKIPPED_ROUTES[name]
+            continue
+        kwargs = ROUTE_KWARGS[name](fixtures) if name in ROUTE_KWARGS else {}
+        url = reverse(name, kwargs=kwargs) + ROUTE_QUERY.get(name, '')
+        results[name] = measure(client, url)
+    return results, skipped
+
+
+def load_budgets(path=BUDGETS_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open(encoding='utf-8') as budgets_file:
+        return json.load(budgets_file)
+
+
+def save_budgets(results, path=BUDGETS_PATH):
+    """Записывает текущее число запросов каждого маршрута как его бюджет"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    budgets = {name: {'queries': metrics['queries']} for name, metrics in sorted(results.items())}
+    with path.open('w', encoding='utf-8') as budgets_file:
+        json.dump(budgets, budgets_file, ensure_ascii=False, indent=2)
+        budgets_file.write('\n')
+
+
+def check_statuses(results):
+    """
+    Маршруты, ответившие не тем кодом, что ожидается.
+
+    Возвращает:
+        Список кортежей (маршрут, код ответа, ожидаемый код)
+    """
+    return [
+        (name, metrics['status'], ROUTE_STATUS.get(name, 200))
+        for name, metrics in results.items()
+        if metrics['status'] != ROUTE_STATUS.get(name, 200)
+    ]
+
+
+def compare(results, budgets):
+    """
+    Сравнивает результаты с бюджетами.
+
+    Возвращает:
+        Кортеж списков (превышения, улучшения, маршруты без бюджета);
+        превышения и улучшения — кортежи (маршрут, запросов, бюджет)
+    """
+    regressions, improvements, unbudgeted = [], [], []
+    for name, metrics in results.items():
+        budget = budgets.get(name, {}).get('queries')
+        if budget is None:
+            unbudgeted.append(name)
+        elif metrics['queries'] > budget:
+            regressions.append((name, metrics['queries'], budget))
+        elif metrics['queries'] < budget:
+            improvements.append((name, metrics['queries'], budget))
+    return regressions, improvements, unbudgeted
@@ -0,0 +1,100 @@
+"""
+Пересчет денормализованных счетчиков (комментарии, темы, сообщения форума).
+
+В обычном режиме счетчики поддерживаются сигналами из signals.py;
+функции этого модуля пересчитывают их целиком одним запросом на таблицу
+и используются командой rebuild_counters и миграцией, добавившей поля.
+"""
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .threads import reply_counts
+
+
+def count_subquery(queryset, field):
+    """Подзапрос COUNT(*) по связанным строкам, сгруппированным по field"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _max_subquery(queryset, field, column):
+    """Подзапрос MAX(column) по связанным строкам, сгруппированным по field"""
+    return Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(latest=Max(column))
+        .values('latest')
+    )
+
+
+def rebuild_content_counters(apps=global_apps):
+    """Пересчитывает счетчики комментариев статей и рецептов и статей в категориях"""
+    Post = apps.get_model('weightloss', 'Post')
+    Recipe = apps.get_model('weightloss', 'Recipe')
+    Category = apps.get_model('weightloss', 'Category')
+    Comment = apps.get_model('weightloss', 'Comment')
+    RecipeComment = apps.get_model('weightloss', 'RecipeComment')
+
+    Post.objects.update(comments_total=count_subquery(Comment.objects.all(), 'post'))
+    Recipe.objects.update(comments_total=count_subquery(RecipeComment.objects.all(), 'recipe'))
+    Category.objects.update(
+        published_total=count_subquery(Post.objects.filter(status='published'), 'category')
+    )
+
+
+def rebuild_forum_counters(apps=global_apps, batch_size=500):
+    """Пересчитывает счетчики и дату последней активности тем и категорий форума"""
+    ForumCategory = apps.get_model('weightloss', 'ForumCategory')
+    ForumTopic = apps.get_model('weightloss', 'ForumTopic')
+    ForumPost = apps.get_model('weightloss', 'ForumPost')
+
+    latest = ForumPost.objects.filter(topic=OuterRef('pk')).order_by('-created_on', '-pk')
+    ForumTopic.objects.update(
+        posts_total=count_subquery(ForumPost.objects.all(), 'topic'),
+        latest_post=Subquery(latest.values('pk')[:1]),
+        last_post_on=Subquery(latest.values('created_on')[:1]),
+    )
+
+    ForumCategory.objects.update(
+        topics_total=count_subquery(ForumTopic.objects.all(), 'category')
+    )
+    # Последняя активность — самая поздняя из дат создания тем и их последних сообщений
+    last_topic_on = _max_subquery(ForumTopic.objects.all(), 'category', 'created_on')
+    last_post_on = _max_subquery(ForumTopic.objects.all(), 'category', 'last_post_on')
+    ForumCategory.objects.update(
+        last_activity_on=Greatest(Coalesce(last_post_on, last_topic_on), Coalesce(last_topic_on, last_post_on))
+    )
+
+    # Количество ответов на каждый пост считаем в памяти по веткам тем
+    rows_by_topic = {}
+    for pk, parent_id, topic_id, replies_total in ForumPost.objects.values_list(
+        'id', 'parent_id', 'topic_id', 'replies_total'
+    ).iterator():
+        rows_by_topic.setdefault(topic_id, []).append((pk, parent_id, replies_total))
+
+    changed = []
+    for rows in rows_by_topic.values():
+        counts = reply_counts((pk, parent_id) for pk, parent_id, _ in rows)
+        for pk, _, stored in rows:
+            if counts[pk] != stored:
+                changed.append(ForumPost(pk=pk, replies_total=counts[pk]))
+    ForumPost.objects.bulk_update(changed, ['replies_total'], batch_size=batch_size)
+
+
+def rebuild_counters(apps=global_apps):
+    """Пересчитывает все денормализованные счетчики в одной транзакции"""
+    with transaction.atomic():
+        rebuild_content_counters(apps)
+        rebuild_forum_counters(apps)
@@ -0,0 +1,291 @@
+"""
+Индекс каталога продуктов в памяти процесса.
+
+Каталог целиком загружается одним запросом в компактные колонки (array)
+и используется для автодополнения, списка продуктов и данных для форм
+без обращений к ORM. Поиск по подстроке идет по триграммному индексу
+названий (в том числе транслитерированных), при отсутствии точных
+совпадений подбираются похожие названия — это прощает опечатки.
+
+Общий каталог и пользовательские продукты хранятся вместе; каждому
+пользователю видны общие продукты и только его собственные.
+
+Индекс перестраивается, когда меняется версия раздела 'foods' в кэше
+(ее обновляют сигналы при сохранении и удалении Food и FoodCategory).
+Другие процессы сервера видят изменение, только если кэш общий
+(SHARED_CACHE, по умолчанию файловый); с кэшем в памяти процесса индекс
+дополнительно перестраивается раз в LOCAL_INDEX_MAX_AGE секунд.
+"""
+import json
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from unidecode import unidecode
+
+from .page_cache import get_section_versions
+
+# Минимальная доля общих триграмм для нечеткого совпадения
+FUZZY_THRESHOLD = 0.5
+
+# Срок жизни индекса, если версии разделов не общие для процессов, секунды
+LOCAL_INDEX_MAX_AGE = 60
+
+# Владелец пользовательского продукта без пользователя: не виден никому
+NO_OWNER = -1
+
+
+def normalize(value):
+    return value.lower().replace('ё', 'е').strip()
+
+
+def trigrams(value):
+    padded = f'  {value} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def inner_trigrams(value):
+    """
+    Триграммы без пробелов по краям: только они гарантированно есть
+    у названия, содержащего value в середине слова
+    """
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class FoodIndex:
+    """Неизменяемый снимок каталога продуктов"""
+
+    def __init__(self, rows, categories, version=None):
+        """
+        Аргументы:
+            rows: кортежи (id, name, calories, protein, fats, carbs,
+                category_id, user_id, is_custom), отсортированные по названию
+            categories: словарь {id категории: (название, иконка)}
+            version: версия раздела кэша, из которой построен индекс
+        """
+        self.version = version
+        self.categories = categories
+        self.ids = array('q')
+        self.names = []
+        self.calories = array('l')
+        self.protein = array('d')
+        self.fats = array('d')
+        self.carbs = array('d')
+        self.category_ids = array('q')
+        # 0 — продукт общего каталога, NO_OWNER — пользовательский без владельца
+        self.owner_ids = array('q')
+        self.keys = []
+        self.postings = {}
+
+        for position, (pk, name, calories, protein, fats, carbs, category_id, user_id, is_custom) in enumerate(rows):
+            self.ids.append(pk)
+            self.names.append(name)
+            self.calories.append(calories)
+            self.protein.append(protein)
+            self.fats.append(fats)
+            self.carbs.append(carbs)
+            self.category_ids.append(category_id)
+            self.owner_ids.append((user_id or NO_OWNER) if is_custom else 0)
+
+            key = normalize(name)
+            translit = normalize(unidecode(key))
+            self.keys.append((key, translit))
+            for gram in trigrams(key) | trigrams(translit):
+                self.postings.setdefault(gram, array('l')).append(position)
+
+        self.owners = set(self.owner_ids) - {0, NO_OWNER}
+        self._shared_json = None
+
+    @classmethod
+    def load(cls, version=None):
+        from .models import Food, FoodCategory
+
+        rows = Food.objects.order_by('name', 'pk').values_list(
+            'id', 'name', 'calories', 'protein', 'fats', 'carbs', 'category_id', 'user_id', 'is_custom'
+        )
+        categories = {
+            pk: (name, icon) for pk, name, icon in FoodCategory.objects.values_list('id', 'name', 'icon')
+        }
+        return cls(list(rows), categories, version)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _visible(self, position, user_id):
+        owner = self.owner_ids[position]
+        return owner == 0 or owner == user_id
+
+    def visible_positions(self, user_id=None, category_id=None):
+        """Позиции продуктов, видимых пользователю, в алфавитном порядке"""
+        return [
+            position for position in range(len(self.ids))
+            if self._visible(position, user_id)
+            and (category_id is None or self.category_ids[position] == category_id)
+        ]
+
+    def _containing(self, value):
+        """
+        Позиции, названия которых могут содержать value: пересечение списков
+        его внутренних триграмм. Проверку подстрокой делает search
+        """
+        grams = inner_trigrams(value)
+        if not grams:
+            return set(range(len(self.ids)))
+        lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        return set(lists[0]).intersection(*lists[1:])
+
+    def search(self, query, user_id=None, category_id=None, limit=None):
+        """
+        Ищет продукты по подстроке названия (на кириллице или латиницей).
+
+        Сначала идут названия, начинающиеся с запроса, затем содержащие его;
+        если точных совпадений меньше limit, добавляются похожие названия.
+
+        Возвращает:
+            Список позиций в индексе
+        """
+        query = normalize(query)
+        if not query:
+            return self.visible_positions(user_id, category_id)[:limit]
+        translit = normalize(unidecode(query))
+
+        def accept(position):
+            return self._visible(position, user_id) and (
+                category_id is None or self.category_ids[position] == category_id
+            )
+
+        query_grams = trigrams(query) | trigrams(translit)
+        # Запросы из одной-двух букв дают слишком общие триграммы, их проверяем подряд
+        if len(query) < 3:
+            candidates = range(len(self.ids))
+        else:
+            candidates = self._containing(query)
+            if translit != query:
+                candidates |= self._containing(translit)
+            candidates = sorted(candidates)
+
+        prefix, substring = [], []
+        for position in candidates:
+            key, key_translit = self.keys[position]
+            if key.startswith(query) or key_translit.startswith(translit):
+                if accept(position):
+                    prefix.append(position)
+            elif query in key or translit in key_translit:
+                if accept(position):
+                    substring.append(position)
+        found = prefix + substring
+        if len(query) < 3 or (limit is not None and len(found) >= limit):
+            return found[:limit]
+
+        # Нечеткий поиск: доля общих триграмм с запросом
+        scores = {}
+        for gram in query_grams:
+            for position in self.postings.get(gram, ()):
+                scores[position] = scores.get(position, 0) + 1
+        exact = set(found)
+        fuzzy = sorted(
+            (
+                (-score, position) for position, score in scores.items()
+                if position not in exact
+                and score / len(query_grams) >= FUZZY_THRESHOLD
+                and accept(position)
+            )
+        )
+        found.extend(position for _, position in fuzzy)
+        return found[:limit]
+
+    def category_counts(self, user_id=None):
+        """Количество видимых пользователю продуктов в каждой категории"""
+        counts = {}
+        for position in range(len(self.ids)):
+            if self._visible(position, user_id):
+                category_id = self.category_ids[position]
+                counts[category_id] = counts.get(category_id, 0) + 1
+        return counts
+
+    def as_dict(self, position):
+        category_id = self.category_ids[position]
+        return {
+            'id': self.ids[position],
+            'name': self.names[position],
+            'calories': self.calories[position],
+            'protein': self.protein[position],
+            'fats': self.fats[position],
+            'carbs': self.carbs[position],
+            'category': {
+                'id': category_id,
+                'name': self.categories.get(category_id, ('', ''))[0],
+            },
+        }
+
+    def foods_json(self, user_id=None):
+        """
+        JSON со всеми видимыми пользователю продуктами для скриптов форм.
+        Для пользователей без своих продуктов строка общего каталога
+        строится один раз на версию индекса.
+        """
+        def serialize(positions):
+            return json.dumps([
+                {
+                    'id': self.ids[position],
+                    'name': self.names[position],
+                    'calories': self.calories[position],
+                    'protein': self.protein[position],
+                    'fat': self.fats[position],
+                    'carbs': self.carbs[position],
+                } for position in positions
+            ])
+
+        if user_id not in self.owners:
+            if self._shared_json is None:
+                self._shared_json = serialize(self.visible_positions())
+            return self._shared_json
+        return serialize(self.visible_positions(user_id))
+
+
+class IndexedQuerySet:
+    """
+    Список объектов в порядке, заданном индексом, совместимый с Paginator:
+    длина известна без запроса, объекты среза загружаются одним in_bulk.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = list(ids)
+        self.queryset = queryset
+        self.model = queryset.model
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        ids = self.ids[key]
+        objects = self.queryset.in_bulk(ids)
+        return [objects[pk] for pk in ids if pk in objects]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_food_index():
+    """Возвращает актуальный индекс, перестраивая его после изменений каталога"""
+    global _index
+    version = get_section_versions('foods')
+    if not settings.SHARED_CACHE:
+        version = f'{version}:{int(time.monotonic() // LOCAL_INDEX_MAX_AGE)}'
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = FoodIndex.load(version)
+        return _index
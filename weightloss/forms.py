@@ -2,9 +2,6 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import UserProfile, Post, ForumTopic, ForumPost, Category, Comment, Recipe, RecipeComment, VIPPost, VIPComment, NutritionGoal, Food, MealPlan, Meal, MealItem
-from django.utils.text import slugify
-import random
-import string
 from django.db import models
 
 class CustomUserCreationForm(UserCreationForm):
@@ -71,18 +68,7 @@ class UserPostForm(forms.ModelForm):
         if user:
             post.author = user
         
-        # Генерация уникального slug из заголовка
-        base_slug = slugify(post.title)
-        unique_slug = base_slug
-        counter = 1
-        
-        while Post.objects.filter(slug=unique_slug).exists():
-            random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
-            unique_slug = f"{base_slug}-{random_suffix}"
-            counter += 1
-        
-        post.slug = unique_slug
-        
+        # slug выдает модель при первом сохранении (slugs.UniqueSlugMixin)
         if commit:
             post.save()
         
@@ -110,18 +96,6 @@ class ForumTopicForm(forms.ModelForm):
         if user:
             topic.author = user
         
-        # Генерация уникального slug
-        base_slug = slugify(topic.title)
-        unique_slug = base_slug
-        counter = 1
-        
-        while ForumTopic.objects.filter(slug=unique_slug).exists():
-            random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
-            unique_slug = f"{base_slug}-{random_suffix}"
-            counter += 1
-        
-        topic.slug = unique_slug
-        
         # Сохраняем тему со всем содержимым
         if commit:
             topic.save()
@@ -241,18 +215,6 @@ class VIPPostForm(forms.ModelForm):
         if user:
             post.author = user
         
-        # Генерация уникального slug из заголовка
-        base_slug = slugify(post.title)
-        unique_slug = base_slug
-        counter = 1
-        
-        while VIPPost.objects.filter(slug=unique_slug).exists():
-            random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
-            unique_slug = f"{base_slug}-{random_suffix}"
-            counter += 1
-        
-        post.slug = unique_slug
-        
         if commit:
             post.save()
         
@@ -0,0 +1,216 @@
+"""
+Адаптивные изображения.
+
+Для загруженных картинок (IMAGE_FIELDS) строятся варианты размеров
+(VARIANTS): карточка, миниатюра, аватар, картинка для соцсетей (OG) и
+полноразмерная для страниц объектов — в AVIF (если Pillow собран с его
+поддержкой), WebP и JPEG для старых браузеров, а также крошечная
+размытая заглушка в виде data URI.
+
+Файлы вариантов лежат в MEDIA_ROOT/variants/<хэш содержимого>/, поэтому
+одинаковые картинки обрабатываются один раз, а готовые файлы повторно
+не пересчитываются. Описание вариантов (манифест) сохраняется в JSON
+рядом и кэшируется; тег {% responsive_image %} (templatetags/images.py)
+читает только манифест и выводит <picture> со srcset, sizes и
+loading="lazy". Пока манифеста нет, выводится исходная картинка.
+
+Варианты строятся после сохранения объекта (signals.py), для уже
+загруженных файлов — командой build_image_variants.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Имя варианта -> (ширины для srcset, соотношение сторон; None — как у оригинала)
+VARIANTS = {
+    'card': ((320, 480, 640, 960), 16 / 10),
+    'thumb': ((80, 160, 240), 1),
+    'avatar': ((48, 96, 192), 1),
+    'og': ((1200,), 1200 / 630),
+    'full': ((640, 960, 1280, 1920), None),
+}
+
+# (приложение, модель) -> {поле: варианты}
+IMAGE_FIELDS = {
+    ('weightloss', 'Post'): {'featured_image': ('card', 'thumb', 'og', 'full')},
+    ('weightloss', 'Recipe'): {'image': ('card', 'thumb', 'og', 'full')},
+    ('weightloss', 'Challenge'): {'image': ('card', 'og', 'full')},
+    ('weightloss', 'Food'): {'image': ('thumb', 'card')},
+    ('weightloss', 'UserProfile'): {'profile_pic': ('avatar',)},
+}
+
+# Формат -> (расширение, MIME-тип, параметры сохранения); порядок — по предпочтению
+FORMATS = {
+    'avif': ('avif', 'image/avif', {'quality': 60}),
+    'webp': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+ENABLED_FORMATS = tuple(fmt for fmt in FORMATS if fmt == 'jpeg' or features.check(fmt))
+
+PLACEHOLDER_WIDTH = 16
+
+VARIANTS_DIR = 'variants'
+MANIFEST_CACHE_KEY = 'image-manifest:{}'
+MANIFEST_TIMEOUT = 24 * 60 * 60
+# Отсутствие манифеста кэшируется ненадолго: его может создать другой процесс
+MISSING_TIMEOUT = 5 * 60
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def _name_hash(name):
+    return hashlib.md5(name.encode('utf-8')).hexdigest()
+
+
+def manifest_name(name):
+    key = _name_hash(name)
+    return f'{VARIANTS_DIR}/manifests/{key[:2]}/{key}.json'
+
+
+def variant_name(digest, variant, width, fmt):
+    return f'{VARIANTS_DIR}/{digest[:2]}/{digest}/{variant}-{width}.{FORMATS[fmt][0]}'
+
+
+def get_manifest(name, storage=default_storage):
+    """Манифест вариантов картинки name или None, если варианты еще не построены"""
+    key = MANIFEST_CACHE_KEY.format(_name_hash(name))
+    manifest = cache.get(key)
+    if manifest is None:
+        path = manifest_name(name)
+        try:
+            with storage.open(path) as handle:
+                manifest = json.load(handle)
+        except (OSError, ValueError):
+            manifest = False
+        cache.set(key, manifest, MANIFEST_TIMEOUT if manifest else MISSING_TIMEOUT)
+    return manifest or None
+
+
+def variant_url(image, variant):
+    """
+    Адрес JPEG-варианта картинки (самого крупного), например для og:image.
+    Пока варианты не построены — адрес исходной картинки.
+    """
+    manifest = get_manifest(image.name, image.storage)
+    entry = manifest and manifest['variants'].get(variant)
+    return image.storage.url(entry['files']['jpeg'][-1]) if entry else image.url
+
+
+def _resize(image, width, ratio):
+    if ratio is None:
+        height = max(1, round(image.height * width / image.width))
+        return image.resize((width, height), Image.Resampling.LANCZOS)
+    return ImageOps.fit(image, (width, max(1, round(width / ratio))), Image.Resampling.LANCZOS)
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # Прозрачные области в JPEG заливаем белым
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), **FORMATS[fmt][2])
+    return buffer.getvalue()
+
+
+def placeholder(image):
+    """Размытая копия шириной PLACEHOLDER_WIDTH пикселей в виде data URI"""
+    small = _resize(image.convert('RGB'), PLACEHOLDER_WIDTH, None).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    small.save(buffer, format='JPEG', quality=50)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _widths(widths, original):
+    """Ширины не больше исходной; если картинка меньше всех, берется ее ширина"""
+    fitting = [width for width in widths if width <= original]
+    return fitting or [original]
+
+
+def build_variants(name, variants, storage=default_storage, force=False):
+    """
+    Строит недостающие варианты картинки name и сохраняет манифест.
+    При force файлы вариантов перезаписываются.
+    """
+    with storage.open(name) as handle:
+        data = handle.read()
+    digest = content_hash(data)
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    manifest = {
+        'hash': digest,
+        'width': image.width,
+        'height': image.height,
+        'placeholder': placeholder(image),
+        'variants': {},
+    }
+    for variant in variants:
+        widths, ratio = VARIANTS[variant]
+        entry = {'widths': [], 'heights': [], 'files': {fmt: [] for fmt in ENABLED_FORMATS}}
+        for width in _widths(widths, image.width):
+            resized = None
+            for fmt in ENABLED_FORMATS:
+                path = variant_name(digest, variant, width, fmt)
+                if force and storage.exists(path):
+                    storage.delete(path)
+                if not storage.exists(path):
+                    if resized is None:
+                        resized = _resize(image, width, ratio)
+                    path = storage.save(path, ContentFile(_encode(resized, fmt)))
+                entry['files'][fmt].append(path)
+            entry['widths'].append(width)
+            entry['heights'].append(round(width / ratio) if ratio else round(image.height * width / image.width))
+        manifest['variants'][variant] = entry
+
+    path = manifest_name(name)
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(json.dumps(manifest).encode('utf-8')))
+    cache.set(MANIFEST_CACHE_KEY.format(_name_hash(name)), manifest, MANIFEST_TIMEOUT)
+    return manifest
+
+
+def image_fields(model):
+    """Поля картинок модели и их варианты: {поле: варианты}"""
+    return IMAGE_FIELDS.get((model._meta.app_label, model.__name__), {})
+
+
+def ensure_variants(instance):
+    """Строит варианты для картинок объекта, у которых их еще нет"""
+    for field, variants in image_fields(type(instance)).items():
+        image = getattr(instance, field)
+        if not image or get_manifest(image.name) is not None:
+            continue
+        try:
+            build_variants(image.name, variants, image.storage)
+        except Exception:
+            logger.warning('Не удалось построить варианты изображения %s', image.name, exc_info=True)
+
+
+def process_image(task):
+    """
+    Задача команды build_image_variants для пула процессов.
+    task — (имя файла, варианты, force); возвращает (имя, ошибка или None).
+    """
+    name, variants, force = task
+    if not force and get_manifest(name) is not None:
+        return name, None
+    try:
+        build_variants(name, variants, force=force)
+    except Exception as error:
+        return name, f'{type(error).__name__}: {error}'
+    return name, None
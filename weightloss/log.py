@@ -0,0 +1,43 @@
+"""
+Форматирование журналов приложения.
+
+Модули weightloss пишут в собственные логгеры (logging.getLogger(__name__))
+с отложенным форматированием: logger.debug('... %s', value). Уровни и
+обработчики задаются настройкой LOGGING в djangoProject10/settings.py;
+при LOG_FORMAT=json записи выводятся JsonFormatter — по одному
+JSON-объекту в строке, что удобно для сборщиков журналов.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+# Стандартные атрибуты LogRecord; все остальные пришли через extra
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись в JSON: время (UTC, ISO 8601), уровень, логгер,
+    сообщение, место вызова, исключение и поля, переданные через extra.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
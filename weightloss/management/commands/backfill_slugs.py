@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from weightloss.models import Challenge, FoodCategory, ForumTopic, Post, Recipe, VIPPost
+from weightloss.slugs import backfill_slugs
+
+MODELS = {
+    'post': Post,
+    'recipe': Recipe,
+    'topic': ForumTopic,
+    'vip': VIPPost,
+    'challenge': Challenge,
+    'food_category': FoodCategory,
+}
+
+class Command(BaseCommand):
+    help = ('Выдает новые slug статьям, рецептам, темам форума, VIP-статьям, челленджам и категориям '
+            'продуктов с пустым slug, slug с дефиса в начале или с недопустимыми символами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help=f'Модели (по умолчанию все): {", ".join(MODELS)}')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество объектов в одной пачке')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать изменения')
+
+    def handle(self, *args, **options):
+        unknown = set(options['models']) - set(MODELS)
+        if unknown:
+            raise CommandError(f'Неизвестные модели: {", ".join(sorted(unknown))}; доступны: {", ".join(MODELS)}')
+
+        for name in options['models'] or MODELS:
+            changes = backfill_slugs(MODELS[name], batch_size=options['batch_size'], dry_run=options['dry_run'])
+            for pk, old, new in changes:
+                self.stdout.write(f'{name} #{pk}: {old!r} -> {new}')
+            self.stdout.write(f'{name}: {len(changes)}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск, изменения не сохранены'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Slug обновлены'))
@@ -0,0 +1,205 @@
+import copy
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+from weightloss.database import POSTGRES_ENGINE, SQLITE_ENGINE, sqlite_pragmas
+
+ALIAS_PREFIX = 'benchmark_'
+TABLE = 'weightloss_benchmark_rows'
+COUNTER_TABLE = 'weightloss_benchmark_counters'
+TOPICS = 50
+
+
+def _profiles(base, tmpdir):
+    """
+    Профили {имя: настройки базы}. Профили SQLite работают с временными
+    файлами и доступны всегда, профили PostgreSQL — если она настроена
+    в DATABASES; они создают в ней вспомогательные таблицы и удаляют
+    их после замера.
+    """
+    pragmas = base.get('PRAGMAS') or sqlite_pragmas()
+    sqlite = {'ENGINE': SQLITE_ENGINE, 'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+    profiles = {
+        # Как было до weightloss/database.py: журнал отката, новое соединение на запрос
+        'sqlite-default': {**sqlite, 'NAME': os.path.join(tmpdir, 'default.sqlite3'), 'PRAGMAS': {}},
+        'sqlite-wal': {**sqlite, 'NAME': os.path.join(tmpdir, 'wal.sqlite3'), 'CONN_MAX_AGE': 60,
+                       'OPTIONS': {'timeout': pragmas['busy_timeout'] / 1000}, 'PRAGMAS': pragmas},
+    }
+    if base['ENGINE'] == POSTGRES_ENGINE:
+        postgres = {key: value for key, value in base.items() if key != 'PRAGMAS'}
+        profiles['postgres-per-request'] = {**postgres, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+        profiles['postgres-persistent'] = {**postgres, 'CONN_MAX_AGE': max(base['CONN_MAX_AGE'] or 0, 60),
+                                           'CONN_HEALTH_CHECKS': True}
+    return profiles
+
+
+def _percentile(values, q):
+    """Перцентиль отсортированного списка длительностей, в миллисекундах"""
+    if not values:
+        return 0
+    return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+
+def _create_tables(connection, rows, rng):
+    serial = 'INTEGER PRIMARY KEY AUTOINCREMENT' if connection.vendor == 'sqlite' else 'BIGSERIAL PRIMARY KEY'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.execute(f'DROP TABLE IF EXISTS {COUNTER_TABLE}')
+        cursor.execute(f'CREATE TABLE {TABLE} (id {serial}, topic_id INTEGER NOT NULL, body TEXT NOT NULL, created DOUBLE PRECISION NOT NULL)')
+        cursor.execute(f'CREATE INDEX {TABLE}_topic ON {TABLE} (topic_id, id)')
+        cursor.execute(f'CREATE TABLE {COUNTER_TABLE} (topic_id INTEGER PRIMARY KEY, posts INTEGER NOT NULL)')
+        cursor.executemany(f'INSERT INTO {COUNTER_TABLE} (topic_id, posts) VALUES (%s, 0)', [(t,) for t in range(TOPICS)])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (topic_id, body, created) VALUES (%s, %s, %s)',
+            [(rng.randrange(TOPICS), 'x' * rng.randint(50, 500), time.time()) for _ in range(rows)],
+        )
+        cursor.execute(f'UPDATE {COUNTER_TABLE} SET posts = (SELECT COUNT(*) FROM {TABLE} WHERE {TABLE}.topic_id = {COUNTER_TABLE}.topic_id)')
+
+
+def _drop_tables(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.execute(f'DROP TABLE IF EXISTS {COUNTER_TABLE}')
+
+
+def _read(cursor, topic):
+    # Страница темы: счетчик и последние сообщения
+    cursor.execute(f'SELECT posts FROM {COUNTER_TABLE} WHERE topic_id = %s', [topic])
+    cursor.fetchone()
+    cursor.execute(f'SELECT id, body FROM {TABLE} WHERE topic_id = %s ORDER BY id DESC LIMIT 20', [topic])
+    cursor.fetchall()
+
+
+def _write(connection, alias, topic, body):
+    # Новое сообщение и денормализованный счетчик в одной транзакции
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {TABLE} (topic_id, body, created) VALUES (%s, %s, %s)', [topic, body, time.time()])
+        cursor.execute(f'UPDATE {COUNTER_TABLE} SET posts = posts + 1 WHERE topic_id = %s', [topic])
+
+
+def _worker(alias, deadline, options, seed, result):
+    rng = random.Random(seed)
+    connection = connections[alias]
+    reads, writes, errors, latencies = 0, 0, 0, []
+    try:
+        while time.perf_counter() < deadline:
+            # Один «запрос» к сайту — несколько операций с базой
+            for _ in range(options['ops_per_request']):
+                topic = rng.randrange(TOPICS)
+                is_write = rng.random() < options['write_ratio']
+                started = time.perf_counter()
+                try:
+                    if is_write:
+                        _write(connection, alias, topic, 'y' * rng.randint(50, 500))
+                    else:
+                        with connection.cursor() as cursor:
+                            _read(cursor, topic)
+                except OperationalError:
+                    # «database is locked» и подобные ошибки — запрос пользователя не выполнен
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if is_write:
+                    writes += 1
+                else:
+                    reads += 1
+            # Как в конце запроса: соединение закрывается, если CONN_MAX_AGE истек
+            connection.close_if_unusable_or_obsolete()
+    finally:
+        connection.close()
+        result.update(reads=reads, writes=writes, errors=errors, latencies=latencies)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность базы на чтение и запись при параллельной нагрузке '
+            'для профилей SQLite (журнал по умолчанию и WAL) и настроенной PostgreSQL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('profiles', nargs='*', help='Имена профилей (по умолчанию все доступные)')
+        parser.add_argument('--threads', type=int, default=8, help='Число параллельных потоков')
+        parser.add_argument('--duration', type=float, default=5, help='Длительность замера каждого профиля, секунд')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Доля операций записи (0..1)')
+        parser.add_argument('--ops-per-request', type=int, default=5, help='Операций с базой на один запрос')
+        parser.add_argument('--rows', type=int, default=20000, help='Строк в тестовой таблице')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора')
+
+    def handle(self, *args, **options):
+        tmpdir = tempfile.mkdtemp(prefix='benchmark_database_')
+        try:
+            profiles = _profiles(connections['default'].settings_dict, tmpdir)
+            names = options['profiles'] or list(profiles)
+            unknown = set(names) - set(profiles)
+            if unknown:
+                raise CommandError(f'Неизвестные профили: {", ".join(sorted(unknown))}; доступны: {", ".join(profiles)}')
+
+            self.stdout.write(
+                f'{"Профиль":<22} {"Чтений/с":>10} {"Записей/с":>10} {"p50, мс":>8} {"p95, мс":>8} '
+                f'{"Ошибок":>7} {"Соедин.":>8}'
+            )
+            for name in names:
+                metrics = self.run_profile(name, profiles[name], options)
+                self.stdout.write(
+                    f'{name:<22} {metrics["reads"]:>10.0f} {metrics["writes"]:>10.0f} {metrics["p50"]:>8.2f} '
+                    f'{metrics["p95"]:>8.2f} {metrics["errors"]:>7} {metrics["connections"]:>8}'
+                )
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
+
+    def run_profile(self, name, profile, options):
+        alias = ALIAS_PREFIX + name.replace('-', '_')
+        config = copy.deepcopy(connections['default'].settings_dict)
+        config.update(copy.deepcopy(profile))
+        connections.settings[alias] = config
+
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == alias:
+                opened.append(1)
+
+        connection_created.connect(count_connection, weak=False)
+        try:
+            setup = connections[alias]
+            _create_tables(setup, options['rows'], random.Random(options['seed']))
+            setup.close()
+            opened.clear()
+
+            results = [{} for _ in range(options['threads'])]
+            deadline = time.perf_counter() + options['duration']
+            threads = [
+                threading.Thread(target=_worker, args=(alias, deadline, options, options['seed'] + i, results[i]))
+                for i in range(options['threads'])
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            # Соединения, открытые потоками во время замера
+            connection_count = len(opened)
+
+            _drop_tables(setup)
+            setup.close()
+        finally:
+            connection_created.disconnect(count_connection)
+            del connections[alias]
+            del connections.settings[alias]
+
+        latencies = sorted(latency for result in results for latency in result['latencies'])
+        return {
+            'reads': sum(result['reads'] for result in results) / elapsed,
+            'writes': sum(result['writes'] for result in results) / elapsed,
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+            'errors': sum(result['errors'] for result in results),
+            'connections': connection_count,
+        }
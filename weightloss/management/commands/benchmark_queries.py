@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from weightloss.benchmark import (
+    BUDGETS_PATH, check_statuses, compare, load_budgets, run_benchmark, save_budgets, seed_fixtures,
+)
+from weightloss.view_counter import counter
+
+class Command(BaseCommand):
+    help = ('Замеряет число запросов, время и размер ответа всех маршрутов на тестовой базе '
+            'с сгенерированными данными и сравнивает число запросов с бюджетами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', help='Имена маршрутов (по умолчанию все)')
+        parser.add_argument('--scale', type=int, default=1, help='Множитель объема тестовых данных')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора тестовых данных')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+        parser.add_argument('--budgets', default=str(BUDGETS_PATH), help='Файл с бюджетами запросов')
+        parser.add_argument('--update-budgets', action='store_true',
+                            help='Записать текущее число запросов как новые бюджеты')
+
+    def handle(self, *args, **options):
+        # Замеры идут на отдельной тестовой базе, рабочие данные не затрагиваются
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            self.stdout.write('Генерация тестовых данных...')
+            fixtures = seed_fixtures(options['scale'], options['seed'])
+            results, skipped = run_benchmark(fixtures, options['routes'])
+            # Просмотры из буфера пишем, пока тестовая база еще существует
+            counter.flush()
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        self.stdout.write(f'{"Маршрут":<32} {"Код":>4} {"Запр.":>6} {"БД, мс":>8} {"Шабл., мс":>10} {"Всего, мс":>10} {"КБ":>7}')
+        for name, metrics in results.items():
+            size = f'{metrics["size"] / 1024:.1f}' if metrics['size'] is not None else '-'
+            self.stdout.write(
+                f'{name:<32} {metrics["status"]:>4} {metrics["queries"]:>6} {metrics["db_ms"]:>8} '
+                f'{metrics["render_ms"]:>10} {metrics["time_ms"]:>10} {size:>7}'
+            )
+        for name, reason in skipped.items():
+            self.stdout.write(f'{name:<32} пропущен: {reason}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({'scale': options['scale'], 'seed': options['seed'], 'routes': results},
+                          output, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+        failures = check_statuses(results)
+        if failures:
+            # Бюджет, записанный по странице ошибки, ничего не стоит
+            raise CommandError('Неожиданный код ответа: ' + ', '.join(
+                f'{name} ({status}, ожидался {expected})' for name, status, expected in failures
+            ))
+
+        if options['update_budgets']:
+            budgets = load_budgets(options['budgets'])
+            budgets.update({name: {'queries': metrics['queries']} for name, metrics in results.items()})
+            save_budgets(budgets, options['budgets'])
+            self.stdout.write(self.style.SUCCESS(f'Бюджеты обновлены: {options["budgets"]}'))
+            return
+
+        regressions, improvements, unbudgeted = compare(results, load_budgets(options['budgets']))
+        for name, queries, budget in improvements:
+            self.stdout.write(f'{name}: {queries} запросов при бюджете {budget} — бюджет можно уменьшить')
+        if unbudgeted:
+            self.stdout.write(self.style.WARNING(f'Нет бюджета для маршрутов: {", ".join(unbudgeted)}'))
+        if regressions:
+            raise CommandError('Превышен бюджет запросов: ' + ', '.join(
+                f'{name} ({queries} > {budget})' for name, queries, budget in regressions
+            ))
+        self.stdout.write(self.style.SUCCESS('Все маршруты укладываются в бюджет запросов'))
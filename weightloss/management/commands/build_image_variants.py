@@ -0,0 +1,45 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from weightloss.images import IMAGE_FIELDS, process_image
+
+
+def _init_worker():
+    # При запуске процессов через spawn Django в них еще не настроен
+    if not apps.ready:
+        django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Строит варианты размеров и форматов для уже загруженных изображений в несколько процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Количество процессов')
+        parser.add_argument('--force', action='store_true', help='Перестроить и уже готовые варианты')
+
+    def handle(self, *args, **options):
+        tasks = {}
+        for (app_label, model_name), fields in IMAGE_FIELDS.items():
+            model = apps.get_model(app_label, model_name)
+            for field, variants in fields.items():
+                names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+                for name in names.distinct():
+                    tasks.setdefault(name, set()).update(variants)
+        if not tasks:
+            self.stdout.write(self.style.SUCCESS('Изображений нет'))
+            return
+
+        # Соединения с базой не должны наследоваться дочерними процессами
+        connections.close_all()
+        failed = 0
+        work = [(name, tuple(sorted(variants)), options['force']) for name, variants in sorted(tasks.items())]
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=_init_worker) as pool:
+            for name, error in pool.map(process_image, work, chunksize=8):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {len(work) - failed}, с ошибками: {failed}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from weightloss.sitemaps import SITEMAPS, build_sitemaps, refresh_stale
+
+class Command(BaseCommand):
+    help = 'Строит сжатые файлы карты сайта: индекс и страницы разделов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sections', nargs='*', help='Разделы (по умолчанию все)')
+        parser.add_argument('--stale', action='store_true', help='Только устаревшие и еще не построенные разделы')
+
+    def handle(self, *args, **options):
+        unknown = set(options['sections']) - set(SITEMAPS)
+        if unknown:
+            raise CommandError(f'Неизвестные разделы: {", ".join(sorted(unknown))}; доступны: {", ".join(SITEMAPS)}')
+
+        built = refresh_stale() if options['stale'] else build_sitemaps(options['sections'])
+        for section, pages in built.items():
+            self.stdout.write(f'{section}: страниц {pages}')
+        self.stdout.write(self.style.SUCCESS('Карта сайта построена'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from weightloss.benchmark import seed_fixtures
+from weightloss.query_plans import check_hot_queries, check_routes
+from weightloss.view_counter import counter
+
+
+class Command(BaseCommand):
+    help = ('Проверяет через EXPLAIN QUERY PLAN, что основные запросы представлений используют '
+            'индексы, и завершается с ошибкой при полном просмотре большой таблицы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', help='Имена маршрутов (по умолчанию маршруты с горячими запросами)')
+        parser.add_argument('--scale', type=int, default=1, help='Множитель объема тестовых данных')
+        parser.add_argument('--verbose-plans', action='store_true', help='Вывести планы всех проверенных запросов')
+
+    def handle(self, *args, **options):
+        # Схема и данные — из миграций на отдельной тестовой базе, как в benchmark_queries
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            self.stdout.write('Генерация тестовых данных...')
+            fixtures = seed_fixtures(options['scale'])
+            queries = check_hot_queries(fixtures)
+            routes = check_routes(fixtures, options['routes'])
+            counter.flush()
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        failures = []
+        for name, result in queries.items():
+            self.report(name, result, options['verbose_plans'])
+            if result['scans']:
+                failures.append(f'{name}: {", ".join(result["scans"])}')
+
+        for route, results in routes.items():
+            scanned = [result for result in results if result['scans']]
+            self.stdout.write(f'{route}: SELECT-запросов {len(results)}, с полным просмотром {len(scanned)}')
+            for result in results:
+                if result['scans'] or options['verbose_plans']:
+                    self.report(f'  {route}', result, True)
+            failures.extend(f'{route}: {", ".join(result["scans"])}' for result in scanned)
+
+        if failures:
+            raise CommandError('Полный просмотр больших таблиц: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все горячие запросы используют индексы'))
+
+    def report(self, name, result, show_plan):
+        status = self.style.ERROR('SCAN ' + ', '.join(result['scans'])) if result['scans'] else 'индекс'
+        self.stdout.write(f'{name}: {status}')
+        if show_plan:
+            self.stdout.write(f'    {result["sql"][:300]}')
+            for line in result['plan']:
+                self.stdout.write(f'    | {line}')
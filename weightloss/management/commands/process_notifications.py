@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from weightloss.notifications import process_batch, process_queue
+
+class Command(BaseCommand):
+    help = 'Создает уведомления из очереди событий (однократно или в цикле)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество событий в одной пачке')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, проверяя очередь с интервалом')
+        parser.add_argument('--interval', type=float, default=2.0, help='Пауза между проверками пустой очереди, с')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not options['loop']:
+            events, notifications = process_queue(batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'Обработано событий: {events}, создано уведомлений: {notifications}'
+            ))
+            return
+
+        self.stdout.write('Обработка очереди уведомлений запущена')
+        try:
+            while True:
+                events, notifications = process_batch(batch_size)
+                if events:
+                    self.stdout.write(f'Обработано событий: {events}, создано уведомлений: {notifications}')
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Обработка очереди уведомлений остановлена'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from weightloss.counters import rebuild_counters
+from weightloss.nutrition import rebuild_plan_totals
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики комментариев, тем и сообщений форума и итоги КБЖУ планов питания'
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        rebuild_plan_totals()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
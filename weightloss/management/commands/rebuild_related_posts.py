@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from weightloss.related import RELATED_SIZE, rebuild_related_posts
+
+class Command(BaseCommand):
+    help = 'Пересчитывает векторы TF-IDF статей и таблицу похожих статей (запускать периодически, например из cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=RELATED_SIZE, help='Количество похожих статей на статью')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество статей в одной пачке')
+
+    def handle(self, *args, **options):
+        total = rebuild_related_posts(size=options['size'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Похожие статьи пересчитаны: {total} записей'))
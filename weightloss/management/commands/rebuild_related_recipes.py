@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from weightloss.related import RELATED_SIZE, rebuild_related_recipes
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу похожих рецептов (запускать периодически, например из cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=RELATED_SIZE, help='Количество похожих рецептов на рецепт')
+
+    def handle(self, *args, **options):
+        total = rebuild_related_recipes(size=options['size'])
+        self.stdout.write(self.style.SUCCESS(f'Похожие рецепты пересчитаны: {total} записей'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from weightloss.search import rebuild_index
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс статей, рецептов и тем форума'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество объектов в одной пачке')
+
+    def handle(self, *args, **options):
+        totals = rebuild_index(batch_size=options['batch_size'])
+        for kind, total in totals.items():
+            self.stdout.write(f'{kind}: {total}')
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from weightloss.site_stats import COUNTER_FIELDS, refresh_site_stats
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику сайта и списки популярного (запускать периодически, например из cron)'
+
+    def handle(self, *args, **options):
+        stats = refresh_site_stats()
+        for field in COUNTER_FIELDS:
+            self.stdout.write(f'{field}: {getattr(stats, field)}')
+        for kind, items in stats.trending.items():
+            self.stdout.write(f'trending {kind}: {len(items)}')
+        self.stdout.write(self.style.SUCCESS('Статистика сайта обновлена'))
@@ -0,0 +1,268 @@
+"""
+Подбор продуктов для автозаполнения плана питания.
+
+Каталог берется из индекса продуктов в памяти (food_index), поэтому
+заполнение всей недели не требует запросов к таблицам продуктов.
+Прием пищи описывается шаблоном из слотов: в каждом слоте — группа
+продуктов и допустимые порции в граммах с фиксированным шагом.
+Правила совместимости заложены в шаблоны: мясо и рыба делят один
+белковый слот, крупа — один слот, дополнительный продукт не может быть
+мясом, рыбой или крупой.
+
+Для каждого типа приема пищи цели КБЖУ одинаковы во все дни недели,
+поэтому пул кандидатов строится и оптимизируется один раз на тип,
+а дни получают лучшие различающиеся варианты. Случайный выбор продуктов
+идет от зерна (обычно id плана), так что результат воспроизводим.
+"""
+import random
+
+# Признаки групп в названиях категорий и запасные точные названия
+GROUP_CATEGORY_NAMES = {
+    'meat': ('Мясо', ('Мясо и птица', 'Мясо')),
+    'fish': ('Рыба', ('Рыба и морепродукты', 'Рыба', 'Морепродукты')),
+    'grain': ('Крупы', ('Крупы и злаки', 'Крупы', 'Злаки')),
+    'vegetable': ('Овощи', ('Овощи',)),
+    'fruit': ('Фрукты', ('Фрукты и ягоды', 'Фрукты', 'Ягоды')),
+    'dairy': ('Молоч', ('Молочные продукты', 'Молочка')),
+    'nuts': ('Орехи', ('Орехи и семена', 'Орехи')),
+}
+
+BREAKFAST_GRAIN_WORDS = ('овсян', 'хлопья', 'мюсли', 'каша', 'хлеб', 'тост', 'булк', 'рис', 'злак')
+BREAKFAST_DAIRY_WORDS = ('молок', 'йогурт', 'творог', 'кефир', 'ряженк', 'сметан')
+EGG_WORD = 'яйц'
+
+# Доли дневной нормы по приемам пищи
+MEAL_DISTRIBUTION = {
+    'breakfast': {'calories': 0.25, 'protein': 0.25, 'fats': 0.2, 'carbs': 0.3},
+    'lunch': {'calories': 0.35, 'protein': 0.35, 'fats': 0.3, 'carbs': 0.35},
+    'dinner': {'calories': 0.3, 'protein': 0.3, 'fats': 0.35, 'carbs': 0.25},
+    'snack': {'calories': 0.1, 'protein': 0.1, 'fats': 0.15, 'carbs': 0.1},
+}
+
+# Число случайных наборов продуктов на тип приема пищи
+CANDIDATES = 48
+# Максимум проходов покоординатного спуска по порциям
+DESCENT_PASSES = 4
+
+
+def _steps(start, stop, step, optional=False):
+    amounts = tuple(range(start, stop + 1, step))
+    return (0,) + amounts if optional else amounts
+
+
+class Slot:
+    """Место в шаблоне приема пищи: продукты-кандидаты и допустимые порции"""
+
+    def __init__(self, positions, amounts, preferred=None, amounts_for=None):
+        self.positions = positions
+        self.amounts = amounts
+        # Если есть подходящие по названию продукты, выбираем среди них
+        self.preferred = preferred or positions
+        # Отдельные порции для конкретных позиций (например, для молока)
+        self.amounts_for = amounts_for or {}
+
+    def __bool__(self):
+        return bool(self.positions)
+
+    def pick(self, rng, exclude):
+        choices = [position for position in self.preferred if position not in exclude]
+        if not choices:
+            choices = [position for position in self.positions if position not in exclude]
+        if not choices:
+            return None
+        position = rng.choice(choices)
+        return position, self.amounts_for.get(position, self.amounts)
+
+
+class MealPlanOptimizer:
+    """Подбирает продукты и порции для приемов пищи одного плана"""
+
+    def __init__(self, index, user_id=None, seed=None):
+        self.index = index
+        self.rng = random.Random(seed)
+        positions = index.visible_positions(user_id)
+        self.size = len(positions)
+
+        groups = self._category_groups(index.categories)
+        self.groups = {name: [] for name in GROUP_CATEGORY_NAMES}
+        self.other = []
+        for position in positions:
+            group = groups.get(index.category_ids[position])
+            (self.groups[group] if group else self.other).append(position)
+
+        self.eggs = [position for position in positions if EGG_WORD in index.keys[position][0]]
+        # Макронутриенты на грамм продукта: (калории, белки, жиры, углеводы)
+        self.per_gram = {
+            position: (
+                index.calories[position] / 100.0,
+                index.protein[position] / 100.0,
+                index.fats[position] / 100.0,
+                index.carbs[position] / 100.0,
+            ) for position in positions
+        }
+
+    @staticmethod
+    def _category_groups(categories):
+        """Сопоставляет категории каталога группам продуктов"""
+        groups = {}
+        for group, (fragment, fallback_names) in GROUP_CATEGORY_NAMES.items():
+            matched = [pk for pk, (name, _) in categories.items() if fragment.lower() in name.lower()]
+            if not matched:
+                matched = [pk for pk, (name, _) in categories.items() if name in fallback_names]
+            for pk in matched:
+                groups.setdefault(pk, group)
+        return groups
+
+    def _named(self, positions, words):
+        return [
+            position for position in positions
+            if any(word in self.index.keys[position][0] for word in words)
+        ]
+
+    def templates(self, meal_type):
+        """Слоты шаблона приема пищи"""
+        groups = self.groups
+        if meal_type == 'snack':
+            return [
+                Slot(groups['dairy'], _steps(100, 200, 50)),
+                Slot(groups['fruit'], _steps(50, 150, 50, optional=True)),
+                Slot(groups['nuts'], _steps(10, 20, 5, optional=True)),
+            ]
+        if meal_type == 'breakfast':
+            milk = self._named(groups['dairy'], ('молок',))
+            if self.eggs:
+                protein = Slot(self.eggs, _steps(25, 100, 25, optional=True))
+            else:
+                protein = Slot(groups['meat'], _steps(20, 40, 10, optional=True))
+            return [
+                Slot(groups['grain'], _steps(30, 80, 10),
+                     preferred=self._named(groups['grain'], BREAKFAST_GRAIN_WORDS)),
+                Slot(groups['dairy'], _steps(100, 200, 50),
+                     preferred=self._named(groups['dairy'], BREAKFAST_DAIRY_WORDS),
+                     amounts_for={position: _steps(150, 250, 50) for position in milk}),
+                Slot(groups['fruit'], _steps(50, 150, 50)),
+                protein,
+                Slot(groups['nuts'], _steps(5, 15, 5, optional=True)),
+            ]
+        # Обед и ужин: белок + крупа + овощи и один дополнительный продукт
+        extra = groups['vegetable'] + groups['fruit'] + groups['dairy'] + groups['nuts'] + self.other
+        return [
+            Slot(groups['meat'] + groups['fish'], _steps(20, 160, 20)),
+            Slot(groups['grain'], _steps(20, 140, 20)),
+            Slot(groups['vegetable'], _steps(100, 200, 50)),
+            Slot(extra, _steps(20, 60, 20, optional=True)),
+        ]
+
+    @staticmethod
+    def score(totals, targets):
+        """Средняя относительная ошибка по КБЖУ, ошибка калорий весит в 1.5 раза больше"""
+        calories, protein, fats, carbs = totals
+        target_calories, target_protein, target_fats, target_carbs = targets
+        return (
+            abs(calories - target_calories) / target_calories * 1.5
+            + abs(protein - target_protein) / target_protein
+            + abs(fats - target_fats) / target_fats
+            + abs(carbs - target_carbs) / target_carbs
+        ) / 4
+
+    def _sample(self, slots):
+        """Случайный набор продуктов по шаблону: список (позиция, порции)"""
+        chosen = []
+        used = set()
+        for slot in slots:
+            if not slot:
+                continue
+            picked = slot.pick(self.rng, used)
+            if picked is not None:
+                used.add(picked[0])
+                chosen.append(picked)
+        return chosen
+
+    def _fit_amounts(self, combo, targets):
+        """
+        Подбирает порции покоординатным спуском: для каждого продукта
+        по очереди оцениваются все допустимые порции при фиксированных
+        остальных, пока оценка улучшается.
+        """
+        rates = [self.per_gram[position] for position, _ in combo]
+        # Начинаем с порций из середины диапазонов
+        amounts = [steps[len(steps) // 2] for _, steps in combo]
+        totals = [sum(rate[k] * amount for rate, amount in zip(rates, amounts)) for k in range(4)]
+        best = self.score(totals, targets)
+
+        for _ in range(DESCENT_PASSES):
+            improved = False
+            for i, (_, steps) in enumerate(combo):
+                rate = rates[i]
+                base = [totals[k] - rate[k] * amounts[i] for k in range(4)]
+                scored = [
+                    (self.score([base[k] + rate[k] * amount for k in range(4)], targets), amount)
+                    for amount in steps
+                ]
+                value, amount = min(scored)
+                if value < best - 1e-9:
+                    best = value
+                    amounts[i] = amount
+                    totals = [base[k] + rate[k] * amount for k in range(4)]
+                    improved = True
+            if not improved:
+                break
+
+        items = [(position, amount) for (position, _), amount in zip(combo, amounts) if amount > 0]
+        return best, items
+
+    def solve(self, meal_type, targets, count=1):
+        """
+        Возвращает до count лучших различающихся вариантов приема пищи
+        в виде списков (id продукта, граммы), от лучшего к худшему.
+        """
+        targets = tuple(max(value, 1.0) for value in targets)
+        slots = self.templates(meal_type)
+        seen = set()
+        variants = []
+        for _ in range(CANDIDATES):
+            combo = self._sample(slots)
+            key = frozenset(position for position, _ in combo)
+            if not combo or key in seen:
+                continue
+            seen.add(key)
+            variants.append(self._fit_amounts(combo, targets))
+        variants.sort(key=lambda variant: variant[0])
+
+        return [
+            [(self.index.ids[position], amount) for position, amount in items]
+            for _, items in variants[:count]
+        ]
+
+    def fill_week(self, meals, goal):
+        """
+        Подбирает продукты для приемов пищи плана.
+
+        Аргументы:
+            meals: приемы пищи плана
+            goal: цель по питанию (NutritionGoal)
+
+        Возвращает:
+            Словарь {id приема пищи: [(id продукта, граммы), ...]}
+        """
+        by_type = {}
+        for meal in sorted(meals, key=lambda meal: (meal.day_of_week, meal.pk)):
+            if meal.meal_type in MEAL_DISTRIBUTION:
+                by_type.setdefault(meal.meal_type, []).append(meal)
+
+        result = {}
+        for meal_type, typed_meals in by_type.items():
+            share = MEAL_DISTRIBUTION[meal_type]
+            targets = (
+                goal.target_calories * share['calories'],
+                goal.protein_daily * share['protein'],
+                goal.fats_daily * share['fats'],
+                goal.carbs_daily * share['carbs'],
+            )
+            variants = self.solve(meal_type, targets, count=len(typed_meals))
+            if not variants:
+                continue
+            # Разные дни получают разные варианты, при нехватке они повторяются
+            for number, meal in enumerate(typed_meals):
+                result[meal.pk] = variants[number % len(variants)]
+        return result
@@ -0,0 +1,92 @@
+"""
+Запись планов питания пакетами.
+
+Неделя плана создается одним bulk_create, продукты приемов пищи —
+одной транзакцией: питательная ценность считается в памяти по уже
+загруженным продуктам, а при повторном заполнении плана строки,
+которые не изменились, остаются на месте. Итоги КБЖУ плана после
+записи пересчитываются одним запросом.
+"""
+from django.db import transaction
+
+from .models import Food, Meal, MealItem
+from .nutrition import refresh_plan_totals
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+DAYS_OF_WEEK = range(1, 8)  # 1-7 (Понедельник - Воскресенье)
+
+
+def create_week(plan):
+    """Создает стандартные приемы пищи на каждый день недели"""
+    return Meal.objects.bulk_create([
+        Meal(plan=plan, meal_type=meal_type, day_of_week=day)
+        for day in DAYS_OF_WEEK
+        for meal_type in MEAL_TYPES
+    ])
+
+
+def build_item(meal_id, food, amount):
+    """Продукт приема пищи с рассчитанной питательной ценностью, без сохранения"""
+    item = MealItem(meal_id=meal_id, food=food, amount=amount)
+    item.calculate_nutrition(food)
+    return item
+
+
+@transaction.atomic
+def replace_plan_contents(meals, selection):
+    """
+    Приводит продукты приемов пищи к заданному составу.
+
+    Совпадающие продукты с той же порцией не трогаются, у совпадающих
+    продуктов с другой порцией обновляются порция и КБЖУ, остальные
+    строки удаляются, недостающие создаются.
+
+    Аргументы:
+        meals: приемы пищи плана; продукты приемов, которых нет
+            в selection, удаляются
+        selection: словарь {id приема пищи: [(id продукта, граммы), ...]}
+
+    Возвращает:
+        Кортеж (создано, обновлено, удалено)
+    """
+    meal_ids = [meal.pk for meal in meals]
+    wanted = {
+        (meal_id, food_id): amount
+        for meal_id, items in selection.items()
+        for food_id, amount in items
+    }
+
+    stale, changed = [], []
+    for item in MealItem.objects.filter(meal_id__in=meal_ids).only('id', 'meal_id', 'food_id', 'amount'):
+        key = (item.meal_id, item.food_id)
+        if key not in wanted:
+            # Сюда же попадают повторы одного продукта в приеме пищи
+            stale.append(item.pk)
+            continue
+        amount = wanted.pop(key)
+        if item.amount != amount:
+            item.amount = amount
+            changed.append(item)
+
+    foods = Food.objects.in_bulk(
+        {food_id for _, food_id in wanted} | {item.food_id for item in changed}
+    )
+    for item in changed:
+        item.calculate_nutrition(foods[item.food_id])
+
+    if stale:
+        MealItem.objects.filter(pk__in=stale).delete()
+    if changed:
+        MealItem.objects.bulk_update(changed, ['amount', 'calories', 'protein', 'fats', 'carbs'])
+    created = MealItem.objects.bulk_create([
+        build_item(meal_id, foods[food_id], amount)
+        for (meal_id, food_id), amount in wanted.items()
+        # Продукт мог быть удален после построения индекса каталога
+        if food_id in foods
+    ])
+
+    # Пакетные операции не вызывают сигналы, итоги плана пересчитываем сами
+    if stale or changed or created:
+        for plan_id in {meal.plan_id for meal in meals}:
+            refresh_plan_totals(plan_id)
+    return len(created), len(changed), len(stale)
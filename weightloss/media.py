@@ -0,0 +1,175 @@
+"""
+Отдача загруженных файлов (MEDIA_URL).
+
+Файлы с хэшем содержимого в имени (storage.HashedMediaStorage) и варианты
+изображений (images.py) не меняются никогда и отдаются с заголовком
+Cache-Control: immutable на год; остальные — с MEDIA_CACHE_MAX_AGE и
+повторной проверкой. Ответ содержит ETag и Last-Modified, условные
+запросы If-None-Match / If-Modified-Since получают 304, а Range —
+206 с запрошенным отрезком.
+
+Сам файл по возможности отдает веб-сервер: при MEDIA_ACCEL = 'x-accel'
+ответ содержит X-Accel-Redirect на внутренний location nginx
+(MEDIA_ACCEL_PREFIX), при 'x-sendfile' — X-Sendfile для Apache
+(mod_xsendfile) или lighttpd. Без этого, например под Passenger, файл
+читается крупными блоками (MEDIA_STREAM_BLOCK_SIZE) и отдается потоком.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import HASHED_NAME_RE, name_hash
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(name, stat):
+    digest = name_hash(name)
+    if digest is None:
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if HASHED_NAME_RE.search(name):
+        return f'"{digest}"'
+    # Все варианты одной картинки делят хэш исходника
+    return f'"{digest}-{os.path.basename(name)}"'
+
+
+def parse_range(header, size):
+    """
+    Отрезок (начало, конец включительно) из заголовка Range или None,
+    если заголовок не поддерживается (несколько отрезков, другие единицы).
+    Для отрезка за пределами файла возвращает False.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-N — последние N байт
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _range_applies(request, etag, mtime):
+    """If-Range: отрезок отдается, только если файл не изменился"""
+    condition = request.headers.get('If-Range')
+    if not condition:
+        return True
+    if condition.startswith(('"', 'W/')):
+        return condition == etag
+    since = parse_http_date_safe(condition)
+    return since is not None and int(mtime) <= since
+
+
+def _read(path, start, length, block_size):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(response, name, path):
+    if settings.MEDIA_ACCEL == 'x-accel':
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + name)
+        return True
+    if settings.MEDIA_ACCEL == 'x-sendfile':
+        response['X-Sendfile'] = path
+        return True
+    return False
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдает файл из MEDIA_ROOT с кэшированием, условными запросами и Range"""
+    name = path.lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = _etag(name, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if name_hash(name)
+            else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, must-revalidate'
+        ),
+    }
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        for header, value in headers.items():
+            conditional[header] = value
+        return conditional
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    size = stat.st_size
+
+    # Веб-сервер сам обработает Range и отдаст файл без участия Python
+    response = HttpResponse(content_type=content_type)
+    if _offload(response, name, full_path):
+        for header, value in headers.items():
+            response[header] = value
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
+
+    status, start, end = 200, 0, size - 1
+    range_header = request.headers.get('Range')
+    if range_header and size and _range_applies(request, etag, stat.st_mtime):
+        requested = parse_range(range_header, size)
+        if requested is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if requested is not None:
+            status, (start, end) = 206, requested
+
+    length = end - start + 1 if size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=status)
+    elif status == 200:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response.block_size = settings.MEDIA_STREAM_BLOCK_SIZE
+    else:
+        response = StreamingHttpResponse(
+            _read(full_path, start, length, settings.MEDIA_STREAM_BLOCK_SIZE),
+            content_type=content_type, status=status,
+        )
+    for header, value in headers.items():
+        response[header] = value
+    response['Content-Length'] = str(length)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+def fill_depth(apps, schema_editor):
+    """Проставляет глубину уже существующим комментариям и сообщениям форума"""
+    for model_name in ('Comment', 'RecipeComment', 'VIPComment', 'ForumPost'):
+        model = apps.get_model('weightloss', model_name)
+        parents = dict(model.objects.values_list('id', 'parent_id'))
+        depths = {}
+        for pk in parents:
+            chain = []
+            current = pk
+            while current is not None and current not in depths:
+                chain.append(current)
+                current = parents.get(current)
+            depth = depths[current] + 1 if current is not None else 0
+            for node in reversed(chain):
+                depths[node] = depth
+                depth += 1
+        changed = [model(pk=pk, depth=depth) for pk, depth in depths.items() if depth]
+        model.objects.bulk_update(changed, ['depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0019_food_foodcategory_meal_nutritiongoal_mealplan_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='recipecomment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='vipcomment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.RunPython(fill_depth, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики по уже существующим данным"""
+    from weightloss.counters import rebuild_counters
+    rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0020_comment_depth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='published_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных статей'),
+        ),
+        migrations.AddField(
+            model_name='forumcategory',
+            name='last_activity_on',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последняя активность'),
+        ),
+        migrations.AddField(
+            model_name='forumcategory',
+            name='topics_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Тем'),
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='replies_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ответов (всего)'),
+        ),
+        migrations.AddField(
+            model_name='forumtopic',
+            name='last_post_on',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата последнего сообщения'),
+        ),
+        migrations.AddField(
+            model_name='forumtopic',
+            name='latest_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='weightloss.forumpost', verbose_name='Последнее сообщение'),
+        ),
+        migrations.AddField(
+            model_name='forumtopic',
+            name='posts_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сообщений'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='comments_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    """Создает полнотекстовый индекс для текущей базы и заполняет его"""
+    from weightloss.search import get_backend, rebuild_index
+    get_backend(schema_editor.connection).install(schema_editor)
+    rebuild_index(apps, connection=schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from weightloss.search import get_backend
+    get_backend(schema_editor.connection).uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0021_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Статья'), ('recipe', 'Рецепт'), ('topic', 'Тема форума')], max_length=10, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID объекта')),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('text', models.TextField(blank=True, verbose_name='Текст')),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
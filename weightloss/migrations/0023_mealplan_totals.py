@@ -0,0 +1,40 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+def fill_plan_totals(apps, schema_editor):
+    """Заполняет итоги КБЖУ уже существующих планов питания"""
+    from weightloss.nutrition import rebuild_plan_totals
+    rebuild_plan_totals(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0022_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplan',
+            name='calories_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Калории (всего)'),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='carbs_total',
+            field=models.FloatField(default=0, editable=False, verbose_name='Углеводы (всего, г)'),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='fats_total',
+            field=models.FloatField(default=0, editable=False, verbose_name='Жиры (всего, г)'),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='protein_total',
+            field=models.FloatField(default=0, editable=False, verbose_name='Белки (всего, г)'),
+        ),
+        migrations.RunPython(fill_plan_totals, migrations.RunPython.noop),
+    ]
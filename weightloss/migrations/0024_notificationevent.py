@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('weightloss', '0023_mealplan_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30, verbose_name='Вид события')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID объекта')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Данные события')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Тип объекта')),
+            ],
+            options={
+                'verbose_name': 'Событие уведомлений',
+                'verbose_name_plural': 'Очередь уведомлений',
+                'ordering': ['id'],
+            },
+        ),
+    ]
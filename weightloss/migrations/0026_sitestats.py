@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_site_stats(apps, schema_editor):
+    """Создает строку статистики сайта по текущим данным"""
+    from weightloss.site_stats import refresh_site_stats
+    refresh_site_stats(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('weightloss', '0025_content_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('users_total', models.PositiveIntegerField(default=0, verbose_name='Пользователей')),
+                ('posts_published', models.PositiveIntegerField(default=0, verbose_name='Опубликованных статей')),
+                ('recipes_published', models.PositiveIntegerField(default=0, verbose_name='Опубликованных рецептов')),
+                ('topics_total', models.PositiveIntegerField(default=0, verbose_name='Тем форума')),
+                ('forum_posts_total', models.PositiveIntegerField(default=0, verbose_name='Сообщений форума')),
+                ('trending', models.JSONField(blank=True, default=dict, verbose_name='Популярное')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True, verbose_name='Полный пересчет')),
+                ('latest_member', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Последний зарегистрированный')),
+            ],
+            options={
+                'verbose_name': 'Статистика сайта',
+                'verbose_name_plural': 'Статистика сайта',
+            },
+        ),
+        migrations.RunPython(fill_site_stats, migrations.RunPython.noop),
+    ]
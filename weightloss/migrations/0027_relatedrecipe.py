@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_related_recipes(apps, schema_editor):
+    """Рассчитывает похожие рецепты для уже опубликованных"""
+    from weightloss.related import rebuild_related_recipes
+    rebuild_related_recipes(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0026_sitestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Оценка сходства')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='weightloss.recipe')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='weightloss.recipe')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'ordering': ['recipe', 'rank'],
+                'unique_together': {('recipe', 'rank')},
+            },
+        ),
+        migrations.RunPython(fill_related_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_related_posts(apps, schema_editor):
+    """Рассчитывает похожие статьи для уже опубликованных"""
+    from weightloss.related import rebuild_related_posts
+    rebuild_related_posts(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0027_relatedrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerms',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='terms', serialize=False, to='weightloss.post')),
+                ('terms', models.JSONField(default=dict, verbose_name='Основы слов')),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Слова статьи',
+                'verbose_name_plural': 'Слова статей',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Оценка сходства')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='weightloss.post')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='weightloss.post')),
+            ],
+            options={
+                'verbose_name': 'Похожая статья',
+                'verbose_name_plural': 'Похожие статьи',
+                'ordering': ['post', 'rank'],
+                'unique_together': {('post', 'rank')},
+            },
+        ),
+        migrations.RunPython(fill_related_posts, migrations.RunPython.noop),
+    ]
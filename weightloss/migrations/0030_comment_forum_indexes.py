@@ -0,0 +1,45 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0029_post_recipe_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_on'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['post', '-created_on'], name='comment_post_root_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipecomment',
+            index=models.Index(fields=['recipe', 'created_on'], name='rcomment_recipe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipecomment',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['recipe', '-created_on'], name='rcomment_recipe_root_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vipcomment',
+            index=models.Index(fields=['post', 'created_on'], name='vipcomment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumtopic',
+            index=models.Index(fields=['category', '-is_pinned', '-updated_on'], name='topic_category_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumtopic',
+            index=models.Index(fields=['author', '-created_on'], name='topic_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['topic', 'created_on'], name='forumpost_topic_created_idx'),
+        ),
+    ]
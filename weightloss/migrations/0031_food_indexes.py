@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weightloss', '0030_comment_forum_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(condition=models.Q(('is_custom', False)), fields=['name'], name='food_catalog_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(condition=models.Q(('is_custom', True)), fields=['user', 'name'], name='food_custom_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['category', 'name'], name='food_category_name_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django_ckeditor_5.fields import CKEditor5Field
@@ -8,11 +11,90 @@ import string
 from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from .utils import generate_unique_slug
+from . import notification_bus
+from .slugs import UniqueSlugMixin
+from .threads import build_thread, count_replies
 
-class Category(models.Model):
+
+class ThreadedModel(models.Model):
+    """
+    Базовая модель для древовидных комментариев и сообщений форума.
+    Хранит глубину узла, чтобы шаблоны могли выводить уровень вложенности
+    без обхода цепочки родителей.
+    """
+    # Имя внешнего ключа на объект, к которому относится ветка (post, recipe, topic)
+    thread_field = None
+    
+    depth = models.PositiveIntegerField(default=0, editable=False, verbose_name='Уровень вложенности')
+    
+    class Meta:
+        abstract = True
+    
+    def save(self, *args, **kwargs):
+        self.depth = self.parent.depth + 1 if self.parent_id else 0
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def load_thread(cls, owner):
+        """
+        Загружает всю ветку объекта owner одним запросом и собирает дерево
+        """
+        nodes = cls.objects.filter(**{cls.thread_field: owner}).select_related(
+            'author', 'author__profile'
+        ).order_by('created_on', 'pk')
+        return build_thread(nodes, shared={cls.thread_field: owner})
+    
+    @classmethod
+    def with_ancestors(cls, node_id):
+        """
+        QuerySet узла node_id и всех его предков. Цепочка родителей
+        выбирается одним рекурсивным подзапросом, без загрузки всей ветки.
+        """
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        pk = quote(cls._meta.pk.column)
+        parent = quote(cls._meta.get_field('parent').column)
+        sql = (
+            f'WITH RECURSIVE chain(node, parent) AS ('
+            f'SELECT {pk}, {parent} FROM {table} WHERE {pk} = %s '
+            f'UNION ALL SELECT t.{pk}, t.{parent} FROM {table} t JOIN chain ON t.{pk} = chain.parent'
+            f') SELECT node FROM chain'
+        )
+        return cls.objects.filter(pk__in=RawSQL(sql, [node_id]))
+    
+    def total_replies_count(self):
+        """
+        Возвращает общее количество ответов на этот узел,
+        включая ответы на ответы на всех уровнях вложенности.
+        """
+        thread_attname = f'{self.thread_field}_id'
+        rows = type(self).objects.filter(
+            **{thread_attname: getattr(self, thread_attname)}
+        ).values_list('id', 'parent_id')
+        return count_replies(rows, self.pk)
+
+class CounterFieldsMixin:
+    """
+    Не перезаписывает денормализованные счетчики при сохранении уже
+    существующего объекта: их значения в памяти могли устареть, а сами
+    счетчики обновляются сигналами через F()-выражения.
+    """
+    counter_fields = ()
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and self.counter_fields and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+class Category(CounterFieldsMixin, models.Model):
+    counter_fields = ('published_total',)
+    
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
+    published_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных статей')
     
     class Meta:
         verbose_name_plural = 'Categories'
@@ -26,9 +108,10 @@ class Category(models.Model):
         return reverse('category_detail', args=[self.slug])
     
     def published_count(self):
-        return self.posts.filter(status='published').count()
+        return self.published_total
 
-class Post(models.Model):
+class Post(UniqueSlugMixin, CounterFieldsMixin, models.Model):
+    slug_fallback = 'post'
     STATUS_CHOICES = (
         ('draft', 'Черновик'),
         ('published', 'Опубликовано'),
@@ -36,6 +119,8 @@ class Post(models.Model):
         ('rejected', 'Отклонено'),
     )
     
+    counter_fields = ('comments_total', 'views')
+    
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
@@ -46,11 +131,19 @@ class Post(models.Model):
     updated_on = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     is_featured = models.BooleanField(default=False)
+    comments_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев')
+    views = models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотров')
     
     class Meta:
         ordering = ['-created_on']
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
+        # Ленты опубликованных статей: общая, категории и автора (см. check_query_plans)
+        indexes = [
+            models.Index(fields=['status', '-created_on'], name='post_status_created_idx'),
+            models.Index(fields=['category', 'status', '-created_on'], name='post_category_status_idx'),
+            models.Index(fields=['author', 'status', '-created_on'], name='post_author_status_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -58,18 +151,16 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse('post_detail', args=[self.slug])
     
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = generate_unique_slug(Post, self.title)
-        super().save(*args, **kwargs)
     
     def comment_count(self):
-        return self.comments.count()
+        return self.comments_total
     
     def get_comments(self):
         return self.comments.filter(parent=None).order_by('-created_on')
 
-class Comment(models.Model):
+class Comment(ThreadedModel):
+    thread_field = 'post'
+    
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
@@ -80,6 +171,13 @@ class Comment(models.Model):
         ordering = ['created_on']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            # Ветка статьи целиком (load_thread)
+            models.Index(fields=['post', 'created_on'], name='comment_post_created_idx'),
+            # Комментарии верхнего уровня (get_comments); условие parent IS NULL
+            # попадает в SQL без параметров, поэтому частичный индекс работает и в SQLite
+            models.Index(fields=['post', '-created_on'], condition=models.Q(parent__isnull=True), name='comment_post_root_idx'),
+        ]
     
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
@@ -87,13 +185,51 @@ class Comment(models.Model):
     def get_replies(self):
         return Comment.objects.filter(parent=self).order_by('created_on')
 
-class Recipe(models.Model):
+class PostTerms(models.Model):
+    """
+    Основы слов опубликованной статьи с числом вхождений — исходные данные
+    векторов TF-IDF для похожих статей (см. related.py)
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='terms')
+    terms = models.JSONField(default=dict, verbose_name='Основы слов')
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Слова статьи'
+        verbose_name_plural = 'Слова статей'
+
+    def __str__(self):
+        return str(self.post)
+
+class RelatedPost(models.Model):
+    """
+    Похожая статья с оценкой сходства TF-IDF. Таблицу заполняют
+    related.rebuild_related_posts и related.update_related_post.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Оценка сходства')
+
+    class Meta:
+        ordering = ['post', 'rank']
+        unique_together = ('post', 'rank')
+        verbose_name = 'Похожая статья'
+        verbose_name_plural = 'Похожие статьи'
+
+    def __str__(self):
+        return f'{self.post} → {self.related}'
+
+class Recipe(UniqueSlugMixin, CounterFieldsMixin, models.Model):
+    slug_fallback = 'recipe'
     STATUS_CHOICES = (
         ('draft', 'На рассмотрении'),
         ('published', 'Опубликовано'),
         ('rejected', 'Отклонено'),
     )
     
+    counter_fields = ('comments_total', 'views')
+    
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes', null=True, blank=True)
@@ -110,6 +246,8 @@ class Recipe(models.Model):
     is_featured = models.BooleanField(default=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     rejection_reason = models.TextField(blank=True, null=True)
+    comments_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев')
+    views = models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотров')
     
     def __str__(self):
         return self.title
@@ -117,23 +255,25 @@ class Recipe(models.Model):
     def get_absolute_url(self):
         return reverse('recipe_detail', args=[self.slug])
     
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = generate_unique_slug(Recipe, self.title)
-        super().save(*args, **kwargs)
     
     class Meta:
         ordering = ['-created_on']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['status', '-created_on'], name='recipe_status_created_idx'),
+            models.Index(fields=['author', 'status', '-created_on'], name='recipe_author_status_idx'),
+        ]
         
     def comment_count(self):
-        return self.recipe_comments.count()
+        return self.comments_total
     
     def get_comments(self):
         return self.recipe_comments.filter(parent=None).order_by('-created_on')
 
-class RecipeComment(models.Model):
+class RecipeComment(ThreadedModel):
+    thread_field = 'recipe'
+    
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipe_comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
@@ -144,6 +284,10 @@ class RecipeComment(models.Model):
         ordering = ['created_on']
         verbose_name = 'Комментарий к рецепту'
         verbose_name_plural = 'Комментарии к рецептам'
+        indexes = [
+            models.Index(fields=['recipe', 'created_on'], name='rcomment_recipe_created_idx'),
+            models.Index(fields=['recipe', '-created_on'], condition=models.Q(parent__isnull=True), name='rcomment_recipe_root_idx'),
+        ]
     
     def __str__(self):
         return f'Comment by {self.author.username} on {self.recipe.title}'
@@ -151,7 +295,28 @@ class RecipeComment(models.Model):
     def get_replies(self):
         return RecipeComment.objects.filter(parent=self).order_by('created_on')
 
-class Challenge(models.Model):
+class RelatedRecipe(models.Model):
+    """
+    Похожий рецепт с заранее рассчитанной оценкой сходства.
+    Таблицу заполняет related.rebuild_related_recipes (команда
+    rebuild_related_recipes), страница рецепта читает ее одним запросом.
+    """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Оценка сходства')
+
+    class Meta:
+        ordering = ['recipe', 'rank']
+        unique_together = ('recipe', 'rank')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} → {self.related}'
+
+class Challenge(UniqueSlugMixin, models.Model):
+    slug_fallback = 'challenge'
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = CKEditor5Field('Описание', config_name='default')
@@ -214,12 +379,16 @@ class UserProfile(models.Model):
         verbose_name_plural = 'Профили пользователей'
 
 # Новые модели для форума
-class ForumCategory(models.Model):
+class ForumCategory(CounterFieldsMixin, models.Model):
+    counter_fields = ('topics_total', 'last_activity_on')
+    
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, blank=True, help_text="Font Awesome class e.g. 'fa-users'")
     order = models.PositiveIntegerField(default=0)
+    topics_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Тем')
+    last_activity_on = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Последняя активность')
     
     class Meta:
         verbose_name_plural = 'Forum Categories'
@@ -234,12 +403,15 @@ class ForumCategory(models.Model):
         return reverse('forum_category', args=[self.slug])
     
     def topics_count(self):
-        return self.topics.count()
+        return self.topics_total
     
     def last_topic(self):
         return self.topics.order_by('-created_on').first()
 
-class ForumTopic(models.Model):
+class ForumTopic(UniqueSlugMixin, CounterFieldsMixin, models.Model):
+    slug_fallback = 'topic'
+    counter_fields = ('posts_total', 'latest_post', 'last_post_on', 'views')
+    
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     category = models.ForeignKey(ForumCategory, on_delete=models.CASCADE, related_name='topics')
@@ -250,11 +422,19 @@ class ForumTopic(models.Model):
     views = models.PositiveIntegerField(default=0)
     is_closed = models.BooleanField(default=False)
     is_pinned = models.BooleanField(default=False)
+    posts_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Сообщений')
+    latest_post = models.ForeignKey('ForumPost', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+', verbose_name='Последнее сообщение')
+    last_post_on = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Дата последнего сообщения')
     
     class Meta:
         ordering = ['-is_pinned', '-updated_on']
         verbose_name = 'Тема форума'
         verbose_name_plural = 'Темы форума'
+        indexes = [
+            # Список тем категории в порядке сортировки по умолчанию
+            models.Index(fields=['category', '-is_pinned', '-updated_on'], name='topic_category_order_idx'),
+            models.Index(fields=['author', '-created_on'], name='topic_author_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -263,21 +443,20 @@ class ForumTopic(models.Model):
         return reverse('forum_topic_detail', args=[self.category.slug, self.slug])
     
     def posts_count(self):
-        return self.forum_posts.count()
+        return self.posts_total
     
     def replies_count(self):
         # Возвращает количество ответов (без учета начального поста)
-        return self.forum_posts.count() - 1 if self.forum_posts.count() > 0 else 0
+        return self.posts_total - 1 if self.posts_total > 0 else 0
     
     def last_post(self):
-        return self.forum_posts.order_by('-created_on').first()
+        return self.latest_post
     
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = generate_unique_slug(ForumTopic, self.title)
-        super().save(*args, **kwargs)
 
-class ForumPost(models.Model):
+class ForumPost(CounterFieldsMixin, ThreadedModel):
+    thread_field = 'topic'
+    counter_fields = ('replies_total',)
+    
     topic = models.ForeignKey(ForumTopic, on_delete=models.CASCADE, related_name='forum_posts')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='forum_posts')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
@@ -285,11 +464,16 @@ class ForumPost(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
     is_solution = models.BooleanField(default=False)
+    replies_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Ответов (всего)')
     
     class Meta:
         ordering = ['created_on']
         verbose_name = 'Сообщение форума'
         verbose_name_plural = 'Сообщения форума'
+        indexes = [
+            # Ветка темы и последнее сообщение темы
+            models.Index(fields=['topic', 'created_on'], name='forumpost_topic_created_idx'),
+        ]
     
     def __str__(self):
         return f'Post by {self.author.username} on {self.topic.title}'
@@ -299,22 +483,13 @@ class ForumPost(models.Model):
     
     def get_absolute_url(self):
         return f'{self.topic.get_absolute_url()}#post-{self.id}'
-        
+    
     def total_replies_count(self):
         """
-        Рекурсивно подсчитывает общее количество ответов на этот пост,
-        включая ответы на ответы на всех уровнях вложенности.
+        Возвращает общее количество ответов на этот пост на всех уровнях
+        вложенности; счетчик поддерживается сигналами.
         """
-        # Получаем прямые ответы
-        direct_replies = self.get_replies().count()
-        
-        # Рекурсивно подсчитываем ответы на ответы
-        nested_replies = 0
-        for reply in self.get_replies():
-            nested_replies += reply.total_replies_count()
-            
-        # Возвращаем сумму прямых и вложенных ответов
-        return direct_replies + nested_replies
+        return self.replies_total
 
 # Модель для уведомлений пользователя
 class Notification(models.Model):
@@ -357,8 +532,21 @@ class Notification(models.Model):
         return f"Уведомление для {self.recipient.username}: {self.title}"
     
     def mark_as_read(self):
+        if self.is_read:
+            return
         self.is_read = True
-        self.save()
+        self.save(update_fields=['is_read'])
+        Notification.invalidate_unread(self.recipient_id)
+    
+    def as_event(self):
+        """Данные уведомления для отправки в браузер (см. notification_bus.py)"""
+        return {
+            'type': 'notification',
+            'id': self.pk,
+            'title': self.title,
+            'message': self.message,
+            'url': self.url,
+        }
     
     @classmethod
     def create_notification(cls, recipient, notification_type, title, message, 
@@ -372,17 +560,125 @@ class Notification(models.Model):
             title=title,
             message=message,
             sender=sender,
-            url=url
+            url=url or ''
         )
         
         if content_object:
             notification.content_object = content_object
             
         notification.save()
+        cls.invalidate_unread(notification.recipient_id, [notification])
         return notification
+    
+    # Счетчик непрочитанных уведомлений хранится в кэше, чтобы не считать
+    # COUNT(*) при каждом показе страницы. Уведомления создает отдельный
+    # процесс process_notifications, поэтому при изменениях запись кэша
+    # удаляется, а не увеличивается (incr файлового кэша не атомарен), и
+    # следующее чтение считает заново. Кэш в памяти процесса не видит
+    # изменений из других процессов, поэтому с ним счетчик живет недолго
+    # (UNREAD_COUNT_LOCAL_TIMEOUT) и может отставать на это время.
+    UNREAD_COUNT_KEY = 'notifications-unread:{}'
+    UNREAD_COUNT_TIMEOUT = 60 * 60
+    UNREAD_COUNT_LOCAL_TIMEOUT = 30
+    
+    @classmethod
+    def count_unread(cls, user_id):
+        return cls.objects.filter(recipient_id=user_id, is_read=False).count()
+    
+    @classmethod
+    def unread_count(cls, user_id):
+        """Возвращает количество непрочитанных уведомлений пользователя"""
+        key = cls.UNREAD_COUNT_KEY.format(user_id)
+        count = cache.get(key)
+        if count is None:
+            count = cls.count_unread(user_id)
+            timeout = cls.UNREAD_COUNT_TIMEOUT if settings.SHARED_CACHE else cls.UNREAD_COUNT_LOCAL_TIMEOUT
+            cache.add(key, count, timeout)
+        return count
+    
+    @classmethod
+    def invalidate_unread(cls, user_id, notifications=()):
+        """
+        После фиксации транзакции сбрасывает счетчик непрочитанных и
+        сообщает подключенным браузерам пользователя новые уведомления
+        и пересчитанное значение счетчика
+        """
+        events = [notification.as_event() for notification in notifications]
+        
+        def apply():
+            cls.reset_unread(user_id)
+            for event in events:
+                notification_bus.publish(user_id, event)
+            notification_bus.publish(user_id, {'type': 'unread', 'count': cls.unread_count(user_id)})
+        
+        transaction.on_commit(apply)
+    
+    @classmethod
+    def reset_unread(cls, *user_ids):
+        """Удаляет счетчики из кэша; они будут посчитаны при следующем чтении"""
+        cache.delete_many([cls.UNREAD_COUNT_KEY.format(user_id) for user_id in user_ids])
+    
+    @classmethod
+    def mark_all_as_read(cls, user_id):
+        """Отмечает все уведомления пользователя прочитанными и обнуляет счетчик"""
+        cls.objects.filter(recipient_id=user_id, is_read=False).update(is_read=True)
+        
+        def apply():
+            cls.reset_unread(user_id)
+            notification_bus.publish(user_id, {'type': 'unread', 'count': 0})
+        
+        transaction.on_commit(apply)
+
+class NotificationEvent(models.Model):
+    """
+    Событие в очереди уведомлений.
+    
+    Сигналы только записывают событие (вид и ссылку на объект), а команда
+    process_notifications пакетами превращает события в уведомления
+    (см. notifications.py).
+    """
+    kind = models.CharField(max_length=30, verbose_name='Вид события')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name='Тип объекта')
+    object_id = models.PositiveIntegerField(verbose_name='ID объекта')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Данные события')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Событие уведомлений'
+        verbose_name_plural = 'Очередь уведомлений'
+    
+    def __str__(self):
+        return f'{self.kind} #{self.object_id}'
+
+class SiteStats(models.Model):
+    """
+    Сводная статистика сайта — единственная строка (site_stats.SINGLETON_PK).
+    
+    Счетчики увеличиваются сигналами через F()-выражения, популярные
+    материалы и полный пересчет обновляет команда refresh_site_stats
+    (см. site_stats.py).
+    """
+    users_total = models.PositiveIntegerField(default=0, verbose_name='Пользователей')
+    posts_published = models.PositiveIntegerField(default=0, verbose_name='Опубликованных статей')
+    recipes_published = models.PositiveIntegerField(default=0, verbose_name='Опубликованных рецептов')
+    topics_total = models.PositiveIntegerField(default=0, verbose_name='Тем форума')
+    forum_posts_total = models.PositiveIntegerField(default=0, verbose_name='Сообщений форума')
+    latest_member = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='+', verbose_name='Последний зарегистрированный')
+    trending = models.JSONField(default=dict, blank=True, verbose_name='Популярное')
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name='Полный пересчет')
+    
+    class Meta:
+        verbose_name = 'Статистика сайта'
+        verbose_name_plural = 'Статистика сайта'
+    
+    def __str__(self):
+        return 'Статистика сайта'
 
 # VIP раздел
-class VIPPost(models.Model):
+class VIPPost(UniqueSlugMixin, models.Model):
+    slug_fallback = 'vip-post'
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True)
     content = CKEditor5Field('Содержание', config_name='default')
@@ -401,12 +697,10 @@ class VIPPost(models.Model):
     def get_absolute_url(self):
         return reverse('vip_detail', args=[self.slug])
     
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = generate_unique_slug(VIPPost, self.title)
-        super().save(*args, **kwargs)
 
-class VIPComment(models.Model):
+class VIPComment(ThreadedModel):
+    thread_field = 'post'
+    
     post = models.ForeignKey(VIPPost, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vip_comments')
     content = CKEditor5Field('Содержание', config_name='default')
@@ -417,6 +711,9 @@ class VIPComment(models.Model):
         ordering = ['created_on']
         verbose_name = "VIP комментарий"
         verbose_name_plural = "VIP комментарии"
+        indexes = [
+            models.Index(fields=['post', 'created_on'], name='vipcomment_post_created_idx'),
+        ]
     
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
@@ -438,7 +735,9 @@ class ContactMessage(models.Model):
         return f'Сообщение от {self.name}: {self.subject}'
 
 # Модели для калькулятора рациона и плана питания
-class FoodCategory(models.Model):
+class FoodCategory(UniqueSlugMixin, models.Model):
+    slug_source = 'name'
+    slug_fallback = 'category'
     name = models.CharField(max_length=100, verbose_name="Название категории")
     slug = models.SlugField(unique=True)
     icon = models.CharField(max_length=50, blank=True, help_text="Font Awesome класс, напр. 'fa-apple'")
@@ -452,10 +751,6 @@ class FoodCategory(models.Model):
     def __str__(self):
         return self.name
     
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = generate_unique_slug(FoodCategory, self.name)
-        super().save(*args, **kwargs)
 
 class Food(models.Model):
     name = models.CharField(max_length=200, verbose_name="Название продукта")
@@ -472,6 +767,14 @@ class Food(models.Model):
         ordering = ['name']
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
+        # Фильтр по is_custom Django записывает как WHERE NOT "is_custom", а не
+        # сравнением, и составной индекс по этому полю SQLite не использует;
+        # частичный индекс с тем же условием использует
+        indexes = [
+            models.Index(fields=['name'], condition=models.Q(is_custom=False), name='food_catalog_name_idx'),
+            models.Index(fields=['user', 'name'], condition=models.Q(is_custom=True), name='food_custom_user_idx'),
+            models.Index(fields=['category', 'name'], name='food_category_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -580,13 +883,21 @@ class NutritionGoal(models.Model):
         
         super().save(*args, **kwargs)
 
-class MealPlan(models.Model):
+class MealPlan(CounterFieldsMixin, models.Model):
+    counter_fields = ('calories_total', 'protein_total', 'fats_total', 'carbs_total')
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="meal_plans", verbose_name="Пользователь")
     name = models.CharField(max_length=200, verbose_name="Название плана")
     nutrition_goal = models.ForeignKey(NutritionGoal, on_delete=models.CASCADE, related_name="meal_plans", verbose_name="Цель по питанию")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
+    # Итоги плана, пересчитываются при изменении продуктов (см. nutrition.py)
+    calories_total = models.PositiveIntegerField(default=0, editable=False, verbose_name="Калории (всего)")
+    protein_total = models.FloatField(default=0, editable=False, verbose_name="Белки (всего, г)")
+    fats_total = models.FloatField(default=0, editable=False, verbose_name="Жиры (всего, г)")
+    carbs_total = models.FloatField(default=0, editable=False, verbose_name="Углеводы (всего, г)")
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = "План питания"
@@ -597,31 +908,19 @@ class MealPlan(models.Model):
     
     def total_calories(self):
         """Возвращает общее количество калорий в плане питания"""
-        total = 0
-        for meal in self.meals.all():
-            total += meal.total_calories()
-        return total
+        return self.calories_total
     
     def total_protein(self):
         """Возвращает общее количество белка в плане питания"""
-        total = 0
-        for meal in self.meals.all():
-            total += meal.total_protein()
-        return total
+        return self.protein_total
     
     def total_fats(self):
         """Возвращает общее количество жиров в плане питания"""
-        total = 0
-        for meal in self.meals.all():
-            total += meal.total_fats()
-        return total
+        return self.fats_total
     
     def total_carbs(self):
         """Возвращает общее количество углеводов в плане питания"""
-        total = 0
-        for meal in self.meals.all():
-            total += meal.total_carbs()
-        return total
+        return self.carbs_total
 
 class Meal(models.Model):
     MEAL_TYPE_CHOICES = (
@@ -643,33 +942,33 @@ class Meal(models.Model):
     def __str__(self):
         return f"{self.get_day_of_week_display()} - {self.get_meal_type_display()}"
     
+    def _total(self, macro):
+        """
+        Итог по макронутриенту: из итогов, посчитанных nutrition.PlanNutrition,
+        из предзагруженных продуктов или одним запросом SUM
+        """
+        nutrition = getattr(self, 'nutrition', None)
+        if nutrition is not None:
+            return nutrition[macro]
+        if 'meal_items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(getattr(item, macro) for item in self.meal_items.all())
+        return self.meal_items.aggregate(total=models.Sum(macro))['total'] or 0
+    
     def total_calories(self):
         """Возвращает общее количество калорий в приеме пищи"""
-        total = 0
-        for item in self.meal_items.all():
-            total += item.calories
-        return total
+        return self._total('calories')
     
     def total_protein(self):
         """Возвращает общее количество белка в приеме пищи"""
-        total = 0
-        for item in self.meal_items.all():
-            total += item.protein
-        return total
+        return self._total('protein')
     
     def total_fats(self):
         """Возвращает общее количество жиров в приеме пищи"""
-        total = 0
-        for item in self.meal_items.all():
-            total += item.fats
-        return total
+        return self._total('fats')
     
     def total_carbs(self):
         """Возвращает общее количество углеводов в приеме пищи"""
-        total = 0
-        for item in self.meal_items.all():
-            total += item.carbs
-        return total
+        return self._total('carbs')
 
 class MealItem(models.Model):
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name="meal_items", verbose_name="Прием пищи")
@@ -689,10 +988,44 @@ class MealItem(models.Model):
     def __str__(self):
         return f"{self.food.name} ({self.amount}г)"
     
+    def calculate_nutrition(self, food=None):
+        """
+        Рассчитывает питательную ценность на основе количества.
+        Уже загруженный продукт можно передать явно, чтобы не запрашивать его.
+        """
+        food = food or self.food
+        self.calories = int(food.calories * self.amount / 100)
+        self.protein = round(food.protein * self.amount / 100, 1)
+        self.fats = round(food.fats * self.amount / 100, 1)
+        self.carbs = round(food.carbs * self.amount / 100, 1)
+    
     def save(self, *args, **kwargs):
-        # Рассчитываем питательную ценность на основе количества
-        self.calories = int(self.food.calories * self.amount / 100)
-        self.protein = round(self.food.protein * self.amount / 100, 1)
-        self.fats = round(self.food.fats * self.amount / 100, 1)
-        self.carbs = round(self.food.carbs * self.amount / 100, 1)
+        self.calculate_nutrition()
         super().save(*args, **kwargs)
+
+# Поисковый индекс
+class SearchDocument(models.Model):
+    """
+    Текст статьи, рецепта или темы форума, подготовленный для поиска.
+    Сам полнотекстовый индекс (FTS5 в SQLite, tsvector в PostgreSQL)
+    ведется модулем search.py; здесь хранится текст без HTML для сниппетов.
+    """
+    KIND_CHOICES = (
+        ('post', 'Статья'),
+        ('recipe', 'Рецепт'),
+        ('topic', 'Тема форума'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='Тип')
+    object_id = models.PositiveIntegerField(verbose_name='ID объекта')
+    title = models.CharField(max_length=200, verbose_name='Заголовок')
+    text = models.TextField(blank=True, verbose_name='Текст')
+    updated_on = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('kind', 'object_id')
+        verbose_name = 'Поисковый документ'
+        verbose_name_plural = 'Поисковые документы'
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
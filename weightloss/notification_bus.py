@@ -0,0 +1,226 @@
+"""
+Шина событий уведомлений для потоковой доставки в браузер.
+
+Модель Notification публикует в шину изменения счетчика непрочитанных
+и новые уведомления, а представления notification_stream (SSE под ASGI)
+и notification_poll (long-poll под WSGI/Passenger) подписываются на
+события пользователя и ждут их, не обращаясь к базе данных.
+
+Реализация выбирается настройкой NOTIFICATION_BUS:
+
+- InProcessBus — подписчики в памяти процесса. Подходит, когда
+  уведомления создаются в том же процессе, что и обслуживает запросы
+  (один процесс сервера, NOTIFICATIONS_EAGER).
+- CacheBus — события передаются через общий кэш (Redis или файловый),
+  поэтому доходят из обработчика очереди и других процессов сервера.
+  Один фоновый поток в процессе раз в NOTIFICATION_BUS_POLL_INTERVAL
+  секунд опрашивает кэш сразу для всех подписанных пользователей.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Подписка на события одного пользователя, ожидать можно из потока или корутины"""
+
+    def __init__(self, bus, user_id):
+        self.bus = bus
+        self.user_id = user_id
+        self._events = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._waiters = []
+
+    def push(self, event):
+        with self._lock:
+            self._events.append(event)
+            self._ready.set()
+            waiters = list(self._waiters)
+        for loop, ready in waiters:
+            loop.call_soon_threadsafe(ready.set)
+
+    def _drain(self):
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._ready.clear()
+        return events
+
+    def wait(self, timeout):
+        """Ждет события не дольше timeout секунд, возвращает список событий"""
+        self._ready.wait(timeout)
+        return self._drain()
+
+    async def wait_async(self, timeout):
+        """То же, что wait, но без занятого потока — для ASGI"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            ready = self._ready.is_set()
+            if not ready:
+                self._waiters.append(waiter)
+        if not ready:
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    self._waiters.remove(waiter)
+        return self._drain()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class InProcessBus:
+    """Шина в памяти процесса"""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscribed_users(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def deliver(self, user_id, event):
+        """Передает событие подписчикам пользователя в этом процессе"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+
+class CacheBus(InProcessBus):
+    """
+    Шина поверх кэша Django: у каждого пользователя есть номер последнего
+    события, сами события хранятся под ключами с номером и живут EVENT_TIMEOUT
+    секунд.
+    """
+    SEQUENCE_KEY = 'notification-bus:{}'
+    EVENT_KEY = 'notification-bus:{}:{}'
+    EVENT_TIMEOUT = 60
+    # Больше событий за один опрос не передаем: клиенту важен итоговый счетчик
+    MAX_EVENTS = 20
+
+    def __init__(self):
+        super().__init__()
+        self._positions = {}
+        self._relay = None
+
+    def publish(self, user_id, event):
+        key = self.SEQUENCE_KEY.format(user_id)
+        cache.add(key, 0, None)
+        try:
+            sequence = cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+            sequence = 1
+        cache.set(self.EVENT_KEY.format(user_id, sequence), event, self.EVENT_TIMEOUT)
+
+    def subscribe(self, user_id):
+        with self._lock:
+            tracked = user_id in self._positions
+        if not tracked:
+            position = cache.get(self.SEQUENCE_KEY.format(user_id), 0)
+            with self._lock:
+                self._positions.setdefault(user_id, position)
+        subscription = super().subscribe(user_id)
+        self._start_relay()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        with self._lock:
+            if subscription.user_id not in self._subscriptions:
+                self._positions.pop(subscription.user_id, None)
+
+    def _start_relay(self):
+        with self._lock:
+            if self._relay is None or not self._relay.is_alive():
+                self._relay = threading.Thread(target=self._run_relay, name='notification-bus', daemon=True)
+                self._relay.start()
+
+    def _run_relay(self):
+        failing = False
+        while True:
+            time.sleep(settings.NOTIFICATION_BUS_POLL_INTERVAL)
+            try:
+                self.poll()
+            except Exception:
+                # Недоступность кэша не должна останавливать поток;
+                # в журнал пишем только начало серии ошибок
+                if not failing:
+                    logger.warning('Шина уведомлений: не удалось опросить кэш', exc_info=True)
+                failing = True
+            else:
+                if failing:
+                    logger.info('Шина уведомлений: опрос кэша восстановлен')
+                failing = False
+
+    def poll(self):
+        """Один проход: читает номера событий всех подписанных пользователей одним get_many"""
+        users = self.subscribed_users()
+        if not users:
+            return
+        sequences = cache.get_many([self.SEQUENCE_KEY.format(user_id) for user_id in users])
+        for user_id in users:
+            sequence = sequences.get(self.SEQUENCE_KEY.format(user_id), 0)
+            with self._lock:
+                position = self._positions.get(user_id, sequence)
+                self._positions[user_id] = sequence
+            if sequence <= position:
+                continue
+            first = max(position + 1, sequence - self.MAX_EVENTS + 1)
+            keys = [self.EVENT_KEY.format(user_id, number) for number in range(first, sequence + 1)]
+            events = cache.get_many(keys)
+            for key in keys:
+                if key in events:
+                    self.deliver(user_id, events[key])
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = import_string(settings.NOTIFICATION_BUS)()
+    return _bus
+
+
+def publish(user_id, event):
+    """Публикует событие пользователю; ошибки шины не мешают основной операции"""
+    try:
+        get_bus().publish(user_id, event)
+    except Exception:
+        logger.warning('Шина уведомлений: не удалось опубликовать событие для пользователя %s', user_id, exc_info=True)
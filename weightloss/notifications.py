@@ -0,0 +1,358 @@
+"""
+Очередь уведомлений.
+
+Сигналы не создают уведомления сами, а только записывают в таблицу
+NotificationEvent событие: вид, ссылку на объект и немного данных.
+Запись идет в той же транзакции, что и сам комментарий или сообщение,
+поэтому событие не теряется и не появляется для отмененных изменений.
+
+Команда process_notifications пакетами разбирает очередь: объекты
+событий загружаются одним запросом на вид события, уведомления одного
+получателя об одной и той же ветке обсуждения объединяются в одно,
+а результат записывается одним bulk_create.
+
+Ошибка в одном событии не останавливает очередь: событие, обработчик
+которого упал, записывается в лог и отбрасывается, черновики без
+получателя пропускаются, а если пакетная вставка все же не прошла,
+уведомления сохраняются по одному и сбойные пропускаются.
+
+При NOTIFICATIONS_EAGER = True (удобно при разработке) очередь
+разбирается сразу после фиксации транзакции, без отдельного процесса.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, connection, transaction
+from django.urls import reverse
+
+from .models import (
+    Comment, ForumPost, Notification, NotificationEvent, Post, Recipe, RecipeComment,
+    UserProfile, VIPComment,
+)
+
+logger = logging.getLogger(__name__)
+
+# Вид события -> (модель объекта, связи для select_related, обработчик)
+HANDLERS = {}
+
+
+def handler(kind, model, *related):
+    """Регистрирует функцию, превращающую событие kind в черновики уведомлений"""
+    def decorator(func):
+        HANDLERS[kind] = (model, related, func)
+        return func
+    return decorator
+
+
+def enqueue(kind, instance, **payload):
+    """Ставит событие об объекте instance в очередь уведомлений"""
+    NotificationEvent.objects.create(
+        kind=kind,
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        payload=payload,
+    )
+    if settings.NOTIFICATIONS_EAGER:
+        transaction.on_commit(process_queue)
+
+
+class Draft:
+    """
+    Будущее уведомление.
+
+    Черновики с одинаковыми получателем, типом и группой объединяются:
+    остается последний, а если задан summary, его текст с подставленным
+    количеством ({count}) заменяет сообщение.
+    """
+
+    def __init__(self, recipient_id, notification_type, title, message, url='',
+                 sender_id=None, target=None, group=None, summary=None):
+        self.recipient_id = recipient_id
+        self.notification_type = notification_type
+        self.title = title
+        self.message = message
+        self.url = url
+        self.sender_id = sender_id
+        self.target = target
+        self.group = group
+        self.summary = summary
+        self.count = 1
+
+    @property
+    def key(self):
+        if self.group is None:
+            return None
+        return (self.recipient_id, self.notification_type, self.group)
+
+    def build(self):
+        message = self.message
+        if self.count > 1 and self.summary:
+            message = self.summary.replace('{count}', str(self.count))
+        notification = Notification(
+            recipient_id=self.recipient_id,
+            sender_id=self.sender_id,
+            notification_type=self.notification_type,
+            title=self.title,
+            message=message,
+            url=self.url or '',
+        )
+        if self.target is not None:
+            notification.content_type = ContentType.objects.get_for_model(self.target)
+            notification.object_id = self.target.pk
+        return notification
+
+
+def coalesce(drafts):
+    """Объединяет повторяющиеся черновики, сохраняя порядок первых появлений"""
+    merged = {}
+    for position, draft in enumerate(drafts):
+        key = draft.key or ('single', position)
+        previous = merged.get(key)
+        if previous is not None:
+            draft.count = previous.count + 1
+        merged[key] = draft
+    return list(merged.values())
+
+
+def process_batch(batch_size=500):
+    """
+    Обрабатывает до batch_size событий из начала очереди.
+
+    Возвращает:
+        Кортеж (обработано событий, создано уведомлений)
+    """
+    with transaction.atomic():
+        events = NotificationEvent.objects.order_by('id')
+        # Несколько обработчиков на PostgreSQL не берут одни и те же события
+        if connection.features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        events = list(events[:batch_size])
+        if not events:
+            return 0, 0
+
+        object_ids = {}
+        for event in events:
+            object_ids.setdefault(event.kind, set()).add(event.object_id)
+        objects = {}
+        for kind, ids in object_ids.items():
+            if kind in HANDLERS:
+                model, related, _ = HANDLERS[kind]
+                objects[kind] = model.objects.select_related(*related).in_bulk(ids)
+
+        drafts = []
+        for event in events:
+            drafts.extend(_event_drafts(event, objects.get(event.kind, {}).get(event.object_id)))
+
+        notifications = _save_notifications([draft.build() for draft in coalesce(drafts)])
+        NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+
+        by_recipient = {}
+        for notification in notifications:
+            by_recipient.setdefault(notification.recipient_id, []).append(notification)
+        for user_id, created in by_recipient.items():
+            Notification.invalidate_unread(user_id, created)
+    return len(events), len(notifications)
+
+
+def _event_drafts(event, instance):
+    """
+    Черновики уведомлений одного события. События удаленных объектов и
+    неизвестных видов, а также события, на которых упал обработчик,
+    отбрасываются, чтобы не задерживать очередь.
+    """
+    if instance is None:
+        return []
+    _, _, func = HANDLERS[event.kind]
+    try:
+        drafts = list(func(instance, event.payload))
+    except Exception:
+        logger.exception('Событие уведомлений %s (%s #%s) отброшено', event.pk, event.kind, event.object_id)
+        return []
+    return [draft for draft in drafts if draft.recipient_id is not None]
+
+
+def _save_notifications(notifications):
+    """
+    Записывает уведомления одним bulk_create. Если пакет не записался,
+    сохраняет их по одному, пропуская те, что не проходят ограничения базы.
+    """
+    try:
+        with transaction.atomic():
+            return Notification.objects.bulk_create(notifications)
+    except DatabaseError:
+        logger.exception('Пакет из %s уведомлений не записан, сохраняем по одному', len(notifications))
+
+    saved = []
+    for notification in notifications:
+        try:
+            with transaction.atomic():
+                notification.save(force_insert=True)
+        except DatabaseError:
+            logger.exception('Уведомление для пользователя %s пропущено', notification.recipient_id)
+        else:
+            saved.append(notification)
+    return saved
+
+
+def process_queue(batch_size=500):
+    """Разбирает очередь целиком, возвращает (обработано событий, создано уведомлений)"""
+    processed = created = 0
+    while True:
+        events, notifications = process_batch(batch_size)
+        if not events:
+            return processed, created
+        processed += events
+        created += notifications
+
+
+# Обработчики событий
+
+@handler('comment', Comment, 'author', 'post__author', 'parent__author')
+def comment_notifications(comment, payload):
+    post = comment.post
+    url = f'{post.get_absolute_url()}#comment-{comment.pk}'
+    if comment.author_id != post.author_id:
+        yield Draft(
+            post.author_id, 'comment',
+            'Новый комментарий к вашей статье',
+            f'{comment.author.username} оставил(а) комментарий к вашей статье "{post.title}"',
+            url=url, sender_id=comment.author_id, target=comment,
+            group=('post', post.pk),
+            summary=f'Новых комментариев к вашей статье "{post.title}": {{count}}',
+        )
+    if comment.parent_id and comment.author_id != comment.parent.author_id:
+        yield Draft(
+            comment.parent.author_id, 'reply',
+            'Новый ответ на ваш комментарий',
+            f'{comment.author.username} ответил(а) на ваш комментарий к статье "{post.title}"',
+            url=url, sender_id=comment.author_id, target=comment,
+            group=('comment', comment.parent_id),
+            summary=f'Новых ответов на ваш комментарий к статье "{post.title}": {{count}}',
+        )
+
+
+@handler('recipe_comment', RecipeComment, 'author', 'recipe__author', 'parent__author')
+def recipe_comment_notifications(comment, payload):
+    recipe = comment.recipe
+    url = f'{recipe.get_absolute_url()}#comment-{comment.pk}'
+    # У рецепта может не быть автора
+    if recipe.author_id and comment.author_id != recipe.author_id:
+        yield Draft(
+            recipe.author_id, 'comment',
+            'Новый комментарий к вашему рецепту',
+            f'{comment.author.username} оставил(а) комментарий к вашему рецепту "{recipe.title}"',
+            url=url, sender_id=comment.author_id, target=comment,
+            group=('recipe', recipe.pk),
+            summary=f'Новых комментариев к вашему рецепту "{recipe.title}": {{count}}',
+        )
+    if comment.parent_id and comment.author_id != comment.parent.author_id:
+        yield Draft(
+            comment.parent.author_id, 'reply',
+            'Новый ответ на ваш комментарий',
+            f'{comment.author.username} ответил(а) на ваш комментарий к рецепту "{recipe.title}"',
+            url=url, sender_id=comment.author_id, target=comment,
+            group=('recipe_comment', comment.parent_id),
+            summary=f'Новых ответов на ваш комментарий к рецепту "{recipe.title}": {{count}}',
+        )
+
+
+@handler('forum_post', ForumPost, 'author', 'topic__author', 'topic__category', 'parent__author')
+def forum_post_notifications(post, payload):
+    topic = post.topic
+    url = post.get_absolute_url()
+    if post.parent_id and post.author_id != post.parent.author_id:
+        yield Draft(
+            post.parent.author_id, 'forum_reply',
+            'Новый ответ на ваше сообщение на форуме',
+            f'{post.author.username} ответил(а) на ваше сообщение в теме "{topic.title}"',
+            url=url, sender_id=post.author_id, target=post,
+            group=('forum_post', post.parent_id),
+            summary=f'Новых ответов на ваше сообщение в теме "{topic.title}": {{count}}',
+        )
+    # Как и раньше, автор темы узнает только об ответах на сообщения в ней
+    if post.parent_id and post.author_id != topic.author_id:
+        yield Draft(
+            topic.author_id, 'forum_reply',
+            'Новое сообщение в вашей теме',
+            f'{post.author.username} оставил(а) сообщение в вашей теме "{topic.title}"',
+            url=url, sender_id=post.author_id, target=post,
+            group=('forum_topic', topic.pk),
+            summary=f'Новых сообщений в вашей теме "{topic.title}": {{count}}',
+        )
+
+
+@handler('vip_comment', VIPComment, 'author', 'post__author', 'parent__author')
+def vip_comment_notifications(comment, payload):
+    post = comment.post
+    if comment.parent_id:
+        if comment.author_id != comment.parent.author_id:
+            yield Draft(
+                comment.parent.author_id, 'reply',
+                'Новый ответ на ваш комментарий',
+                f'{comment.author.username} ответил(а) на ваш комментарий к VIP-статье "{post.title}"',
+                url=post.get_absolute_url(), sender_id=comment.author_id, target=post,
+                group=('vip_comment', comment.parent_id),
+                summary=f'Новых ответов на ваш комментарий к VIP-статье "{post.title}": {{count}}',
+            )
+    elif comment.author_id != post.author_id:
+        yield Draft(
+            post.author_id, 'comment',
+            'Новый комментарий к вашей VIP-статье',
+            f'{comment.author.username} оставил(а) комментарий к вашей VIP-статье "{post.title}"',
+            url=post.get_absolute_url(), sender_id=comment.author_id, target=post,
+            group=('vip_post', post.pk),
+            summary=f'Новых комментариев к вашей VIP-статье "{post.title}": {{count}}',
+        )
+
+
+@handler('post_status', Post)
+def post_status_notifications(post, payload):
+    if payload.get('status') == 'published':
+        yield Draft(
+            post.author_id, 'status_update',
+            'Ваша статья опубликована',
+            f'Ваша статья "{post.title}" была проверена и опубликована',
+            url=post.get_absolute_url(),
+        )
+    elif payload.get('status') == 'rejected':
+        yield Draft(
+            post.author_id, 'status_update',
+            'Статья не прошла модерацию',
+            f'Ваша статья "{post.title}" не прошла модерацию',
+            url=reverse('user_posts'),
+        )
+
+
+@handler('recipe_status', Recipe)
+def recipe_status_notifications(recipe, payload):
+    if not recipe.author_id:
+        return
+    if payload.get('status') == 'published':
+        yield Draft(
+            recipe.author_id, 'status_update',
+            'Ваш рецепт опубликован',
+            f'Ваш рецепт "{recipe.title}" был проверен и опубликован',
+            url=recipe.get_absolute_url(),
+        )
+    elif payload.get('status') == 'rejected':
+        yield Draft(
+            recipe.author_id, 'status_update',
+            'Рецепт не прошел модерацию',
+            f'Ваш рецепт "{recipe.title}" не прошел модерацию. Причина: {payload.get("reason") or "Не указана"}',
+            url=reverse('user_recipes'),
+        )
+
+
+@handler('weight_goal', UserProfile)
+def weight_goal_notifications(profile, payload):
+    bound = 'меньше' if payload.get('direction') == 'loss' else 'больше'
+    # Повторные сохранения профиля дают одно уведомление с последними значениями
+    yield Draft(
+        profile.user_id, 'weight_goal',
+        'Поздравляем! 🎉',
+        f'Вы достигли своей цели по весу! Ваш текущий вес {payload.get("current_weight")} кг '
+        f'достиг или стал {bound} целевого {payload.get("goal_weight")} кг.',
+        url=reverse('profile'),
+        group=('weight_goal',),
+    )
@@ -0,0 +1,108 @@
+"""
+Итоги КБЖУ планов питания.
+
+Итоги по приемам пищи и дням считаются одним сгруппированным запросом
+SUM по продуктам плана. Итоги плана целиком хранятся в самой строке
+MealPlan (calories_total и др.) и пересчитываются сигналами при
+изменении продуктов, а при пакетной записи — явным вызовом
+refresh_plan_totals.
+"""
+from django.apps import apps as global_apps
+from django.db.models import FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+MACROS = ('calories', 'protein', 'fats', 'carbs')
+
+# Поле MealPlan с итогом плана для каждого макронутриента
+PLAN_TOTAL_FIELDS = {macro: f'{macro}_total' for macro in MACROS}
+
+
+def empty_totals():
+    return {macro: 0 for macro in MACROS}
+
+
+def _add(totals, row):
+    for macro in MACROS:
+        totals[macro] += row[macro] or 0
+
+
+class PlanNutrition:
+    """
+    Итоги КБЖУ плана питания по приемам пищи, дням и плану целиком.
+
+    Атрибуты:
+        meals: словарь {id приема пищи: итоги}
+        days: словарь {день недели: итоги}
+        plan: итоги всего плана
+    """
+
+    def __init__(self, rows):
+        self.meals = {}
+        self.days = {}
+        self.plan = empty_totals()
+        for row in rows:
+            self.meals[row['meal_id']] = {macro: row[macro] or 0 for macro in MACROS}
+            _add(self.days.setdefault(row['meal__day_of_week'], empty_totals()), row)
+            _add(self.plan, row)
+
+    @classmethod
+    def for_plan(cls, plan):
+        from .models import MealItem
+
+        rows = (
+            MealItem.objects.filter(meal__plan=plan)
+            .order_by()
+            .values('meal_id', 'meal__day_of_week')
+            .annotate(**{macro: Sum(macro) for macro in MACROS})
+        )
+        return cls(rows)
+
+    def for_meal(self, meal_id):
+        return self.meals.get(meal_id) or empty_totals()
+
+    def for_day(self, day):
+        return self.days.get(day) or empty_totals()
+
+
+def _sum_subquery(queryset, macro, output_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(meal__plan=OuterRef('pk'))
+            .order_by()
+            .values('meal__plan')
+            .annotate(total=Sum(macro))
+            .values('total'),
+            output_field=output_field,
+        ),
+        0,
+        output_field=output_field,
+    )
+
+
+def _plan_totals_update(apps):
+    MealItem = apps.get_model('weightloss', 'MealItem')
+    items = MealItem.objects.all()
+    return {
+        field: _sum_subquery(items, macro, IntegerField() if macro == 'calories' else FloatField())
+        for macro, field in PLAN_TOTAL_FIELDS.items()
+    }
+
+
+def refresh_plan_totals(plan_id, apps=global_apps):
+    """Пересчитывает сохраненные итоги одного плана одним запросом"""
+    if plan_id is None:
+        return
+    MealPlan = apps.get_model('weightloss', 'MealPlan')
+    MealPlan.objects.filter(pk=plan_id).update(**_plan_totals_update(apps))
+
+
+def refresh_meal_plan_totals(meal_id, apps=global_apps):
+    """Пересчитывает итоги плана, в который входит прием пищи meal_id"""
+    MealPlan = apps.get_model('weightloss', 'MealPlan')
+    MealPlan.objects.filter(meals=meal_id).update(**_plan_totals_update(apps))
+
+
+def rebuild_plan_totals(apps=global_apps):
+    """Пересчитывает сохраненные итоги всех планов питания"""
+    MealPlan = apps.get_model('weightloss', 'MealPlan')
+    MealPlan.objects.update(**_plan_totals_update(apps))
@@ -0,0 +1,149 @@
+"""
+Кэширование страниц и фрагментов шаблонов по разделам сайта.
+
+Каждому разделу (блог, рецепты, челленджи, форум, пользователи, продукты)
+соответствует номер версии, который хранится в кэше. Версии всех разделов,
+от которых зависит страница, входят в ключ ее кэша, поэтому при изменении
+данных достаточно увеличить версию раздела (это делают сигналы из
+signals.py) — старые записи перестают читаться и вытесняются сами.
+
+Версии должны быть видны всем процессам сервера, поэтому кэш по умолчанию
+файловый (CACHES в settings.py); с кэшем в памяти процесса изменение,
+сделанное в другом процессе или командой manage.py, не сбросит страницы
+до истечения PAGE_CACHE_TIMEOUT.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+
+SECTIONS = ('blog', 'recipes', 'challenges', 'forum', 'users', 'foods')
+
+VERSION_KEY = 'section-version:{}'
+
+# Параметры запроса, которые учитываются в ключе кэша по умолчанию
+DEFAULT_PARAMS = ('page', 'q')
+MAX_PARAM_LENGTH = 100
+
+
+def _new_version():
+    # Версия на основе времени не повторяется, даже если ключ версии
+    # был вытеснен из кэша и создается заново
+    return time.time_ns()
+
+
+def get_section_versions(*sections):
+    """
+    Возвращает текущие версии разделов в виде строки для ключа кэша.
+    Отсутствующие версии создаются.
+    """
+    keys = [VERSION_KEY.format(section) for section in sections]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_section(*sections):
+    """Делает устаревшими все страницы и фрагменты указанных разделов"""
+    # Новая версия записывается, а не увеличивается: incr файлового кэша
+    # не атомарен, и два параллельных увеличения дали бы одну и ту же версию
+    cache.set_many({VERSION_KEY.format(section): _new_version() for section in sections}, None)
+
+
+def cache_params(request, params):
+    """
+    Параметры запроса, от которых зависит страница, в каноническом виде.
+    Остальные параметры (метки рекламы и т.п.) на страницу не влияют и в ключ
+    не входят. Возвращает None, если страницу кэшировать не нужно.
+    """
+    values = []
+    for name in sorted(params):
+        value = request.GET.get(name)
+        if value is None or value == '':
+            continue
+        # Номер страницы: только число, иначе ключей было бы бесконечно много
+        if name == 'page' and not value.isdigit():
+            return None
+        if len(value) > MAX_PARAM_LENGTH:
+            return None
+        values.append((name, value))
+    return urlencode(values)
+
+
+def page_cache_key(request, sections, params=DEFAULT_PARAMS):
+    """Ключ кэша страницы: адрес, значимые параметры запроса и версии разделов"""
+    query = cache_params(request, params)
+    if query is None:
+        return None
+    url = f'{request.get_host()}{request.path}?{query}'
+    digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+    return f'page:{request.method}:{digest}:{get_section_versions(*sections)}'
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Страницы авторизованных пользователей содержат персональные данные
+    if request.user.is_authenticated:
+        return False
+    # Непоказанные сообщения выводятся в шаблоне и не должны попасть в кэш
+    if len(get_messages(request)):
+        return False
+    return True
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.cookies
+        # Страница с CSRF-токеном привязана к cookie конкретного посетителя
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def cache_section_page(*sections, timeout=None, params=DEFAULT_PARAMS):
+    """
+    Кэширует страницу для анонимных посетителей до изменения данных
+    в любом из разделов sections.
+
+    Ключ учитывает адрес страницы и параметры запроса из params, поэтому
+    каждая страница пагинации и каждый фильтр кэшируются отдельно.
+    """
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        raise ValueError(f'Неизвестные разделы кэша: {", ".join(sorted(unknown))}')
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            key = page_cache_key(request, sections, params)
+            if key is None:
+                return view_func(request, *args, **kwargs)
+            response = cache.get(key)
+            if response is not None:
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            cache_timeout = settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout
+
+            def store(rendered):
+                if _is_cacheable_response(request, rendered):
+                    cache.set(key, rendered, cache_timeout)
+
+            if getattr(response, 'is_rendered', True):
+                store(response)
+            else:
+                response.add_post_render_callback(store)
+            return response
+        return wrapper
+    return decorator
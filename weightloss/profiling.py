@@ -0,0 +1,267 @@
+"""
+Выборочное профилирование запросов в рабочем режиме.
+
+ProfilingMiddleware замеряет случайную долю запросов
+(PROFILING_SAMPLE_RATE): общее время, число запросов к базе и время
+в ней, самые медленные SQL-запросы и время рендеринга TemplateResponse.
+Замеры складываются в кольцевой буфер в памяти процесса
+(PROFILING_BUFFER_SIZE последних), поэтому память не растет, а запросы
+без выборки не платят почти ничего.
+
+Запрос с заголовком X-Profile, содержащим подписанный токен
+(make_profile_token), замеряется всегда и дополнительно выполняется под
+cProfile; отчет pstats сохраняется в отдельный буфер, а его номер
+возвращается в заголовке ответа X-Profile-Id.
+
+build_report сводит буфер по представлениям: гистограмма и перцентили
+времени ответа, запросы к базе, время рендеринга, самые медленные SQL.
+Отчет доступен персоналу на странице profiling_report и в JSON
+по адресу api_profiling_report. У каждого процесса сервера свой буфер.
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import math
+import pstats
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils import timezone
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+TOKEN_SALT = 'weightloss.profiling'
+
+# Верхние границы корзин гистограммы времени ответа, мс
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Длина текста SQL, сохраняемого в замере
+SQL_MAX_LENGTH = 500
+
+
+class QueryRecorder:
+    """
+    Обертка выполнения запросов (connection.execute_wrapper): считает
+    запросы и время в базе и хранит slowest самых медленных из них.
+    """
+
+    def __init__(self, slowest=0):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = slowest
+        self._heap = []
+        self._order = itertools.count()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.slowest:
+                entry = (elapsed, next(self._order), sql)
+                if len(self._heap) < self.slowest:
+                    heapq.heappush(self._heap, entry)
+                elif elapsed > self._heap[0][0]:
+                    heapq.heapreplace(self._heap, entry)
+
+    def slow_queries(self):
+        """Самые медленные запросы: список (мс, sql) по убыванию времени"""
+        return [
+            (round(elapsed * 1000, 2), sql[:SQL_MAX_LENGTH])
+            for elapsed, _, sql in sorted(self._heap, reverse=True)
+        ]
+
+
+class ProfileStore:
+    """Кольцевые буферы замеров и отчетов cProfile одного процесса"""
+
+    def __init__(self, size, captures):
+        self.samples = deque(maxlen=size)
+        self.captures = deque(maxlen=captures)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add_sample(self, sample):
+        self.samples.append(sample)
+
+    def add_capture(self, capture):
+        with self._lock:
+            capture['id'] = next(self._ids)
+        self.captures.append(capture)
+        return capture['id']
+
+    def clear(self):
+        self.samples.clear()
+        self.captures.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore(settings.PROFILING_BUFFER_SIZE, settings.PROFILING_CAPTURES)
+    return _store
+
+
+def make_profile_token(user_id=None):
+    """Подписанное значение заголовка X-Profile"""
+    return signing.dumps({'user': user_id}, salt=TOKEN_SALT)
+
+
+def check_profile_token(value):
+    """Проверяет подпись и срок действия токена X-Profile"""
+    try:
+        signing.loads(value, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+class ProfilingMiddleware:
+    """Выборочно замеряет запросы и по подписанному заголовку снимает cProfile"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        token = request.headers.get(PROFILE_HEADER)
+        capture = bool(token) and check_profile_token(token)
+        if not capture and random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        queries = QueryRecorder(settings.PROFILING_SLOW_QUERIES)
+        request._profiling_render = [0.0, None]
+        profiler = cProfile.Profile() if capture else None
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        elapsed = time.perf_counter() - started
+
+        sample = {
+            'view': _view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'time_ms': round(elapsed * 1000, 2),
+            'queries': queries.count,
+            'db_ms': round(queries.seconds * 1000, 2),
+            'render_ms': round(request._profiling_render[0] * 1000, 2),
+            'slow_queries': queries.slow_queries(),
+            'at': timezone.now().isoformat(),
+        }
+        store = get_store()
+        store.add_sample(sample)
+        if profiler is not None:
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats('cumulative').print_stats(settings.PROFILING_STATS_LINES)
+            response[PROFILE_ID_HEADER] = str(store.add_capture(dict(sample, stats=output.getvalue())))
+        return response
+
+    def process_template_response(self, request, response):
+        # Рендеринг TemplateResponse идет сразу после этого вызова,
+        # по его окончании срабатывает post-render callback
+        timing = getattr(request, '_profiling_render', None)
+        if timing is not None:
+            timing[1] = time.perf_counter()
+
+            def finish(rendered):
+                timing[0] += time.perf_counter() - timing[1]
+
+            response.add_post_render_callback(finish)
+        return response
+
+
+def _percentile(values, share):
+    """Перцентиль отсортированного списка методом ближайшего ранга"""
+    if not values:
+        return 0
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def build_report(samples=None, slowest=10):
+    """
+    Сводит замеры по представлениям.
+
+    Возвращает:
+        Словарь с числом замеров, сводкой по представлениям (по убыванию
+        суммарного времени) и самыми медленными SQL-запросами
+    """
+    if samples is None:
+        samples = list(get_store().samples)
+
+    views = {}
+    for sample in samples:
+        views.setdefault(sample['view'], []).append(sample)
+
+    rows = []
+    for view, view_samples in views.items():
+        latencies = sorted(sample['time_ms'] for sample in view_samples)
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in latencies:
+            position = next(
+                (i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS)
+            )
+            histogram[position] += 1
+        count = len(view_samples)
+        rows.append({
+            'view': view,
+            'count': count,
+            'total_ms': round(sum(latencies), 2),
+            'p50_ms': _percentile(latencies, 0.5),
+            'p95_ms': _percentile(latencies, 0.95),
+            'max_ms': latencies[-1],
+            'histogram': histogram,
+            'queries_avg': round(sum(sample['queries'] for sample in view_samples) / count, 1),
+            'queries_max': max(sample['queries'] for sample in view_samples),
+            'db_ms_avg': round(sum(sample['db_ms'] for sample in view_samples) / count, 2),
+            'render_ms_avg': round(sum(sample['render_ms'] for sample in view_samples) / count, 2),
+            'errors': sum(1 for sample in view_samples if sample['status'] >= 500),
+        })
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+
+    slow_queries = heapq.nlargest(
+        slowest,
+        (
+            {'ms': ms, 'sql': sql, 'view': sample['view']}
+            for sample in samples
+            for ms, sql in sample['slow_queries']
+        ),
+        key=lambda query: query['ms'],
+    )
+    return {
+        'samples': len(samples),
+        'buckets': list(LATENCY_BUCKETS),
+        'views': rows,
+        'slow_queries': slow_queries,
+    }
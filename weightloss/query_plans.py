@@ -0,0 +1,176 @@
+"""
+Проверка планов выполнения горячих запросов.
+
+Списки и страницы сайта фильтруют большие таблицы (статьи, рецепты,
+комментарии, темы и сообщения форума, продукты) по нескольким полям
+сразу, и для каждой такой комбинации в Meta.indexes моделей есть
+составной или частичный индекс. Этот модуль проверяет, что планировщик
+ими пользуется:
+
+- HOT_QUERIES — основные запросы представлений, записанные явно;
+- check_routes выполняет маршруты тестовым клиентом (как benchmark.py)
+  и проверяет каждый SELECT, который они выполнили.
+
+Запрос считается регрессией, если в его плане есть полный просмотр
+большой таблицы (HOT_MODELS): в SQLite это строка SCAN без USING INDEX,
+в PostgreSQL — Seq Scan. Запросы без WHERE (например, загрузка каталога
+продуктов в food_index) читают таблицу целиком намеренно и не
+проверяются; осознанные исключения перечислены в ALLOWED_SCANS. PostgreSQL на маленьких тестовых таблицах
+предпочитает последовательный просмотр, поэтому проверка идет
+с enable_seqscan = off: Seq Scan остается в плане, только если
+подходящего индекса нет вовсе.
+
+Команда: python manage.py check_query_plans.
+"""
+import re
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+# Модели с таблицами, которые растут вместе с содержимым сайта
+HOT_MODELS = (
+    'Post', 'Comment', 'Recipe', 'RecipeComment', 'ForumTopic', 'ForumPost',
+    'VIPComment', 'Food', 'Notification',
+)
+
+# Маршруты с горячими запросами
+HOT_ROUTES = (
+    'home', 'blog_list', 'post_detail', 'category_detail', 'recipe_list', 'recipe_detail',
+    'user_profile', 'user_posts', 'user_recipes', 'admin_recipe_list',
+    'forum_home', 'forum_category', 'forum_topic_detail', 'vip_detail',
+    'food_list', 'food_edit', 'meal_item_create', 'notifications',
+)
+
+# Основные запросы представлений: имя -> функция, строящая QuerySet по Fixtures
+HOT_QUERIES = {
+    'Лента статей': lambda f: f.models['Post'].objects.filter(status='published').order_by('-created_on')[:9],
+    'Статьи категории': lambda f: f.models['Post'].objects.filter(category=f.category, status='published')[:9],
+    'Статьи автора': lambda f: f.models['Post'].objects.filter(author=f.user, status='published').order_by('-created_on')[:5],
+    'Все статьи автора': lambda f: f.models['Post'].objects.filter(author=f.user).order_by('-created_on'),
+    'Лента рецептов': lambda f: f.models['Recipe'].objects.filter(status='published').order_by('-created_on')[:9],
+    'Рецепты автора': lambda f: f.models['Recipe'].objects.filter(author=f.user, status='published').order_by('-created_on')[:5],
+    'Рецепты на модерации': lambda f: f.models['Recipe'].objects.filter(status='draft').order_by('-created_on'),
+    'Темы категории форума': lambda f: f.models['ForumTopic'].objects.filter(category=f.forum_category).order_by('-is_pinned', '-updated_on')[:10],
+    'Темы автора': lambda f: f.models['ForumTopic'].objects.filter(author=f.user).order_by('-created_on')[:5],
+    'Ветка комментариев статьи': lambda f: f.models['Comment'].objects.filter(post=f.post).order_by('created_on', 'pk'),
+    'Комментарии статьи верхнего уровня': lambda f: f.post.get_comments(),
+    'Ветка комментариев рецепта': lambda f: f.models['RecipeComment'].objects.filter(recipe=f.recipe).order_by('created_on', 'pk'),
+    'Комментарии рецепта верхнего уровня': lambda f: f.recipe.get_comments(),
+    'Ветка темы форума': lambda f: f.models['ForumPost'].objects.filter(topic=f.topic).order_by('created_on', 'pk'),
+    'Последнее сообщение темы': lambda f: f.models['ForumPost'].objects.filter(topic=f.topic).order_by('-created_on', '-pk')[:1],
+    'Общий каталог продуктов': lambda f: f.models['Food'].objects.filter(is_custom=False),
+    'Продукты категории': lambda f: f.models['Food'].objects.filter(category=f.food.category_id),
+    'Продукты пользователя': lambda f: f.models['Food'].objects.filter(is_custom=True, user=f.user),
+}
+
+# Полные просмотры, допустимые на маршруте: маршрут -> {таблица: причина}
+ALLOWED_SCANS = {
+    # Список выбора продукта — весь общий каталог плюс свои продукты
+    # (NOT is_custom OR user_id = ...), индекс тут ничего не сократит
+    'meal_item_create': {'weightloss_food': 'выбор из всего каталога'},
+}
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\S+)')
+# "weightloss_post" U0 — таблица и ее псевдоним в SQL Django
+WHERE_RE = re.compile(r'\bWHERE\b')
+ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)"?\b')
+
+
+def hot_tables():
+    return {apps.get_model('weightloss', name)._meta.db_table for name in HOT_MODELS}
+
+
+def explain(sql, params):
+    """Строки плана запроса для текущей базы"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            with transaction.atomic():
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+                return [row[0] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql, plan, tables):
+    """Большие таблицы, которые план просматривает целиком"""
+    aliases = dict((alias, table) for table, alias in ALIAS_RE.findall(sql))
+    scanned = []
+    for line in plan:
+        if connection.vendor == 'postgresql':
+            match = POSTGRES_SCAN_RE.search(line)
+            names = match.groups() if match else ()
+        else:
+            match = SQLITE_SCAN_RE.match(line.strip())
+            names = [name for name in match.groups() if name] if match else ()
+        for name in names:
+            table = aliases.get(name, name)
+            if table in tables and table not in scanned:
+                scanned.append(table)
+    return scanned
+
+
+class SelectRecorder:
+    """Обертка выполнения запросов: запоминает выполненные SELECT с параметрами"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def _check(sql, params, tables, allowed=()):
+    plan = explain(sql, params)
+    scans = full_scans(sql, plan, tables) if WHERE_RE.search(sql) else []
+    return {'sql': sql, 'plan': plan, 'scans': [table for table in scans if table not in allowed]}
+
+
+def check_hot_queries(fixtures):
+    """
+    Проверяет HOT_QUERIES.
+
+    Возвращает:
+        Словарь {имя запроса: {'sql', 'plan', 'scans'}}
+    """
+    fixtures.models = {name: apps.get_model('weightloss', name) for name in HOT_MODELS}
+    tables = hot_tables()
+    results = {}
+    for name, build in HOT_QUERIES.items():
+        sql, params = build(fixtures).query.sql_with_params()
+        results[name] = _check(sql, params, tables)
+    return results
+
+
+def check_routes(fixtures, routes=None):
+    """
+    Выполняет маршруты routes (по умолчанию HOT_ROUTES) с холодным кэшем
+    и проверяет планы всех их SELECT-запросов.
+
+    Возвращает:
+        Словарь {имя маршрута: список {'sql', 'plan', 'scans'}}
+    """
+    from .benchmark import ROUTE_KWARGS, ROUTE_QUERY
+
+    client = Client(raise_request_exception=False)
+    client.force_login(fixtures.user)
+    tables = hot_tables()
+    results = {}
+    for name in routes or HOT_ROUTES:
+        kwargs = ROUTE_KWARGS[name](fixtures) if name in ROUTE_KWARGS else {}
+        url = reverse(name, kwargs=kwargs) + ROUTE_QUERY.get(name, '')
+        cache.clear()
+        recorder = SelectRecorder()
+        with connection.execute_wrapper(recorder):
+            client.get(url)
+        # Одинаковые запросы (например, в цикле) достаточно проверить один раз
+        unique = dict.fromkeys((sql, tuple(params or ())) for sql, params in recorder.queries)
+        allowed = ALLOWED_SCANS.get(name, {})
+        results[name] = [_check(sql, params, tables, allowed) for sql, params in unique]
+    return results
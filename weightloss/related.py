@@ -0,0 +1,332 @@
+"""
+Похожие рецепты и статьи.
+
+Оценка сходства двух опубликованных рецептов складывается из трех частей:
+
+* общая категория — у рецептов нет рубрик, поэтому категорией считается
+  преобладающий источник калорий (белки, углеводы или жиры);
+* близость КБЖУ — косинус между векторами калорий из белков, углеводов
+  и жиров, умноженный на отношение меньшей калорийности к большей;
+* общие ингредиенты — коэффициент Жаккара по основам слов списка
+  ингредиентов (без единиц измерения и чисел).
+
+Статьи сравниваются по косинусу векторов TF-IDF основ слов заголовка
+(с весом TITLE_WEIGHT) и текста без HTML. Основы слов статьи хранятся
+в PostTerms, поэтому после правки одной статьи индекс собирается без
+повторного разбора всех текстов, а пересчитываются только списки
+затронутых статей (update_related_post).
+
+Расчет идет офлайн (команды rebuild_related_recipes, rebuild_related_posts
+и миграции) и сохраняется в таблицы RelatedRecipe и RelatedPost — по
+RELATED_SIZE лучших на объект. Страница рецепта или статьи читает их
+одним запросом по индексу (объект, rank). Пока для рецепта ничего не
+рассчитано, показываются случайные опубликованные рецепты
+(sampling.sample_cached), для статьи — статьи той же категории.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .sampling import sample_cached
+from .search import WORD_RE, html_to_text, stem
+
+RELATED_SIZE = 6
+
+CATEGORY_WEIGHT = 0.2
+MACRO_WEIGHT = 0.35
+INGREDIENT_WEIGHT = 0.45
+
+# Калорий в грамме белков, углеводов и жиров
+KCAL_PER_GRAM = (4, 4, 9)
+
+# Основы слов, которые встречаются почти в каждом списке ингредиентов
+INGREDIENT_STOP_WORDS = frozenset(stem(word) for word in (
+    'грамм', 'литр', 'штука', 'ложка', 'столовая', 'чайная', 'стакан', 'щепотка',
+    'вкусу', 'для', 'или', 'без', 'свежий', 'мелкий', 'крупный', 'средний', 'небольшой',
+))
+
+
+def macro_vector(calories, protein, carbs, fat):
+    """Калории из белков, углеводов и жиров и общая калорийность"""
+    energy = tuple(grams * kcal for grams, kcal in zip((protein, carbs, fat), KCAL_PER_GRAM))
+    return energy, calories or sum(energy)
+
+
+def macro_category(energy):
+    """Преобладающий источник калорий: 0 — белки, 1 — углеводы, 2 — жиры"""
+    return max(range(3), key=lambda i: energy[i]) if any(energy) else None
+
+
+def ingredient_words(ingredients):
+    """Множество основ слов списка ингредиентов"""
+    words = set()
+    for word in WORD_RE.findall(html_to_text(ingredients)):
+        if word.isdigit():
+            continue
+        word = stem(word)
+        if len(word) > 2 and word not in INGREDIENT_STOP_WORDS:
+            words.add(word)
+    return words
+
+
+class RecipeFeatures:
+    """Признаки рецепта для расчета сходства"""
+
+    def __init__(self, pk, calories, protein, carbs, fat, ingredients):
+        self.pk = pk
+        self.energy, self.calories = macro_vector(calories, protein, carbs, fat)
+        self.norm = math.sqrt(sum(value * value for value in self.energy))
+        self.category = macro_category(self.energy)
+        self.words = ingredient_words(ingredients)
+
+    def similarity(self, other):
+        score = 0.0
+        if self.category is not None and self.category == other.category:
+            score += CATEGORY_WEIGHT
+        if self.norm and other.norm:
+            cosine = sum(a * b for a, b in zip(self.energy, other.energy)) / (self.norm * other.norm)
+            closeness = min(self.calories, other.calories) / max(self.calories, other.calories)
+            score += MACRO_WEIGHT * cosine * closeness
+        if self.words and other.words:
+            common = len(self.words & other.words)
+            if common:
+                score += INGREDIENT_WEIGHT * common / len(self.words | other.words)
+        return score
+
+
+def rank_related(features, size=RELATED_SIZE):
+    """
+    Лучшие size похожих рецептов для каждого рецепта.
+    Возвращает словарь {id рецепта: [(id похожего, оценка), ...]}.
+    Перебираются все пары — O(n²), для офлайн-расчета по тысячам
+    рецептов это секунды.
+    """
+    scores = {item.pk: [] for item in features}
+    for i, item in enumerate(features):
+        for other in features[i + 1:]:
+            score = item.similarity(other)
+            if score > 0:
+                scores[item.pk].append((score, other.pk))
+                scores[other.pk].append((score, item.pk))
+    return {
+        pk: [(other_pk, score) for score, other_pk in heapq.nlargest(size, candidates)]
+        for pk, candidates in scores.items()
+    }
+
+
+def rebuild_related_recipes(apps=global_apps, size=RELATED_SIZE):
+    """Пересчитывает таблицу похожих рецептов целиком, возвращает число записей"""
+    Recipe = apps.get_model('weightloss', 'Recipe')
+    RelatedRecipe = apps.get_model('weightloss', 'RelatedRecipe')
+
+    features = [
+        RecipeFeatures(*row)
+        for row in Recipe.objects.filter(status='published').order_by('pk').values_list(
+            'pk', 'calories', 'protein', 'carbs', 'fat', 'ingredients'
+        )
+    ]
+    entries = [
+        RelatedRecipe(recipe_id=pk, related_id=other_pk, rank=rank, score=round(score, 4))
+        for pk, related in rank_related(features, size).items()
+        for rank, (other_pk, score) in enumerate(related, 1)
+    ]
+    with transaction.atomic():
+        RelatedRecipe.objects.all().delete()
+        RelatedRecipe.objects.bulk_create(entries, batch_size=500)
+    return len(entries)
+
+
+def related_recipes(recipe, limit=3):
+    """Похожие опубликованные рецепты из таблицы, иначе — случайные"""
+    from .models import Recipe, RelatedRecipe
+
+    entries = (
+        RelatedRecipe.objects.filter(recipe=recipe, related__status='published')
+        .select_related('related').order_by('rank')[:limit]
+    )
+    related = [entry.related for entry in entries]
+    if not related:
+        related = sample_cached(
+            Recipe.objects.filter(status='published'), limit,
+            'published-recipes', ('recipes',), exclude=[recipe.pk],
+        )
+    return related
+
+
+# Похожие статьи
+
+# Слова заголовка считаются TITLE_WEIGHT раз
+TITLE_WEIGHT = 3
+# Слова, которые есть больше чем в этой доле статей, статьи не различают
+MAX_DOCUMENT_SHARE = 0.5
+
+POST_STOP_WORDS = frozenset(stem(word) for word in (
+    'это', 'как', 'так', 'что', 'чтобы', 'для', 'или', 'при', 'без', 'его', 'она',
+    'они', 'оно', 'был', 'была', 'были', 'быть', 'есть', 'все', 'еще', 'уже',
+    'только', 'также', 'если', 'когда', 'где', 'который', 'может', 'можно', 'нужно',
+    'очень', 'более', 'менее', 'этот', 'эта', 'эти', 'того', 'над', 'под', 'про',
+    'через', 'после', 'перед', 'между', 'тем', 'чем', 'них', 'нас', 'вас', 'вам',
+    'нам', 'себя', 'свой', 'ваш', 'наш', 'ещё', 'даже', 'потому', 'поэтому',
+))
+
+
+# Слова в статьях повторяются, и стеммер вызывается для каждого вхождения
+_stem = lru_cache(maxsize=65536)(stem)
+
+
+def post_terms(title, content):
+    """Число вхождений основ слов статьи: {основа: вес}"""
+    terms = Counter()
+    for text, weight in ((title or '', TITLE_WEIGHT), (html_to_text(content), 1)):
+        for word in WORD_RE.findall(text):
+            if word.isdigit():
+                continue
+            word = _stem(word.lower())
+            if len(word) > 2 and word not in POST_STOP_WORDS:
+                terms[word] += weight
+    return dict(terms)
+
+
+class TfidfIndex:
+    """Нормированные векторы TF-IDF статей и обратный индекс по основам слов"""
+
+    def __init__(self, documents):
+        """documents — словарь {id статьи: {основа: число вхождений}}"""
+        total = len(documents)
+        frequency = Counter(term for terms in documents.values() for term in terms)
+        limit = max(2, MAX_DOCUMENT_SHARE * total)
+        idf = {
+            term: math.log((1 + total) / (1 + count)) + 1
+            for term, count in frequency.items() if count <= limit
+        }
+        self.vectors = {}
+        self.postings = defaultdict(list)
+        for pk, terms in documents.items():
+            vector = {term: (1 + math.log(tf)) * idf[term] for term, tf in terms.items() if term in idf}
+            norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+            vector = {term: weight / norm for term, weight in vector.items()} if norm else {}
+            self.vectors[pk] = vector
+            for term, weight in vector.items():
+                self.postings[term].append((pk, weight))
+
+    def scores(self, pk):
+        """Сходство статьи pk со всеми статьями, с которыми у нее есть общие слова"""
+        totals = defaultdict(float)
+        for term, weight in self.vectors.get(pk, {}).items():
+            for other, other_weight in self.postings[term]:
+                if other != pk:
+                    totals[other] += weight * other_weight
+        return totals
+
+    def neighbours(self, pk, size=RELATED_SIZE):
+        """Лучшие size статей: список (id, оценка) по убыванию сходства"""
+        return heapq.nlargest(size, self.scores(pk).items(), key=lambda item: (item[1], -item[0]))
+
+
+def _published_terms(apps=global_apps):
+    PostTerms = apps.get_model('weightloss', 'PostTerms')
+    return dict(PostTerms.objects.filter(post__status='published').values_list('post_id', 'terms'))
+
+
+def _related_post_entries(apps, index, pks, size):
+    RelatedPost = apps.get_model('weightloss', 'RelatedPost')
+    return [
+        RelatedPost(post_id=pk, related_id=other_pk, rank=rank, score=round(score, 4))
+        for pk in pks
+        for rank, (other_pk, score) in enumerate(index.neighbours(pk, size), 1)
+    ]
+
+
+def rebuild_related_posts(apps=global_apps, size=RELATED_SIZE, batch_size=500):
+    """
+    Разбирает тексты всех опубликованных статей и пересчитывает таблицу
+    похожих статей целиком, возвращает число записей
+    """
+    Post = apps.get_model('weightloss', 'Post')
+    PostTerms = apps.get_model('weightloss', 'PostTerms')
+    RelatedPost = apps.get_model('weightloss', 'RelatedPost')
+
+    documents = {
+        pk: post_terms(title, content)
+        for pk, title, content in Post.objects.filter(status='published').order_by('pk').values_list(
+            'pk', 'title', 'content'
+        ).iterator(chunk_size=batch_size)
+    }
+    index = TfidfIndex(documents)
+    entries = _related_post_entries(apps, index, documents, size)
+    with transaction.atomic():
+        PostTerms.objects.all().delete()
+        PostTerms.objects.bulk_create(
+            [PostTerms(post_id=pk, terms=terms) for pk, terms in documents.items()], batch_size=batch_size
+        )
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
+
+
+def refresh_related_posts(post_ids, size=RELATED_SIZE):
+    """Пересчитывает списки похожих статей для post_ids по сохраненным основам слов"""
+    from .models import RelatedPost
+
+    index = TfidfIndex(_published_terms())
+    post_ids = set(post_ids)
+    entries = _related_post_entries(global_apps, index, post_ids & set(index.vectors), size)
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        RelatedPost.objects.bulk_create(entries)
+    return len(post_ids)
+
+
+def update_related_post(post_id, size=RELATED_SIZE):
+    """
+    Обновляет похожие статьи после сохранения статьи post_id: ее основы
+    слов, ее список и списки статей, в которые она входила или теперь
+    должна войти. Оценки в остальных списках считаются по прежнему IDF
+    до следующего полного пересчета.
+    """
+    from .models import Post, PostTerms, RelatedPost
+
+    post = Post.objects.filter(pk=post_id, status='published').values_list('title', 'content').first()
+    affected = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    affected.add(post_id)
+    if post is None:
+        PostTerms.objects.filter(post_id=post_id).delete()
+        return refresh_related_posts(affected, size)
+
+    PostTerms.objects.update_or_create(post_id=post_id, defaults={'terms': post_terms(*post)})
+    index = TfidfIndex(_published_terms())
+    lists = {
+        row['post_id']: (row['count'], row['low'])
+        for row in RelatedPost.objects.values('post_id').annotate(count=Count('pk'), low=Min('score'))
+    }
+    for other, score in index.scores(post_id).items():
+        count, low = lists.get(other, (0, 0))
+        if count < size or score > low:
+            affected.add(other)
+
+    entries = _related_post_entries(global_apps, index, affected & set(index.vectors), size)
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=affected).delete()
+        RelatedPost.objects.bulk_create(entries)
+    return len(affected)
+
+
+def related_posts(post, limit=3):
+    """Похожие опубликованные статьи из таблицы, иначе — статьи той же категории"""
+    from .models import Post, RelatedPost
+
+    entries = (
+        RelatedPost.objects.filter(post=post, related__status='published')
+        .select_related('related').order_by('rank')[:limit]
+    )
+    related = [entry.related for entry in entries]
+    if not related:
+        related = list(
+            Post.objects.filter(status='published', category_id=post.category_id).exclude(pk=post.pk)[:limit]
+        )
+    return related
@@ -0,0 +1,80 @@
+"""
+Случайная выборка строк без ORDER BY RANDOM().
+
+ORDER BY RANDOM() сортирует всю таблицу ради нескольких строк. Здесь
+два способа выбрать k случайных объектов за O(k):
+
+* sample_cached — случайные id из списка id, закэшированного вместе
+  с версиями разделов page_cache; список сбрасывается сам при изменении
+  раздела, а при попадании в кэш выборка стоит одного запроса по
+  первичному ключу;
+* sample_by_range — случайные точки в диапазоне id и по одному
+  запросу pk >= точка на объект; кэш не нужен, но после «дыр»
+  в нумерации объекты выпадают чаще.
+"""
+import random
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from .page_cache import get_section_versions
+
+# Списки id хранятся не дольше суток, даже если раздел не меняется
+IDS_TIMEOUT = 24 * 60 * 60
+
+
+def cached_ids(queryset, name, *sections):
+    """Список id queryset из кэша; name и sections определяют ключ"""
+    key = f'sample-ids:{name}:{get_section_versions(*sections)}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(queryset.order_by().values_list('pk', flat=True))
+        cache.set(key, ids, IDS_TIMEOUT)
+    return ids
+
+
+def _in_order(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def sample_cached(queryset, k, name, sections, exclude=(), rng=random):
+    """
+    k случайных объектов queryset по закэшированному списку id.
+
+    Пример: sample_cached(Recipe.objects.filter(status='published'), 3,
+    'published-recipes', ('recipes',), exclude=[recipe.pk])
+    """
+    exclude = set(exclude)
+    ids = [pk for pk in cached_ids(queryset, name, *sections) if pk not in exclude]
+    if not ids or k <= 0:
+        return []
+    return _in_order(queryset, rng.sample(ids, min(k, len(ids))))
+
+
+def sample_by_range(queryset, k, exclude=(), rng=random):
+    """
+    k случайных объектов queryset по случайным точкам диапазона id:
+    один запрос за границами и по индексному запросу на объект
+    """
+    if k <= 0:
+        return []
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    seen = set(exclude)
+    objects = []
+    # Попытки ограничены: при малом числе подходящих строк точки
+    # часто попадают на уже выбранные объекты
+    for _ in range(k * 3):
+        point = rng.randint(bounds['low'], bounds['high'])
+        obj = queryset.exclude(pk__in=seen).filter(pk__gte=point).order_by('pk').first()
+        if obj is None:
+            obj = queryset.exclude(pk__in=seen).filter(pk__lt=point).order_by('-pk').first()
+        if obj is None:
+            break
+        seen.add(obj.pk)
+        objects.append(obj)
+        if len(objects) == k:
+            break
+    return objects
@@ -0,0 +1,500 @@
+"""
+Полнотекстовый поиск по статьям, рецептам и форуму.
+
+Для каждого опубликованного объекта хранится SearchDocument с текстом без
+HTML, а рядом — полнотекстовый индекс, зависящий от базы данных:
+
+* SQLite — виртуальная таблица FTS5 со словами, приведенными к основе
+  русским стеммером (Snowball), ранжирование по BM25;
+* PostgreSQL — колонка tsvector с GIN-индексом и конфигурацией 'russian',
+  ранжирование ts_rank_cd;
+* остальные базы — поиск icontains по SearchDocument.
+
+Документы обновляются сигналами из signals.py, а целиком перестраиваются
+командой rebuild_search_index. Результаты поиска (SearchResults) совместимы
+с Paginator: количество и каждая страница выбираются отдельным запросом
+к индексу без повторного просмотра таблиц.
+"""
+import html
+import re
+
+from django.apps import apps as global_apps
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+WORD_RE = re.compile(r'\w+')
+
+DOCUMENT_MODELS = {
+    'post': 'Post',
+    'recipe': 'Recipe',
+    'topic': 'ForumTopic',
+}
+
+
+# Русский стеммер (алгоритм Snowball)
+
+_VOWELS = 'аеиоуыэюя'
+
+_PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+_ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+     'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'),
+)
+_PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+_REFLEXIVE = (
+    (),
+    ('ся', 'сь'),
+)
+_VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны',
+     'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл',
+     'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены',
+     'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+_NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией',
+     'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях',
+     'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'),
+)
+
+
+def _region_after(word, start):
+    """Начало области после первой согласной, следующей за гласной"""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _remove_ending(word, rv, endings):
+    """
+    Удаляет самое длинное окончание из endings, целиком лежащее в RV.
+    Окончания первой группы должны следовать за 'а' или 'я'.
+    Возвращает None, если окончание не найдено.
+    """
+    best = None
+    for group, suffixes in enumerate(endings):
+        for suffix in suffixes:
+            if word.endswith(suffix) and len(word) - len(suffix) >= rv:
+                if best is None or len(suffix) > len(best[1]):
+                    best = (group, suffix)
+    if best is None:
+        return None
+    group, suffix = best
+    stem = word[:-len(suffix)]
+    if group == 0 and not (stem[-1:] in ('а', 'я') and len(stem) - 1 >= rv):
+        return None
+    return stem
+
+
+def stem(word):
+    """Приводит слово к основе; слова не на кириллице возвращаются как есть"""
+    word = word.lower().replace('ё', 'е')
+    if not any('а' <= char <= 'я' for char in word):
+        return word
+
+    rv = next((i + 1 for i, char in enumerate(word) if char in _VOWELS), len(word))
+    r2 = _region_after(word, _region_after(word, 0))
+
+    # Шаг 1: деепричастия, иначе возвратные частицы и окончания
+    # прилагательных, глаголов или существительных
+    result = _remove_ending(word, rv, _PERFECTIVE_GERUND)
+    if result is None:
+        word = _remove_ending(word, rv, _REFLEXIVE) or word
+        result = _remove_ending(word, rv, _ADJECTIVE)
+        if result is not None:
+            result = _remove_ending(result, rv, _PARTICIPLE) or result
+        else:
+            result = _remove_ending(word, rv, _VERB)
+            if result is None:
+                result = _remove_ending(word, rv, _NOUN)
+    word = result if result is not None else word
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3: словообразовательные суффиксы в R2
+    for suffix in ('ость', 'ост'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= r2:
+            word = word[:-len(suffix)]
+            break
+
+    # Шаг 4: двойная "н", превосходная степень, мягкий знак
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    else:
+        superlative = _remove_ending(word, rv, ((), ('ейше', 'ейш')))
+        if superlative is not None:
+            word = superlative
+            if word.endswith('нн') and len(word) - 2 >= rv:
+                word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
+
+
+def html_to_text(value):
+    """Удаляет HTML-разметку и лишние пробелы"""
+    return ' '.join(html.unescape(strip_tags(value or '')).split())
+
+
+def stem_text(text):
+    """Текст в виде основ слов через пробел — в таком виде он попадает в FTS5"""
+    return ' '.join(stem(word) for word in WORD_RE.findall(text))
+
+
+def query_words(query):
+    return [word.lower() for word in WORD_RE.findall(query or '')]
+
+
+def highlight(text, query, words=30):
+    """
+    Возвращает фрагмент текста вокруг первого найденного слова запроса,
+    выделяя совпадения тегом <mark>
+    """
+    stems = [stem(word) for word in query_words(query)]
+    matches = list(WORD_RE.finditer(text))
+    if not matches:
+        return ''
+
+    def is_hit(match):
+        word_stem = stem(match.group())
+        return any(word_stem.startswith(query_stem) for query_stem in stems)
+
+    first = next((i for i, match in enumerate(matches) if is_hit(match)), 0)
+    start = max(first - 5, 0)
+    window = matches[start:start + words]
+
+    parts = ['…'] if start else []
+    position = window[0].start()
+    for match in window:
+        parts.append(escape(text[position:match.start()]))
+        if is_hit(match):
+            parts.append(f'<mark>{escape(match.group())}</mark>')
+        else:
+            parts.append(escape(match.group()))
+        position = match.end()
+    if start + words < len(matches):
+        parts.append('…')
+    return mark_safe(''.join(parts))
+
+
+# Подготовка документов
+
+def build_document(kind, obj, forum_posts=None):
+    """
+    Возвращает (заголовок, текст) для объекта или None, если объект
+    не должен попадать в поиск (например, не опубликован).
+
+    Аргументы:
+        kind: 'post', 'recipe' или 'topic'
+        obj: экземпляр модели (подходят и исторические модели миграций)
+        forum_posts: тексты сообщений темы; если не указаны, загружаются из базы
+    """
+    if kind == 'post':
+        if obj.status != 'published':
+            return None
+        return obj.title, html_to_text(obj.content)
+    if kind == 'recipe':
+        if obj.status != 'published':
+            return None
+        return obj.title, html_to_text(f'{obj.ingredients} {obj.instructions}')
+    if kind == 'topic':
+        if forum_posts is None:
+            forum_posts = obj.forum_posts.order_by('created_on').values_list('content', flat=True)
+        return obj.title, html_to_text(' '.join([obj.content, *forum_posts]))
+    raise ValueError(f'Неизвестный тип документа: {kind}')
+
+
+# Бэкенды полнотекстового индекса
+
+class SearchBackend:
+    """Поиск без полнотекстового индекса: icontains по SearchDocument"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def install(self, schema_editor):
+        pass
+
+    def uninstall(self, schema_editor):
+        pass
+
+    def index(self, documents):
+        pass
+
+    def remove(self, document_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def _filter(self, kind, query):
+        SearchDocument = global_apps.get_model('weightloss', 'SearchDocument')
+        condition = Q()
+        for word in query_words(query):
+            condition &= Q(title__icontains=word) | Q(text__icontains=word)
+        return SearchDocument.objects.filter(condition, kind=kind)
+
+    def count(self, kind, query):
+        return self._filter(kind, query).count()
+
+    def page(self, kind, query, offset, limit):
+        """Возвращает пары (object_id, text) в порядке релевантности"""
+        documents = self._filter(kind, query).order_by('-updated_on')
+        return list(documents.values_list('object_id', 'text')[offset:offset + limit])
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 с основами слов, ранжирование BM25 (заголовок весит больше текста)"""
+
+    table = 'weightloss_searchdocument_fts'
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+            f"USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, documents):
+        rows = [(doc.pk, stem_text(doc.title), stem_text(doc.text)) for doc in documents]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, title, body) VALUES (%s, %s, %s)', rows)
+
+    def remove(self, document_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in document_ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def _match(self, query):
+        # Каждое слово ищется по основе как префикс, все слова обязательны
+        return ' '.join(f'"{stem(word)}"*' for word in query_words(query))
+
+    def count(self, kind, query):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {self.table} '
+                f'JOIN weightloss_searchdocument doc ON doc.id = {self.table}.rowid '
+                f'WHERE {self.table} MATCH %s AND doc.kind = %s',
+                [self._match(query), kind],
+            )
+            return cursor.fetchone()[0]
+
+    def page(self, kind, query, offset, limit):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT doc.object_id, doc.text FROM {self.table} '
+                f'JOIN weightloss_searchdocument doc ON doc.id = {self.table}.rowid '
+                f'WHERE {self.table} MATCH %s AND doc.kind = %s '
+                f'ORDER BY bm25({self.table}, 10.0, 1.0) LIMIT %s OFFSET %s',
+                [self._match(query), kind, limit, offset],
+            )
+            return cursor.fetchall()
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """tsvector с конфигурацией 'russian' и GIN-индексом"""
+
+    def install(self, schema_editor):
+        schema_editor.execute('ALTER TABLE weightloss_searchdocument ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            'CREATE INDEX weightloss_searchdocument_vector ON weightloss_searchdocument USING GIN (search_vector)'
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute('DROP INDEX IF EXISTS weightloss_searchdocument_vector')
+        schema_editor.execute('ALTER TABLE weightloss_searchdocument DROP COLUMN IF EXISTS search_vector')
+
+    def index(self, documents):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                "UPDATE weightloss_searchdocument SET search_vector = "
+                "setweight(to_tsvector('russian', title), 'A') || setweight(to_tsvector('russian', text), 'B') "
+                "WHERE id = %s",
+                [(doc.pk,) for doc in documents],
+            )
+
+    def _tsquery(self, query):
+        return ' & '.join(f'{word}:*' for word in query_words(query))
+
+    def count(self, kind, query):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM weightloss_searchdocument "
+                "WHERE kind = %s AND search_vector @@ to_tsquery('russian', %s)",
+                [kind, self._tsquery(query)],
+            )
+            return cursor.fetchone()[0]
+
+    def page(self, kind, query, offset, limit):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT object_id, text FROM weightloss_searchdocument, to_tsquery('russian', %s) query "
+                "WHERE kind = %s AND search_vector @@ query "
+                "ORDER BY ts_rank_cd(search_vector, query) DESC, id DESC LIMIT %s OFFSET %s",
+                [self._tsquery(query), kind, limit, offset],
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    """Возвращает бэкенд поиска для текущей базы данных"""
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, SearchBackend)(connection)
+
+
+# Обновление индекса
+
+def update_document(kind, obj, forum_posts=None):
+    """Добавляет, обновляет или удаляет документ объекта в поисковом индексе"""
+    SearchDocument = global_apps.get_model('weightloss', 'SearchDocument')
+    content = build_document(kind, obj, forum_posts)
+    if content is None:
+        remove_document(kind, obj.pk)
+        return
+    title, text = content
+    document, _ = SearchDocument.objects.update_or_create(
+        kind=kind, object_id=obj.pk, defaults={'title': title, 'text': text}
+    )
+    get_backend().index([document])
+
+
+def remove_document(kind, object_id):
+    """Удаляет документ объекта из поискового индекса"""
+    SearchDocument = global_apps.get_model('weightloss', 'SearchDocument')
+    ids = list(SearchDocument.objects.filter(kind=kind, object_id=object_id).values_list('pk', flat=True))
+    if ids:
+        get_backend().remove(ids)
+        SearchDocument.objects.filter(pk__in=ids).delete()
+
+
+def rebuild_index(apps=global_apps, batch_size=500, connection=None):
+    """
+    Перестраивает поисковый индекс целиком, обрабатывая объекты пачками.
+    Возвращает словарь {тип документа: количество проиндексированных объектов}.
+    """
+    SearchDocument = apps.get_model('weightloss', 'SearchDocument')
+    ForumPost = apps.get_model('weightloss', 'ForumPost')
+    backend = get_backend(connection)
+
+    backend.clear()
+    SearchDocument.objects.all().delete()
+
+    totals = {}
+    for kind, model_name in DOCUMENT_MODELS.items():
+        model = apps.get_model('weightloss', model_name)
+        queryset = model.objects.order_by('pk')
+        if kind != 'topic':
+            queryset = queryset.filter(status='published')
+        totals[kind] = 0
+
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            forum_posts = {}
+            if kind == 'topic':
+                for topic_id, content in ForumPost.objects.filter(
+                    topic_id__in=[obj.pk for obj in batch]
+                ).order_by('created_on').values_list('topic_id', 'content'):
+                    forum_posts.setdefault(topic_id, []).append(content)
+
+            documents = []
+            for obj in batch:
+                content = build_document(kind, obj, forum_posts.get(obj.pk, []))
+                if content is not None:
+                    documents.append(SearchDocument(kind=kind, object_id=obj.pk, title=content[0], text=content[1]))
+            documents = SearchDocument.objects.bulk_create(documents)
+            # bulk_create возвращает первичные ключи не на всех базах
+            if documents and documents[0].pk is None:
+                documents = list(SearchDocument.objects.filter(
+                    kind=kind, object_id__in=[doc.object_id for doc in documents]
+                ))
+            backend.index(documents)
+            totals[kind] += len(documents)
+    return totals
+
+
+# Результаты поиска
+
+class SearchResults:
+    """
+    Результаты поиска объектов одного типа в порядке релевантности.
+
+    Ведет себя как последовательность и подходит для Paginator: count()
+    и каждый срез выполняют по одному запросу к индексу, объекты страницы
+    загружаются одним запросом. У каждого объекта есть атрибут search_snippet
+    с выделенными совпадениями.
+    """
+
+    def __init__(self, kind, query, queryset=None):
+        self.kind = kind
+        self.query = query
+        if queryset is None:
+            queryset = global_apps.get_model('weightloss', DOCUMENT_MODELS[kind]).objects.all()
+        self.queryset = queryset
+        self.model = queryset.model
+        self.backend = get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.kind, self.query) if query_words(self.query) else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __bool__(self):
+        return self.count() > 0
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            items = self[key:key + 1]
+            if not items:
+                raise IndexError(key)
+            return items[0]
+        start, stop = key.start or 0, key.stop if key.stop is not None else self.count()
+        if stop <= start or not query_words(self.query):
+            return []
+
+        rows = self.backend.page(self.kind, self.query, start, stop - start)
+        objects = self.queryset.in_bulk([object_id for object_id, _ in rows])
+        results = []
+        for object_id, text in rows:
+            obj = objects.get(object_id)
+            if obj is not None:
+                obj.search_snippet = highlight(text, self.query)
+                results.append(obj)
+        return results
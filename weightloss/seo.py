@@ -0,0 +1,162 @@
+"""
+SEO-метаданные страниц.
+
+Настройки (DEFAULT_SEO, SECTION_SEO, SCHEMA_ORG) лежат в
+djangoProject10/seo.py. Все, что от запроса не зависит, готовится здесь
+один раз при импорте: данные разделов уже объединены с DEFAULT_SEO,
+раздел страницы определяется по имени маршрута из URL_SECTIONS,
+а статические блоки JSON-LD (сайт и организация) уже сериализованы.
+
+Контекстный процессор seo_processor (context_processors.py) кладет
+в контекст ленивый объект: словарь seo собирается только при первом
+обращении шаблона, поэтому AJAX-фрагменты и страницы без SEO-блоков
+за него не платят. Так же лениво строится JSON-LD статьи и рецепта
+(article_json_ld, recipe_json_ld), который представления передают
+в контекст.
+"""
+import json
+import re
+
+from django.utils.functional import lazy
+from django.utils.safestring import SafeString, mark_safe
+from django.utils.text import Truncator
+
+from djangoProject10.seo import DEFAULT_SEO, SCHEMA_ORG, SECTION_SEO
+
+from .images import variant_url
+from .search import html_to_text
+
+# Раздел сайта по имени маршрута
+URL_SECTIONS = {
+    'home': 'home',
+    'blog_list': 'blog',
+    'post_detail': 'blog',
+    'category_detail': 'blog',
+    'recipe_list': 'recipes',
+    'recipe_detail': 'recipes',
+    'forum_home': 'forum',
+    'forum_search': 'forum',
+    'forum_category': 'forum',
+    'forum_topic_detail': 'forum',
+    'challenge_list': 'challenges',
+    'challenge_detail': 'challenges',
+}
+
+# SEO-данные разделов, уже объединенные с DEFAULT_SEO
+SECTION_DEFAULTS = {
+    section: {**DEFAULT_SEO, **SECTION_SEO.get(section, {})}
+    for section in set(URL_SECTIONS.values())
+}
+
+CANONICAL_BASE = DEFAULT_SEO['canonical_url'].rstrip('/')
+
+DESCRIPTION_WORDS = 40
+
+# Символы, которые не должны встречаться внутри <script> как есть
+JSON_LD_ESCAPES = {ord('<'): '\\u003C', ord('>'): '\\u003E', ord('&'): '\\u0026'}
+
+# Границы пунктов в HTML ингредиентов и инструкций
+BLOCK_RE = re.compile(r'<(?:li|p|br|div|h[1-6])\b[^>]*>', re.IGNORECASE)
+
+
+def to_json_ld(data):
+    """Сериализует данные для <script type="application/ld+json">"""
+    return mark_safe(json.dumps(data, ensure_ascii=False).translate(JSON_LD_ESCAPES))
+
+
+# Сайт и организация не меняются, сериализуются один раз
+STATIC_JSON_LD = {
+    'website': to_json_ld(SCHEMA_ORG['website']),
+    'organization': to_json_ld(SCHEMA_ORG['organization']),
+}
+
+PUBLISHER = {
+    '@type': 'Organization',
+    'name': SCHEMA_ORG['organization']['name'],
+    'logo': {'@type': 'ImageObject', 'url': SCHEMA_ORG['organization']['logo']},
+}
+
+
+def page_seo(request):
+    """SEO-данные страницы: раздел по имени маршрута и канонический адрес"""
+    # resolver_match уже заполнен обработчиком запроса; на страницах
+    # ошибок 404 маршрута нет, для них остаются данные по умолчанию
+    match = getattr(request, 'resolver_match', None)
+    section = URL_SECTIONS.get(match.url_name) if match else None
+    seo = dict(SECTION_DEFAULTS.get(section, DEFAULT_SEO))
+    seo['canonical_url'] = CANONICAL_BASE + request.path
+    return seo
+
+
+def _person(user):
+    if user is None:
+        return None
+    return {'@type': 'Person', 'name': user.get_full_name() or user.username}
+
+
+def _image(image, request):
+    return request.build_absolute_uri(variant_url(image, 'og')) if image else None
+
+
+def _lines(value):
+    """Пункты списка или абзацы HTML в виде строк текста"""
+    return [line for line in (html_to_text(part) for part in BLOCK_RE.split(value or '')) if line]
+
+
+def _compact(data):
+    return {key: value for key, value in data.items() if value not in (None, '', [])}
+
+
+def article_schema(post, request):
+    """Schema.org Article для статьи блога"""
+    return _compact({
+        **SCHEMA_ORG['article'],
+        'headline': post.title,
+        'description': Truncator(html_to_text(post.content)).words(DESCRIPTION_WORDS),
+        'image': _image(post.featured_image, request),
+        'datePublished': post.created_on.isoformat(),
+        'dateModified': post.updated_on.isoformat(),
+        'author': _person(post.author),
+        'publisher': PUBLISHER,
+        'articleSection': post.category.name,
+        'mainEntityOfPage': request.build_absolute_uri(post.get_absolute_url()),
+    })
+
+
+def recipe_schema(recipe, request):
+    """Schema.org Recipe для рецепта"""
+    return _compact({
+        **SCHEMA_ORG['recipe'],
+        'name': recipe.title,
+        'image': _image(recipe.image, request),
+        'author': _person(recipe.author),
+        'datePublished': recipe.created_on.isoformat(),
+        'totalTime': f'PT{recipe.preparation_time}M',
+        'recipeIngredient': _lines(recipe.ingredients),
+        'recipeInstructions': [{'@type': 'HowToStep', 'text': step} for step in _lines(recipe.instructions)],
+        'nutrition': {
+            '@type': 'NutritionInformation',
+            'calories': f'{recipe.calories} ккал',
+            'proteinContent': f'{recipe.protein} г',
+            'carbohydrateContent': f'{recipe.carbs} г',
+            'fatContent': f'{recipe.fat} г',
+        },
+        'url': request.build_absolute_uri(recipe.get_absolute_url()),
+    })
+
+
+def _json_ld(build, obj, request):
+    return to_json_ld(build(obj, request))
+
+
+# Ленивые строки: JSON-LD строится, только когда шаблон выводит его
+_lazy_json_ld = lazy(_json_ld, SafeString)
+
+
+def article_json_ld(post, request):
+    return _lazy_json_ld(article_schema, post, request)
+
+
+def recipe_json_ld(recipe, request):
+    return _lazy_json_ld(recipe_schema, recipe, request)
+
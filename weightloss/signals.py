@@ -1,104 +1,72 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import F
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Greatest
 
-from .models import Comment, RecipeComment, ForumPost, Post, Recipe, UserProfile, Notification
+from .models import RelatedPost, Comment, RecipeComment, ForumPost, ForumTopic, ForumCategory, Post, Recipe, Category, Challenge, Food, FoodCategory, UserProfile, VIPComment, Meal, MealItem
+from .notifications import enqueue
+from .nutrition import refresh_meal_plan_totals, refresh_plan_totals
+from .images import IMAGE_FIELDS, ensure_variants
+from .page_cache import bump_section
+from .related import refresh_related_posts, update_related_post
+from .search import remove_document, update_document
+from .site_stats import change_site_stats, restore_latest_member, set_latest_member
+from .sitemaps import mark_stale
 
 
+def _increment(model, pk, field, delta=1):
+    """
+    Атомарно изменяет счетчик field у строки pk выражением F(),
+    не опуская его ниже нуля
+    """
+    if pk is None:
+        return
+    value = F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+    model.objects.filter(pk=pk).update(**{field: value})
+
+
+# Уведомления: сигналы только ставят события в очередь (см. notifications.py)
+
 @receiver(post_save, sender=Comment)
 def create_comment_notification(sender, instance, created, **kwargs):
     """
-    Отправляет уведомление автору поста при получении нового комментария
-    """
-    if created and instance.author != instance.post.author:
-        # Уведомление автору поста о новом комментарии
-        Notification.create_notification(
-            recipient=instance.post.author,
-            notification_type='comment',
-            title='Новый комментарий к вашей статье',
-            message=f'{instance.author.username} оставил(а) комментарий к вашей статье "{instance.post.title}"',
-            sender=instance.author,
-            content_object=instance,
-            url=f"{instance.post.get_absolute_url()}#comment-{instance.id}"
-        )
-    
-    # Если это ответ на комментарий, уведомляем автора родительского комментария
-    if created and instance.parent and instance.author != instance.parent.author:
-        Notification.create_notification(
-            recipient=instance.parent.author,
-            notification_type='reply',
-            title='Новый ответ на ваш комментарий',
-            message=f'{instance.author.username} ответил(а) на ваш комментарий к статье "{instance.post.title}"',
-            sender=instance.author,
-            content_object=instance,
-            url=f"{instance.post.get_absolute_url()}#comment-{instance.id}"
-        )
+    Уведомляет автора поста о новом комментарии, а автора родительского
+    комментария — об ответе
+    """
+    if created:
+        enqueue('comment', instance)
 
 
 @receiver(post_save, sender=RecipeComment)
 def create_recipe_comment_notification(sender, instance, created, **kwargs):
     """
-    Отправляет уведомление автору рецепта при получении нового комментария
-    """
-    if created and instance.author != instance.recipe.author:
-        # Уведомление автору рецепта о новом комментарии
-        Notification.create_notification(
-            recipient=instance.recipe.author,
-            notification_type='comment',
-            title='Новый комментарий к вашему рецепту',
-            message=f'{instance.author.username} оставил(а) комментарий к вашему рецепту "{instance.recipe.title}"',
-            sender=instance.author,
-            content_object=instance,
-            url=f"{instance.recipe.get_absolute_url()}#comment-{instance.id}"
-        )
-    
-    # Если это ответ на комментарий, уведомляем автора родительского комментария
-    if created and instance.parent and instance.author != instance.parent.author:
-        Notification.create_notification(
-            recipient=instance.parent.author,
-            notification_type='reply',
-            title='Новый ответ на ваш комментарий',
-            message=f'{instance.author.username} ответил(а) на ваш комментарий к рецепту "{instance.recipe.title}"',
-            sender=instance.author,
-            content_object=instance,
-            url=f"{instance.recipe.get_absolute_url()}#comment-{instance.id}"
-        )
+    Уведомляет автора рецепта о новом комментарии, а автора родительского
+    комментария — об ответе
+    """
+    if created:
+        enqueue('recipe_comment', instance)
 
 
 @receiver(post_save, sender=ForumPost)
 def create_forum_post_notification(sender, instance, created, **kwargs):
     """
-    Отправляет уведомление при получении нового ответа на форуме
-    """
-    if created and instance.parent and instance.author != instance.parent.author:
-        # Уведомление автору родительского поста о новом ответе
-        Notification.create_notification(
-            recipient=instance.parent.author,
-            notification_type='forum_reply',
-            title='Новый ответ на ваше сообщение на форуме',
-            message=f'{instance.author.username} ответил(а) на ваше сообщение в теме "{instance.topic.title}"',
-            sender=instance.author,
-            content_object=instance,
-            url=f"{instance.get_absolute_url()}"
-        )
-    
-    # Если это первый пост в теме, не нужно отправлять уведомление
-    if created and not instance.parent:
-        return
-    
-    # Если это новый пост в теме, уведомляем автора темы (если он не автор поста)
-    if created and instance.author != instance.topic.author:
-        Notification.create_notification(
-            recipient=instance.topic.author,
-            notification_type='forum_reply',
-            title='Новое сообщение в вашей теме',
-            message=f'{instance.author.username} оставил(а) сообщение в вашей теме "{instance.topic.title}"',
-            sender=instance.author,
-            content_object=instance,
-            url=f"{instance.get_absolute_url()}"
-        )
+    Уведомляет автора родительского сообщения и автора темы о новом ответе на форуме
+    """
+    if created:
+        enqueue('forum_post', instance)
+
+
+@receiver(post_save, sender=VIPComment)
+def create_vip_comment_notification(sender, instance, created, **kwargs):
+    """
+    Уведомляет автора VIP-статьи о новом комментарии, а автора родительского
+    комментария — об ответе
+    """
+    if created:
+        enqueue('vip_comment', instance)
 
 
 @receiver(post_save, sender=Post)
@@ -106,43 +74,26 @@ def create_post_status_notification(sender, instance, **kwargs):
     """
     Отправляет уведомление автору поста о изменении статуса публикации
     """
-    try:
-        # Проверяем, изменился ли статус поста
-        if not hasattr(instance, '_previous_status'):
-            return
-        
-        if instance._previous_status != instance.status:
-            if instance.status == 'published':
-                Notification.create_notification(
-                    recipient=instance.author,
-                    notification_type='status_update',
-                    title='Ваша статья опубликована',
-                    message=f'Ваша статья "{instance.title}" была проверена и опубликована',
-                    url=instance.get_absolute_url()
-                )
-            elif instance.status == 'rejected':
-                Notification.create_notification(
-                    recipient=instance.author,
-                    notification_type='status_update',
-                    title='Статья не прошла модерацию',
-                    message=f'Ваша статья "{instance.title}" не прошла модерацию',
-                    url=reverse('user_posts')
-                )
-    except Exception:
-        # Если произошла ошибка, просто пропускаем
-        pass
+    # Проверяем, изменился ли статус поста
+    if not hasattr(instance, '_previous_status'):
+        return
+    
+    if instance._previous_status != instance.status and instance.status in ('published', 'rejected'):
+        enqueue('post_status', instance, status=instance.status)
 
 
 @receiver(pre_save, sender=Post)
 def store_previous_post_status(sender, instance, **kwargs):
     """
-    Сохраняет предыдущий статус поста перед сохранением
+    Сохраняет предыдущий статус и категорию поста перед сохранением
     """
     try:
         prev_instance = Post.objects.get(pk=instance.pk)
         instance._previous_status = prev_instance.status
+        instance._previous_category_id = prev_instance.category_id
     except Post.DoesNotExist:
         instance._previous_status = None
+        instance._previous_category_id = None
 
 
 @receiver(post_save, sender=Recipe)
@@ -150,31 +101,12 @@ def create_recipe_status_notification(sender, instance, **kwargs):
     """
     Отправляет уведомление автору рецепта о изменении статуса публикации
     """
-    try:
-        # Проверяем, изменился ли статус рецепта
-        if not hasattr(instance, '_previous_status'):
-            return
-        
-        if instance._previous_status != instance.status:
-            if instance.status == 'published':
-                Notification.create_notification(
-                    recipient=instance.author,
-                    notification_type='status_update',
-                    title='Ваш рецепт опубликован',
-                    message=f'Ваш рецепт "{instance.title}" был проверен и опубликован',
-                    url=instance.get_absolute_url()
-                )
-            elif instance.status == 'rejected':
-                Notification.create_notification(
-                    recipient=instance.author,
-                    notification_type='status_update',
-                    title='Рецепт не прошел модерацию',
-                    message=f'Ваш рецепт "{instance.title}" не прошел модерацию. Причина: {instance.rejection_reason or "Не указана"}',
-                    url=reverse('user_recipes')
-                )
-    except Exception:
-        # Если произошла ошибка, просто пропускаем
-        pass
+    # Проверяем, изменился ли статус рецепта
+    if not hasattr(instance, '_previous_status'):
+        return
+    
+    if instance._previous_status != instance.status and instance.status in ('published', 'rejected'):
+        enqueue('recipe_status', instance, status=instance.status, reason=instance.rejection_reason or '')
 
 
 @receiver(pre_save, sender=Recipe)
@@ -194,22 +126,429 @@ def check_weight_goal_achievement(sender, instance, **kwargs):
     """
     Проверяет достижение целевого веса и отправляет уведомление
     """
-    if instance.current_weight and instance.goal_weight:
-        # Для случая снижения веса
-        if instance.starting_weight > instance.goal_weight and instance.current_weight <= instance.goal_weight:
-            Notification.create_notification(
-                recipient=instance.user,
-                notification_type='weight_goal',
-                title='Поздравляем! 🎉',
-                message=f'Вы достигли своей цели по весу! Ваш текущий вес {instance.current_weight} кг достиг или стал меньше целевого {instance.goal_weight} кг.',
-                url=reverse('profile')
-            )
-        # Для случая набора веса
-        elif instance.starting_weight < instance.goal_weight and instance.current_weight >= instance.goal_weight:
-            Notification.create_notification(
-                recipient=instance.user,
-                notification_type='weight_goal',
-                title='Поздравляем! 🎉',
-                message=f'Вы достигли своей цели по весу! Ваш текущий вес {instance.current_weight} кг достиг или стал больше целевого {instance.goal_weight} кг.',
-                url=reverse('profile')
-            ) 
\ No newline at end of file
+    if not (instance.current_weight and instance.goal_weight and instance.starting_weight):
+        return
+    # Для случая снижения веса
+    if instance.starting_weight > instance.goal_weight and instance.current_weight <= instance.goal_weight:
+        direction = 'loss'
+    # Для случая набора веса
+    elif instance.starting_weight < instance.goal_weight and instance.current_weight >= instance.goal_weight:
+        direction = 'gain'
+    else:
+        return
+    enqueue(
+        'weight_goal', instance,
+        direction=direction,
+        current_weight=str(instance.current_weight),
+        goal_weight=str(instance.goal_weight),
+    )
+
+
+# Денормализованные счетчики
+
+@receiver(post_save, sender=Comment)
+def increment_post_comments(sender, instance, created, **kwargs):
+    """Увеличивает счетчик комментариев статьи"""
+    if created:
+        _increment(Post, instance.post_id, 'comments_total')
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_post_comments(sender, instance, **kwargs):
+    """Уменьшает счетчик комментариев статьи"""
+    _increment(Post, instance.post_id, 'comments_total', -1)
+
+
+@receiver(post_save, sender=RecipeComment)
+def increment_recipe_comments(sender, instance, created, **kwargs):
+    """Увеличивает счетчик комментариев рецепта"""
+    if created:
+        _increment(Recipe, instance.recipe_id, 'comments_total')
+
+
+@receiver(post_delete, sender=RecipeComment)
+def decrement_recipe_comments(sender, instance, **kwargs):
+    """Уменьшает счетчик комментариев рецепта"""
+    _increment(Recipe, instance.recipe_id, 'comments_total', -1)
+
+
+@receiver(post_save, sender=Post)
+def update_category_published_count(sender, instance, created, **kwargs):
+    """
+    Обновляет счетчик опубликованных статей категории
+    при публикации, снятии с публикации или переносе статьи
+    """
+    was_published = getattr(instance, '_previous_status', None) == 'published'
+    previous_category_id = getattr(instance, '_previous_category_id', None)
+    is_published = instance.status == 'published'
+    
+    if was_published and (not is_published or previous_category_id != instance.category_id):
+        _increment(Category, previous_category_id, 'published_total', -1)
+    if is_published and (not was_published or previous_category_id != instance.category_id):
+        _increment(Category, instance.category_id, 'published_total')
+
+
+@receiver(post_delete, sender=Post)
+def decrement_category_published_count(sender, instance, **kwargs):
+    """Уменьшает счетчик опубликованных статей категории при удалении статьи"""
+    if instance.status == 'published':
+        _increment(Category, instance.category_id, 'published_total', -1)
+
+
+@receiver(pre_save, sender=ForumTopic)
+def store_previous_topic_category(sender, instance, **kwargs):
+    """
+    Сохраняет предыдущую категорию темы, чтобы перенести счетчик при смене раздела
+    """
+    instance._previous_category_id = None
+    if instance.pk:
+        instance._previous_category_id = ForumTopic.objects.filter(
+            pk=instance.pk
+        ).values_list('category_id', flat=True).first()
+
+
+def _refresh_category_activity(category_id):
+    """Пересчитывает дату последней активности категории форума по ее темам"""
+    activity = ForumTopic.objects.filter(category_id=category_id).aggregate(
+        last_topic_on=Max('created_on'),
+        last_post_on=Max('last_post_on'),
+    )
+    dates = [date for date in activity.values() if date]
+    ForumCategory.objects.filter(pk=category_id).update(
+        last_activity_on=max(dates) if dates else None
+    )
+
+
+@receiver(post_save, sender=ForumTopic)
+def update_forum_category_topics(sender, instance, created, **kwargs):
+    """Обновляет счетчик тем и дату последней активности категории форума"""
+    previous_category_id = getattr(instance, '_previous_category_id', None)
+    if created:
+        ForumCategory.objects.filter(pk=instance.category_id).update(
+            topics_total=F('topics_total') + 1,
+            last_activity_on=instance.created_on,
+        )
+    elif previous_category_id and previous_category_id != instance.category_id:
+        _increment(ForumCategory, previous_category_id, 'topics_total', -1)
+        _increment(ForumCategory, instance.category_id, 'topics_total')
+        _refresh_category_activity(previous_category_id)
+        _refresh_category_activity(instance.category_id)
+
+
+@receiver(post_delete, sender=ForumTopic)
+def decrement_forum_category_topics(sender, instance, **kwargs):
+    """Уменьшает счетчик тем категории форума при удалении темы"""
+    _increment(ForumCategory, instance.category_id, 'topics_total', -1)
+    _refresh_category_activity(instance.category_id)
+
+
+@receiver(post_save, sender=ForumPost)
+def update_forum_post_counters(sender, instance, created, **kwargs):
+    """
+    Обновляет счетчики при новом сообщении на форуме: количество сообщений
+    и последнее сообщение темы, активность категории и количество ответов
+    у всех сообщений выше по ветке
+    """
+    if not created:
+        return
+    
+    ForumTopic.objects.filter(pk=instance.topic_id).update(
+        posts_total=F('posts_total') + 1,
+        latest_post=instance,
+        last_post_on=instance.created_on,
+    )
+    ForumCategory.objects.filter(topics=instance.topic_id).update(
+        last_activity_on=instance.created_on
+    )
+    
+    if instance.parent_id:
+        ForumPost.with_ancestors(instance.parent_id).update(replies_total=F('replies_total') + 1)
+
+
+def _deleted_with_subtree(instance, origin):
+    """
+    Удаляется ли сообщение вместе с темой (категорией) или как ответ внутри
+    удаляемой ветки: тогда счетчики за него уже учтены удаляемым объектом
+    """
+    if isinstance(origin, (ForumTopic, ForumCategory)):
+        return True
+    return isinstance(origin, ForumPost) and origin.pk != instance.pk
+
+
+@receiver(pre_delete, sender=ForumPost)
+def decrement_forum_reply_counters(sender, instance, origin=None, **kwargs):
+    """
+    Уменьшает количество ответов у всех сообщений выше по ветке.
+    Вызывается до удаления, пока цепочка родителей еще существует.
+    При удалении ветки предки уменьшаются один раз, на размер ветки,
+    по сигналу ее корня; при удалении темы ничего не пересчитывается.
+    """
+    if _deleted_with_subtree(instance, origin):
+        return
+    # Размер ветки нужен и счетчику сообщений темы после удаления
+    instance._subtree_size = 1
+    if isinstance(origin, ForumPost):
+        replies = ForumPost.objects.filter(pk=instance.pk).values_list('replies_total', flat=True).first()
+        instance._subtree_size += replies or 0
+    if instance.parent_id:
+        ForumPost.with_ancestors(instance.parent_id).update(
+            replies_total=Greatest(F('replies_total') - instance._subtree_size, 0)
+        )
+
+
+@receiver(post_delete, sender=ForumPost)
+def update_topic_after_post_delete(sender, instance, origin=None, **kwargs):
+    """Уменьшает счетчик сообщений темы и пересчитывает ее последнее сообщение"""
+    if _deleted_with_subtree(instance, origin):
+        return
+    latest = ForumPost.objects.filter(topic=OuterRef('pk')).order_by('-created_on', '-pk')
+    ForumTopic.objects.filter(pk=instance.topic_id).update(
+        posts_total=Greatest(F('posts_total') - getattr(instance, '_subtree_size', 1), 0),
+        latest_post=Subquery(latest.values('pk')[:1]),
+        last_post_on=Subquery(latest.values('created_on')[:1]),
+    )
+
+
+# Инвалидация кэша страниц и фрагментов
+
+PAGE_CACHE_SECTIONS = {
+    Post: ('blog',),
+    Category: ('blog',),
+    Recipe: ('recipes',),
+    Challenge: ('challenges',),
+    ForumCategory: ('forum',),
+    ForumTopic: ('forum',),
+    ForumPost: ('forum',),
+    # Индекс продуктов в памяти процесса (food_index.py)
+    Food: ('foods',),
+    FoodCategory: ('foods',),
+}
+
+
+def bump_page_cache(sender, **kwargs):
+    """
+    Делает устаревшим кэш разделов, зависящих от измененной модели.
+    Версия увеличивается после фиксации транзакции, чтобы параллельный
+    запрос не закэшировал под новой версией еще старые данные.
+    """
+    sections = PAGE_CACHE_SECTIONS[sender]
+    transaction.on_commit(lambda: bump_section(*sections))
+
+
+for model in PAGE_CACHE_SECTIONS:
+    post_save.connect(bump_page_cache, sender=model, dispatch_uid=f'page_cache_save_{model.__name__}')
+    post_delete.connect(bump_page_cache, sender=model, dispatch_uid=f'page_cache_delete_{model.__name__}')
+
+
+# Разделы карты сайта (sitemaps.py), которые зависят от модели.
+# static — списки, lastmod которых берется из дат содержимого
+SITEMAP_SECTIONS = {
+    Post: ('posts', 'categories', 'static'),
+    Category: ('categories',),
+    Recipe: ('recipes', 'static'),
+    Challenge: ('challenges', 'static'),
+    ForumCategory: ('forum_categories',),
+    ForumTopic: ('forum_topics', 'forum_categories', 'static'),
+    ForumPost: ('forum_topics', 'forum_categories', 'static'),
+}
+
+
+def mark_sitemaps_stale(sender, **kwargs):
+    """Помечает разделы карты сайта для перестройки после фиксации транзакции"""
+    sections = SITEMAP_SECTIONS[sender]
+    transaction.on_commit(lambda: mark_stale(*sections))
+
+
+for model in SITEMAP_SECTIONS:
+    post_save.connect(mark_sitemaps_stale, sender=model, dispatch_uid=f'sitemap_save_{model.__name__}')
+    post_delete.connect(mark_sitemaps_stale, sender=model, dispatch_uid=f'sitemap_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=User)
+def bump_users_cache_on_register(sender, instance, created, **kwargs):
+    """
+    Обновляет кэш страниц со счетчиком пользователей при регистрации.
+    Остальные сохранения пользователя (например, вход) кэш не затрагивают.
+    """
+    if created:
+        transaction.on_commit(lambda: bump_section('users'))
+
+
+@receiver(post_delete, sender=User)
+def bump_users_cache_on_delete(sender, instance, **kwargs):
+    """Обновляет кэш страниц со счетчиком пользователей при удалении"""
+    transaction.on_commit(lambda: bump_section('users'))
+
+
+# Статистика сайта (см. site_stats.py)
+
+@receiver(post_save, sender=User)
+def update_site_stats_on_register(sender, instance, created, **kwargs):
+    """Учитывает нового пользователя в статистике сайта"""
+    if created:
+        change_site_stats(users_total=1)
+        set_latest_member(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def update_site_stats_on_user_delete(sender, instance, **kwargs):
+    """
+    Уменьшает число пользователей; если удален последний
+    зарегистрированный, на его место встает предыдущий
+    """
+    change_site_stats(users_total=-1)
+    restore_latest_member()
+
+
+def _published_delta(instance, created):
+    was_published = not created and getattr(instance, '_previous_status', None) == 'published'
+    is_published = instance.status == 'published'
+    return int(is_published) - int(was_published)
+
+
+@receiver(post_save, sender=Post)
+def update_site_stats_on_post_save(sender, instance, created, **kwargs):
+    change_site_stats(posts_published=_published_delta(instance, created))
+
+
+@receiver(post_delete, sender=Post)
+def update_site_stats_on_post_delete(sender, instance, **kwargs):
+    if instance.status == 'published':
+        change_site_stats(posts_published=-1)
+
+
+@receiver(post_save, sender=Recipe)
+def update_site_stats_on_recipe_save(sender, instance, created, **kwargs):
+    change_site_stats(recipes_published=_published_delta(instance, created))
+
+
+@receiver(post_delete, sender=Recipe)
+def update_site_stats_on_recipe_delete(sender, instance, **kwargs):
+    if instance.status == 'published':
+        change_site_stats(recipes_published=-1)
+
+
+@receiver(post_save, sender=ForumTopic)
+def update_site_stats_on_topic_save(sender, instance, created, **kwargs):
+    if created:
+        change_site_stats(topics_total=1)
+
+
+@receiver(post_delete, sender=ForumTopic)
+def update_site_stats_on_topic_delete(sender, instance, **kwargs):
+    change_site_stats(topics_total=-1)
+
+
+@receiver(post_save, sender=ForumPost)
+def update_site_stats_on_forum_post_save(sender, instance, created, **kwargs):
+    if created:
+        change_site_stats(forum_posts_total=1)
+
+
+@receiver(post_delete, sender=ForumPost)
+def update_site_stats_on_forum_post_delete(sender, instance, **kwargs):
+    change_site_stats(forum_posts_total=-1)
+
+
+# Похожие статьи (см. related.py)
+
+@receiver(post_save, sender=Post)
+def update_related_posts_on_save(sender, instance, **kwargs):
+    """
+    Пересчитывает похожие статьи после фиксации транзакции, если статья
+    опубликована или была опубликована до сохранения
+    """
+    if instance.status == 'published' or getattr(instance, '_previous_status', None) == 'published':
+        post_id = instance.pk
+        transaction.on_commit(lambda: update_related_post(post_id))
+
+
+@receiver(pre_delete, sender=Post)
+def store_posts_related_to_deleted(sender, instance, **kwargs):
+    """Запоминает статьи, в списках которых была удаляемая статья"""
+    instance._related_post_ids = list(
+        RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def refresh_related_posts_on_delete(sender, instance, **kwargs):
+    post_ids = getattr(instance, '_related_post_ids', None)
+    if post_ids:
+        transaction.on_commit(lambda: refresh_related_posts(post_ids))
+
+
+# Варианты изображений (см. images.py)
+
+def build_image_variants(sender, instance, **kwargs):
+    """Строит варианты новых картинок объекта после фиксации транзакции"""
+    transaction.on_commit(lambda: ensure_variants(instance))
+
+
+for app_label, model_name in IMAGE_FIELDS:
+    post_save.connect(
+        build_image_variants, sender=f'{app_label}.{model_name}', dispatch_uid=f'image_variants_{model_name}'
+    )
+
+
+# Поисковый индекс
+
+SEARCH_DOCUMENT_KINDS = {
+    Post: 'post',
+    Recipe: 'recipe',
+    ForumTopic: 'topic',
+}
+
+
+def update_search_document(sender, instance, **kwargs):
+    """Обновляет документ объекта в поисковом индексе (неопубликованные удаляются)"""
+    update_document(SEARCH_DOCUMENT_KINDS[sender], instance)
+
+
+def remove_search_document(sender, instance, **kwargs):
+    """Удаляет документ объекта из поискового индекса"""
+    remove_document(SEARCH_DOCUMENT_KINDS[sender], instance.pk)
+
+
+for model in SEARCH_DOCUMENT_KINDS:
+    post_save.connect(update_search_document, sender=model, dispatch_uid=f'search_save_{model.__name__}')
+    post_delete.connect(remove_search_document, sender=model, dispatch_uid=f'search_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=ForumPost)
+@receiver(post_delete, sender=ForumPost)
+def update_topic_search_document(sender, instance, origin=None, **kwargs):
+    """
+    Переиндексирует тему при добавлении, изменении или удалении сообщения.
+    При каскадном удалении тема переиндексируется один раз — по сигналу
+    удаляемого сообщения, с которого началось удаление; при удалении
+    самой темы или категории ее документ удаляется отдельно.
+    """
+    if isinstance(origin, (ForumTopic, ForumCategory)):
+        return
+    if isinstance(origin, ForumPost) and origin.pk != instance.pk:
+        return
+    topic = ForumTopic.objects.filter(pk=instance.topic_id).first()
+    if topic is not None:
+        update_document('topic', topic)
+
+
+@receiver(post_save, sender=MealItem)
+@receiver(post_delete, sender=MealItem)
+def update_meal_plan_totals(sender, instance, origin=None, **kwargs):
+    """
+    Пересчитывает итоги КБЖУ плана при изменении продукта приема пищи.
+    При удалении через QuerySet итоги пересчитывает вызывающий код
+    (см. meal_plans.replace_plan_contents), при каскадном удалении —
+    обработчик удаления приема пищи.
+    """
+    if origin is not None and not isinstance(origin, MealItem):
+        return
+    refresh_meal_plan_totals(instance.meal_id)
+
+
+@receiver(post_delete, sender=Meal)
+def update_meal_plan_totals_after_meal_delete(sender, instance, origin=None, **kwargs):
+    """Пересчитывает итоги плана после удаления приема пищи вместе с продуктами"""
+    if isinstance(origin, Meal):
+        refresh_plan_totals(instance.plan_id)
@@ -0,0 +1,160 @@
+"""
+Сводная статистика сайта для главной страницы и форума.
+
+Итоги (пользователи, опубликованные статьи и рецепты, темы и сообщения
+форума, последний зарегистрированный пользователь) и списки популярных
+материалов хранятся в единственной строке SiteStats. Сигналы меняют
+счетчики строки выражениями F(), а команда refresh_site_stats
+периодически пересчитывает все целиком и обновляет популярное.
+
+Шаблоны и представления читают снимок через get_site_stats: это одно
+обращение к кэшу (ключ сбрасывается после каждого изменения), при
+промахе — одна строка из базы. Во всех шаблонах снимок доступен как
+site_stats (context_processors.site_stats_processor).
+"""
+from datetime import timedelta
+
+from django.apps import apps as global_apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Subquery
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+
+# Первичный ключ единственной строки SiteStats
+SINGLETON_PK = 1
+
+CACHE_KEY = 'site-stats'
+# Запись в кэше сбрасывается при каждом изменении; срок жизни лишь
+# ограничивает устаревание, если сброс совпал с параллельным чтением
+CACHE_TIMEOUT = 10 * 60
+
+COUNTER_FIELDS = ('users_total', 'posts_published', 'recipes_published', 'topics_total', 'forum_posts_total')
+
+# Популярное считается по материалам за последние TRENDING_DAYS дней
+TRENDING_DAYS = 30
+TRENDING_SIZE = 5
+
+
+def _snapshot(stats):
+    snapshot = {field: getattr(stats, field) for field in COUNTER_FIELDS}
+    member = stats.latest_member
+    snapshot['latest_member'] = {'id': member.pk, 'username': member.username} if member else None
+    snapshot['trending'] = stats.trending or {}
+    snapshot['refreshed_at'] = stats.refreshed_at
+    return snapshot
+
+
+def get_site_stats():
+    """Снимок статистики сайта в виде словаря"""
+    snapshot = cache.get(CACHE_KEY)
+    if snapshot is None:
+        SiteStats = global_apps.get_model('weightloss', 'SiteStats')
+        stats = SiteStats.objects.select_related('latest_member').filter(pk=SINGLETON_PK).first()
+        if stats is None:
+            stats = refresh_site_stats()
+        snapshot = _snapshot(stats)
+        cache.set(CACHE_KEY, snapshot, CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_site_stats():
+    cache.delete(CACHE_KEY)
+
+
+def _update(**values):
+    SiteStats = global_apps.get_model('weightloss', 'SiteStats')
+    SiteStats.objects.filter(pk=SINGLETON_PK).update(**values)
+    transaction.on_commit(invalidate_site_stats)
+
+
+def change_site_stats(**deltas):
+    """Атомарно изменяет счетчики статистики, например change_site_stats(topics_total=1)"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if deltas:
+        _update(**{
+            field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+
+
+def set_latest_member(user_id):
+    _update(latest_member=user_id)
+
+
+def restore_latest_member():
+    """Если последний пользователь удален, берет следующего по дате регистрации"""
+    SiteStats = global_apps.get_model('weightloss', 'SiteStats')
+    User = global_apps.get_model('auth', 'User')
+    latest = User.objects.order_by('-date_joined', '-pk').values('pk')[:1]
+    SiteStats.objects.filter(pk=SINGLETON_PK, latest_member__isnull=True).update(
+        latest_member=Subquery(latest)
+    )
+    transaction.on_commit(invalidate_site_stats)
+
+
+def _top(queryset, recent_field, since, order, fields):
+    """Лучшие материалы за период, а если за период ничего нет — за все время"""
+    rows = list(queryset.filter(**{f'{recent_field}__gte': since}).order_by(*order).values(*fields)[:TRENDING_SIZE])
+    if not rows:
+        rows = list(queryset.order_by(*order).values(*fields)[:TRENDING_SIZE])
+    return rows
+
+
+def build_trending(apps=global_apps, now=None):
+    """Популярные статьи, рецепты и темы форума по просмотрам и сообщениям"""
+    Post = apps.get_model('weightloss', 'Post')
+    Recipe = apps.get_model('weightloss', 'Recipe')
+    ForumTopic = apps.get_model('weightloss', 'ForumTopic')
+    since = (now or timezone.now()) - timedelta(days=TRENDING_DAYS)
+
+    posts = _top(Post.objects.filter(status='published'), 'created_on', since,
+                 ('-views', '-created_on'), ('title', 'slug', 'views'))
+    recipes = _top(Recipe.objects.filter(status='published'), 'created_on', since,
+                   ('-views', '-created_on'), ('title', 'slug', 'views'))
+    topics = _top(ForumTopic.objects.all(), 'last_post_on', since,
+                  ('-posts_total', '-views'), ('title', 'slug', 'category__slug', 'posts_total', 'views'))
+    return {
+        'posts': [
+            {'title': row['title'], 'url': reverse('post_detail', args=[row['slug']]), 'views': row['views']}
+            for row in posts
+        ],
+        'recipes': [
+            {'title': row['title'], 'url': reverse('recipe_detail', args=[row['slug']]), 'views': row['views']}
+            for row in recipes
+        ],
+        'topics': [
+            {
+                'title': row['title'],
+                'url': reverse('forum_topic_detail', args=[row['category__slug'], row['slug']]),
+                'posts': row['posts_total'],
+                'views': row['views'],
+            }
+            for row in topics
+        ],
+    }
+
+
+def refresh_site_stats(apps=global_apps):
+    """Пересчитывает статистику сайта целиком и возвращает строку SiteStats"""
+    SiteStats = apps.get_model('weightloss', 'SiteStats')
+    User = apps.get_model('auth', 'User')
+    Post = apps.get_model('weightloss', 'Post')
+    Recipe = apps.get_model('weightloss', 'Recipe')
+    ForumTopic = apps.get_model('weightloss', 'ForumTopic')
+    ForumPost = apps.get_model('weightloss', 'ForumPost')
+
+    now = timezone.now()
+    stats, _ = SiteStats.objects.update_or_create(pk=SINGLETON_PK, defaults={
+        'users_total': User.objects.count(),
+        'posts_published': Post.objects.filter(status='published').count(),
+        'recipes_published': Recipe.objects.filter(status='published').count(),
+        'topics_total': ForumTopic.objects.count(),
+        'forum_posts_total': ForumPost.objects.count(),
+        'latest_member': User.objects.order_by('-date_joined', '-pk').first(),
+        'trending': build_trending(apps, now),
+        'refreshed_at': now,
+    })
+    transaction.on_commit(invalidate_site_stats)
+    return stats
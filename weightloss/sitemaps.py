@@ -1,100 +1,317 @@
+"""
+Карта сайта.
+
+Разделы описаны подклассами Sitemap из django.contrib.sitemaps, но items()
+выбирают только поля, нужные для адреса и lastmod (values_list), а
+lastmod категорий считается одним агрегирующим запросом на раздел.
+У страниц без собственной даты изменения (о проекте, контакты) lastmod
+нет: текущее время в lastmod сбивало бы кэширование у поисковых роботов.
+
+build_section записывает страницы раздела (по SITEMAP_PAGE_SIZE адресов)
+в SITEMAP_ROOT в сжатом gzip виде, build_index — индекс со ссылками на
+них. Файл перезаписывается, только если его содержимое изменилось, так
+что время изменения файла остается честным Last-Modified.
+
+Сигналы не перестраивают карту сразу, а помечают разделы устаревшими
+(mark_stale — пустой файл-метка, общий для всех процессов сервера).
+serve_sitemap перед ответом перестраивает только устаревшие разделы и
+отдает готовый файл с ETag/Last-Modified (условные запросы получают 304)
+и сжатием gzip, если клиент его принимает. Полная перестройка:
+python manage.py build_sitemaps.
+"""
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps.views import SitemapIndexItem
+from django.db.models import Max, Q
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
-from .models import Post, Recipe, Challenge, ForumCategory, ForumTopic
-from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .models import Category, Challenge, ForumCategory, ForumTopic, Post, Recipe
+from .seo import CANONICAL_BASE
+
+INDEX_FILE = 'sitemap.xml.gz'
+
+# Адреса в карте строятся от того же адреса сайта, что и канонические ссылки
+BASE_URL = urlsplit(CANONICAL_BASE)
+
+
+def _latest(*dates):
+    return max((date for date in dates if date is not None), default=None)
 
-class StaticViewSitemap(Sitemap):
-    changefreq = "weekly"
+
+class SectionSitemap(Sitemap):
+    """Раздел карты сайта: элементы — кортежи полей из values_list"""
+    limit = settings.SITEMAP_PAGE_SIZE
+
+    def location(self, item):
+        return reverse(self.route, args=item[:-1])
+
+    def lastmod(self, item):
+        return item[-1]
+
+
+class StaticViewSitemap(SectionSitemap):
+    """Статические страницы и списки разделов"""
+    changefreq = 'weekly'
     priority = 0.8
-    protocol = 'https'
-    
+
+    # Маршрут -> функция, возвращающая дату последнего изменения списка
+    routes = {
+        'home': lambda: _latest(
+            Post.objects.filter(status='published').aggregate(date=Max('updated_on'))['date'],
+            Recipe.objects.filter(status='published').aggregate(date=Max('updated_on'))['date'],
+        ),
+        'blog_list': lambda: Post.objects.filter(status='published').aggregate(date=Max('updated_on'))['date'],
+        'recipe_list': lambda: Recipe.objects.filter(status='published').aggregate(date=Max('updated_on'))['date'],
+        'forum_home': lambda: _latest(*ForumTopic.objects.aggregate(Max('updated_on'), Max('last_post_on')).values()),
+        'challenge_list': lambda: Challenge.objects.filter(is_active=True).aggregate(date=Max('created_on'))['date'],
+        'calculators': None,
+        'about': None,
+        'contact': None,
+        'privacy_policy': None,
+        'terms_of_service': None,
+        'cookie_policy': None,
+    }
+
     def items(self):
-        return ['home', 'blog_list', 'recipe_list', 'calculators', 'challenge_list', 
-                'forum_home', 'about', 'contact', 'privacy_policy', 'terms_of_service', 
-                'cookie_policy']
-    
+        return [(route, lastmod() if lastmod else None) for route, lastmod in self.routes.items()]
+
     def location(self, item):
-        return reverse(item)
-    
-    def lastmod(self, item):
-        return timezone.now()
+        return reverse(item[0])
 
 
-class PostSitemap(Sitemap):
-    changefreq = "daily"
+class PostSitemap(SectionSitemap):
+    """Опубликованные статьи блога"""
+    changefreq = 'daily'
     priority = 0.7
-    protocol = 'https'
-    
+    route = 'post_detail'
+
     def items(self):
-        return Post.objects.filter(status='published')
-    
-    def lastmod(self, obj):
-        return obj.updated_on
-    
-    def location(self, obj):
-        return obj.get_absolute_url()
+        return Post.objects.filter(status='published').order_by('pk').values_list('slug', 'updated_on')
 
 
-class RecipeSitemap(Sitemap):
-    changefreq = "weekly"
+class RecipeSitemap(SectionSitemap):
+    """Опубликованные рецепты"""
+    changefreq = 'weekly'
     priority = 0.7
-    protocol = 'https'
-    
+    route = 'recipe_detail'
+
     def items(self):
-        return Recipe.objects.filter(status='published')
-    
-    def lastmod(self, obj):
-        return obj.updated_on
-    
-    def location(self, obj):
-        return obj.get_absolute_url()
+        return Recipe.objects.filter(status='published').order_by('pk').values_list('slug', 'updated_on')
 
 
-class ChallengeSitemap(Sitemap):
-    changefreq = "monthly"
+class CategorySitemap(SectionSitemap):
+    """Категории блога: lastmod — последняя измененная статья"""
+    changefreq = 'weekly'
     priority = 0.6
-    protocol = 'https'
-    
+    route = 'category_detail'
+
     def items(self):
-        return Challenge.objects.filter(is_active=True)
-    
-    def lastmod(self, obj):
-        return obj.created_on
-    
-    def location(self, obj):
-        return obj.get_absolute_url()
+        return Category.objects.order_by('pk').annotate(
+            lastmod=Max('posts__updated_on', filter=Q(posts__status='published'))
+        ).values_list('slug', 'lastmod')
 
 
-class ForumCategorySitemap(Sitemap):
-    changefreq = "weekly"
+class ChallengeSitemap(SectionSitemap):
+    """Активные челленджи"""
+    changefreq = 'monthly'
     priority = 0.6
-    protocol = 'https'
-    
+    route = 'challenge_detail'
+
     def items(self):
-        return ForumCategory.objects.all()
-    
-    def lastmod(self, obj):
-        # Получение последней активности в категории
-        topics = obj.topics.all()
-        if topics.exists():
-            latest_topic = topics.order_by('-updated_on').first()
-            return latest_topic.updated_on
-        return timezone.now()
-    
-    def location(self, obj):
-        return obj.get_absolute_url()
-
-
-class ForumTopicSitemap(Sitemap):
-    changefreq = "daily"
+        return Challenge.objects.filter(is_active=True).order_by('pk').values_list('slug', 'created_on')
+
+
+class ForumCategorySitemap(SectionSitemap):
+    """Категории форума: lastmod — последняя активность в темах"""
+    changefreq = 'weekly'
+    priority = 0.6
+    route = 'forum_category'
+
+    def items(self):
+        rows = ForumCategory.objects.order_by('pk').annotate(
+            updated=Max('topics__updated_on'), replied=Max('topics__last_post_on'),
+        ).values_list('slug', 'updated', 'replied')
+        return [(slug, _latest(updated, replied)) for slug, updated, replied in rows]
+
+
+class ForumTopicSitemap(SectionSitemap):
+    """Темы форума"""
+    changefreq = 'daily'
     priority = 0.5
-    protocol = 'https'
-    
+    route = 'forum_topic_detail'
+
     def items(self):
-        return ForumTopic.objects.all()
-    
-    def lastmod(self, obj):
-        return obj.updated_on
-    
-    def location(self, obj):
-        return obj.get_absolute_url() 
\ No newline at end of file
+        return ForumTopic.objects.order_by('pk').values_list(
+            'category__slug', 'slug', 'updated_on', 'last_post_on'
+        )
+
+    def location(self, item):
+        return reverse(self.route, args=item[:2])
+
+    def lastmod(self, item):
+        # Новые ответы меняют страницу темы, но не updated_on
+        return _latest(item[2], item[3])
+
+
+SITEMAPS = {
+    'static': StaticViewSitemap,
+    'posts': PostSitemap,
+    'recipes': RecipeSitemap,
+    'categories': CategorySitemap,
+    'challenges': ChallengeSitemap,
+    'forum_categories': ForumCategorySitemap,
+    'forum_topics': ForumTopicSitemap,
+}
+
+
+def _root():
+    return Path(settings.SITEMAP_ROOT)
+
+
+def _site():
+    return SimpleNamespace(domain=BASE_URL.netloc, name=BASE_URL.netloc)
+
+
+def page_filename(section, page):
+    return f'sitemap-{section}-{page}.xml.gz'
+
+
+def _manifest_path(section):
+    return _root() / f'sitemap-{section}.json'
+
+
+def _marker_path(section):
+    return _root() / f'{section}.stale'
+
+
+def _write(path, data):
+    """Записывает файл атомарно; одинаковое содержимое не перезаписывается"""
+    try:
+        if path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+    return True
+
+
+def _write_xml(path, xml):
+    # mtime=0 — одинаковый XML дает побайтно одинаковый архив
+    _write(path, gzip.compress(xml.encode('utf-8'), mtime=0))
+
+
+def build_section(section):
+    """Записывает страницы раздела и его манифест (даты изменения страниц)"""
+    sitemap = SITEMAPS[section]()
+    root = _root()
+    pages = []
+    for page in sitemap.paginator.page_range:
+        urls = sitemap.get_urls(page=page, site=_site(), protocol=BASE_URL.scheme)
+        _write_xml(root / page_filename(section, page), render_to_string('sitemap.xml', {'urlset': urls}))
+        lastmod = _latest(*(url['lastmod'] for url in urls))
+        pages.append(lastmod.isoformat() if lastmod else None)
+
+    # Раздел уменьшился — лишние страницы удаляются
+    page = len(pages) + 1
+    while (root / page_filename(section, page)).exists():
+        (root / page_filename(section, page)).unlink()
+        page += 1
+    _write(_manifest_path(section), json.dumps(pages).encode('utf-8'))
+    return len(pages)
+
+
+def build_index():
+    """Записывает индекс карты сайта по манифестам разделов"""
+    items = []
+    for section in SITEMAPS:
+        try:
+            pages = json.loads(_manifest_path(section).read_bytes())
+        except (OSError, ValueError):
+            continue
+        for page, lastmod in enumerate(pages, 1):
+            location = CANONICAL_BASE + reverse('sitemap_section', kwargs={'section': section, 'page': page})
+            items.append(SitemapIndexItem(location, datetime.fromisoformat(lastmod) if lastmod else None))
+    _write_xml(_root() / INDEX_FILE, render_to_string('sitemap_index.xml', {'sitemaps': items}))
+
+
+def mark_stale(*sections):
+    """Помечает разделы устаревшими; перестроятся при следующем запросе карты"""
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    for section in sections:
+        _marker_path(section).touch()
+
+
+def build_sitemaps(sections=None):
+    """
+    Перестраивает разделы sections (по умолчанию все) и индекс.
+
+    Возвращает:
+        Словарь {раздел: число страниц}
+    """
+    built = {}
+    for section in sections or SITEMAPS:
+        # Метка снимается до перестройки: изменение во время нее пометит раздел снова
+        _marker_path(section).unlink(missing_ok=True)
+        built[section] = build_section(section)
+    build_index()
+    return built
+
+
+def refresh_stale():
+    """Перестраивает устаревшие и еще не построенные разделы"""
+    stale = [
+        section for section in SITEMAPS
+        if _marker_path(section).exists() or not _manifest_path(section).exists()
+    ]
+    if stale or not (_root() / INDEX_FILE).exists():
+        return build_sitemaps(stale)
+    return {}
+
+
+@require_safe
+def serve_sitemap(request, section=None, page=None):
+    """Отдает индекс или страницу раздела карты сайта с условными запросами и gzip"""
+    if section is not None and section not in SITEMAPS:
+        raise Http404
+    refresh_stale()
+    path = _root() / (INDEX_FILE if section is None else page_filename(section, page))
+    try:
+        stat = path.stat()
+        data = path.read_bytes()
+    except OSError:
+        raise Http404
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(data, content_type='application/xml; charset=utf-8')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(data), content_type='application/xml; charset=utf-8')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'public, max-age={settings.SITEMAP_MAX_AGE}'
+    response['X-Robots-Tag'] = 'noindex, noodp, noarchive'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,147 @@
+"""
+Выделение уникальных slug.
+
+Модели с адресом по slug (статьи, рецепты, темы форума, VIP-статьи,
+челленджи, категории продуктов) наследуют UniqueSlugMixin: если slug при
+сохранении пуст, он строится из поля slug_source. Свободный суффикс
+находится одним запросом по префиксу (next_free_slug): из занятых
+base, base-1, base-2, … берется наибольший номер, а не перебираются
+номера по одному запросу на попытку.
+
+Проверка «свободен ли slug» и вставка не атомарны, поэтому решающим
+остается уникальный индекс: если параллельный запрос успел занять тот
+же slug, сохранение откатывается к точке сохранения и повторяется
+со следующим номером (до SLUG_ATTEMPTS раз).
+
+backfill_slugs исправляет slug уже сохраненных объектов — пустые,
+начинающиеся с дефиса, с кириллицей и другими недопустимыми символами —
+без запроса на каждый объект: занятые slug модели загружаются один раз,
+номера выделяются в памяти, изменения записываются пачками.
+Команда: python manage.py backfill_slugs.
+"""
+import re
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+from unidecode import unidecode
+
+SLUG_ATTEMPTS = 5
+
+# Место под суффикс «-N» при обрезке длинного заголовка
+SUFFIX_RESERVE = 8
+
+# Допустимые символы SlugField; slug не должен начинаться с дефиса
+VALID_SLUG_RE = re.compile(r'^[a-zA-Z0-9_][-a-zA-Z0-9_]*$')
+
+
+def slug_base(text, fallback, max_length=50):
+    """Основа slug: транслитерация заголовка, без суффикса номера"""
+    base = slugify(unidecode(text or '').strip())[:max_length - SUFFIX_RESERVE].strip('-')
+    return base or fallback
+
+
+def is_valid_slug(slug):
+    return bool(VALID_SLUG_RE.match(slug or ''))
+
+
+def _suffix(slug, base):
+    """Номер slug вида base или base-N, иначе None"""
+    if slug == base:
+        return 0
+    rest = slug[len(base) + 1:]
+    return int(rest) if slug.startswith(base + '-') and rest.isdigit() else None
+
+
+def next_free_slug(model, base, exclude_pk=None):
+    """
+    Первый свободный slug вида base или base-N, где N больше всех занятых.
+    Один запрос: slug, равные base или начинающиеся с «base-».
+    """
+    prefix = base + '-'
+    taken = Q(slug__startswith=prefix)
+    if connection.vendor == 'sqlite':
+        # LIKE в SQLite регистронезависимый и не использует индекс, а диапазон
+        # по двоичному порядку строк — использует («.» следует за «-»)
+        taken &= Q(slug__gte=prefix, slug__lt=base + '.')
+    queryset = model._default_manager.filter(Q(slug=base) | taken).order_by()
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+
+    numbers = [_suffix(slug, base) for slug in queryset.values_list('slug', flat=True)]
+    numbers = [number for number in numbers if number is not None]
+    if not numbers:
+        return base
+    return f'{base}-{max(numbers) + 1}'
+
+
+class UniqueSlugMixin:
+    """
+    Заполняет пустой slug при сохранении и повторяет сохранение, если
+    выбранный slug успел занять другой объект.
+    """
+    slug_source = 'title'
+    slug_fallback = 'item'
+
+    def get_slug_base(self):
+        max_length = self._meta.get_field('slug').max_length
+        return slug_base(getattr(self, self.slug_source), self.slug_fallback, max_length)
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        base = self.get_slug_base()
+        for attempt in range(SLUG_ATTEMPTS):
+            self.slug = next_free_slug(type(self), base, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = type(self)._default_manager.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not taken or attempt == SLUG_ATTEMPTS - 1:
+                    self.slug = ''
+                    raise
+
+
+def backfill_slugs(model, batch_size=500, dry_run=False):
+    """
+    Выдает новые slug объектам модели с пустым или недопустимым slug.
+
+    Возвращает:
+        Список (pk, старый slug, новый slug)
+    """
+    rows = list(model._default_manager.order_by('pk').values_list('pk', 'slug', model.slug_source))
+    taken = {slug for pk, slug, source in rows if is_valid_slug(slug)}
+    max_length = model._meta.get_field('slug').max_length
+    counters = {}
+    changes = []
+    for pk, slug, source in rows:
+        if is_valid_slug(slug):
+            continue
+        base = slug_base(source, model.slug_fallback, max_length)
+        number = counters.get(base, 0)
+        candidate = base if number == 0 else f'{base}-{number}'
+        while candidate in taken:
+            number += 1
+            candidate = f'{base}-{number}'
+        counters[base] = number + 1
+        taken.add(candidate)
+        changes.append((pk, slug, candidate))
+
+    if changes and not dry_run:
+        objects = [model(pk=pk, slug=new) for pk, old, new in changes]
+        with transaction.atomic():
+            model._default_manager.bulk_update(objects, ['slug'], batch_size=batch_size)
+            transaction.on_commit(lambda: _invalidate(model))
+    return changes
+
+
+def _invalidate(model):
+    """bulk_update не отправляет сигналы: сбрасывает кэш страниц и карту сайта сам"""
+    from .page_cache import bump_section
+    from .signals import PAGE_CACHE_SECTIONS, SITEMAP_SECTIONS
+    from .sitemaps import mark_stale
+
+    bump_section(*PAGE_CACHE_SECTIONS.get(model, ()))
+    mark_stale(*SITEMAP_SECTIONS.get(model, ()))
@@ -0,0 +1,63 @@
+"""
+Хранилище загружаемых файлов с хэшем содержимого в имени.
+
+blog/photo.jpg сохраняется как blog/photo.3f2a9c1b7e4d.jpg. Файл под
+таким именем никогда не меняется, поэтому media.serve_media отдает его
+с заголовками бессрочного кэширования, а повторная загрузка того же
+содержимого не создает копию. Варианты изображений (images.py) уже
+лежат в каталогах с хэшем содержимого и сохраняются как есть.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+HASH_LENGTH = 12
+
+HASHED_NAME_RE = re.compile(r'\.([0-9a-f]{%d})\.[^./]+$' % HASH_LENGTH)
+VARIANT_NAME_RE = re.compile(r'^variants/[0-9a-f]{2}/([0-9a-f]{20})/[^/]+$')
+
+
+def name_hash(name):
+    """Хэш содержимого из имени файла или None, если имя без хэша"""
+    match = HASHED_NAME_RE.search(name) or VARIANT_NAME_RE.match(name)
+    return match.group(1) if match else None
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """FileSystemStorage, добавляющее к имени файла хэш его содержимого"""
+
+    # Пути, которые уже содержат хэш или должны сохранять имя
+    # (манифесты вариантов изображений)
+    unhashed_prefixes = ('variants/',)
+
+    def hashed_name(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        directory, filename = os.path.split(name)
+        stem, ext = os.path.splitext(filename)
+        suffix = f'.{digest.hexdigest()[:HASH_LENGTH]}{ext}'
+        if max_length is not None:
+            # Укорачиваем основу имени, а не хэш
+            room = max_length - len(os.path.join(directory, suffix))
+            stem = stem[:max(room, 1)]
+        return os.path.join(directory, stem + suffix)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if not name.startswith(self.unhashed_prefixes):
+            name = self.hashed_name(name, content, max_length)
+            validate_file_name(name, allow_relative_path=True)
+            # Такое же содержимое уже загружено — отдаем существующий файл
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length)
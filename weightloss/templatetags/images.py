@@ -0,0 +1,62 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from weightloss.images import FORMATS, get_manifest, variant_url
+
+register = template.Library()
+
+
+def _srcset(storage, entry, fmt):
+    return ', '.join(
+        f'{storage.url(path)} {width}w' for path, width in zip(entry['files'][fmt], entry['widths'])
+    )
+
+
+@register.simple_tag
+def responsive_image(image, variant='card', sizes='100vw', **attrs):
+    """
+    Выводит картинку поля ImageField с вариантами размеров и форматов
+    (см. weightloss/images.py) и отложенной загрузкой:
+
+        {% responsive_image post.featured_image 'card' sizes='(max-width: 768px) 100vw, 33vw' alt=post.title class='blog-card-img' %}
+
+    Пока варианты не построены, выводится исходная картинка.
+    """
+    if not image:
+        return ''
+    attrs = {'loading': 'lazy', 'decoding': 'async', **attrs}
+    manifest = get_manifest(image.name, image.storage)
+    entry = manifest and manifest['variants'].get(variant)
+    if not entry:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    storage = image.storage
+    formats = [fmt for fmt in FORMATS if entry['files'].get(fmt)]
+    fallback = formats[-1]
+    # Размытая заглушка видна, пока картинка грузится, и убирается после загрузки
+    style = f"background:url({manifest['placeholder']}) center/cover no-repeat"
+    attrs['style'] = f"{attrs['style'].rstrip('; ')};{style}" if attrs.get('style') else style
+    attrs.setdefault('onload', "this.style.backgroundImage='none'")
+
+    sources = [
+        format_html('<source type="{}" srcset="{}" sizes="{}">', FORMATS[fmt][1], _srcset(storage, entry, fmt), sizes)
+        for fmt in formats[:-1]
+    ]
+    img = format_html(
+        '<img src="{}" srcset="{}" sizes="{}"{}>',
+        storage.url(entry['files'][fallback][-1]), _srcset(storage, entry, fallback), sizes, flatatt(attrs),
+    )
+    # display: contents — <picture> не добавляет своего блока и не меняет верстку
+    return mark_safe('<picture style="display:contents">' + ''.join(sources) + img + '</picture>')
+
+
+@register.simple_tag(takes_context=True)
+def image_url(context, image, variant='og', absolute=True):
+    """Абсолютный адрес варианта картинки для метатегов (см. images.variant_url)"""
+    if not image:
+        return ''
+    url = variant_url(image, variant)
+    request = context.get('request')
+    return request.build_absolute_uri(url) if absolute and request is not None else url
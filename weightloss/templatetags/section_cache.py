@@ -0,0 +1,15 @@
+from django import template
+
+from weightloss.page_cache import get_section_versions
+
+register = template.Library()
+
+@register.simple_tag
+def section_version(*sections):
+    """
+    Возвращает версию разделов для использования в теге {% cache %}:
+
+        {% section_version 'blog' as blog_version %}
+        {% cache 86400 blog_categories blog_version %}...{% endcache %}
+    """
+    return get_section_versions(*sections)
@@ -1,4 +1,8 @@
 from django import template
+from django.db.models import QuerySet, Sum
+
+from ..models import Meal, MealItem
+from ..nutrition import MACROS
 
 register = template.Library()
 
@@ -64,7 +68,17 @@ def max(value, arg):
 
 @register.filter
 def sum(iterable, attr):
-    """Суммирует значения атрибута attr для всех объектов в iterable"""
+    """
+    Суммирует значения атрибута attr для всех объектов в iterable.
+    Для QuerySet поля модели и итогов КБЖУ приемов пищи (total_calories и др.)
+    сумма считается в базе одним запросом SUM.
+    """
+    if isinstance(iterable, QuerySet):
+        if attr in {field.name for field in iterable.model._meta.concrete_fields}:
+            return iterable.aggregate(total=Sum(attr))['total'] or 0
+        macro = attr[len('total_'):] if attr.startswith('total_') else None
+        if iterable.model is Meal and macro in MACROS:
+            return MealItem.objects.filter(meal__in=iterable).aggregate(total=Sum(macro))['total'] or 0
     total = 0
     for item in iterable:
         try:
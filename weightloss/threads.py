@@ -0,0 +1,142 @@
+"""
+Построение деревьев комментариев (блог, рецепты, VIP, форум) в памяти.
+
+Все узлы ветки загружаются одним запросом, после чего дерево собирается
+за O(n): каждому узлу проставляются список прямых ответов
+(``thread_replies``) и общее количество ответов во всем поддереве
+(``thread_replies_count``). Шаблоны работают только с этими атрибутами
+и не делают дополнительных запросов к базе.
+"""
+from collections import deque
+
+
+class Thread:
+    """Результат сборки ветки: корневые узлы и все узлы в порядке загрузки"""
+
+    def __init__(self, roots, nodes):
+        self.roots = roots
+        self.nodes = nodes
+
+    def __iter__(self):
+        return iter(self.roots)
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __bool__(self):
+        return bool(self.roots)
+
+    @property
+    def total_count(self):
+        """Общее количество сообщений в ветке, включая все вложенные ответы"""
+        return len(self.nodes)
+
+
+def _cache_relation(node, name, value):
+    node._meta.get_field(name).set_cached_value(node, value)
+
+
+def build_thread(nodes, parent_field='parent', shared=None):
+    """
+    Собирает дерево из плоского списка узлов.
+
+    Аргументы:
+        nodes: узлы ветки, отсортированные по дате создания
+        parent_field: имя внешнего ключа на родительский узел
+        shared: общие для всех узлов связи ({'post': post}), которые
+            записываются в кэш отношений, чтобы шаблоны не обращались к базе
+
+    Возвращает:
+        Thread с корневыми узлами
+    """
+    nodes = list(nodes)
+    parent_attname = f'{parent_field}_id'
+    by_id = {node.pk: node for node in nodes}
+    roots = []
+
+    for node in nodes:
+        node.thread_replies = []
+        node.thread_replies_count = 0
+
+    for node in nodes:
+        parent = by_id.get(getattr(node, parent_attname))
+        # Узел, чей родитель не попал в выборку, показываем как корневой
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.thread_replies.append(node)
+        if parent is not None or getattr(node, parent_attname) is None:
+            _cache_relation(node, parent_field, parent)
+        for name, value in (shared or {}).items():
+            _cache_relation(node, name, value)
+
+    # Обход в ширину дает порядок "родитель раньше потомков";
+    # проходя его в обратную сторону, накапливаем размеры поддеревьев
+    order = []
+    queue = deque(roots)
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        queue.extend(node.thread_replies)
+
+    for node in reversed(order):
+        parent = by_id.get(getattr(node, parent_attname))
+        if parent is not None:
+            parent.thread_replies_count += node.thread_replies_count + 1
+
+    return Thread(roots, nodes)
+
+
+def _children_map(rows):
+    children = {}
+    for pk, parent_id in rows:
+        children.setdefault(parent_id, []).append(pk)
+    return children
+
+
+def count_replies(rows, node_id):
+    """
+    Считает все ответы (на любой глубине) на узел node_id.
+
+    Аргументы:
+        rows: пары (id, parent_id) для всех узлов ветки
+        node_id: идентификатор узла
+    """
+    children = _children_map(rows)
+    total = 0
+    stack = list(children.get(node_id, ()))
+    while stack:
+        pk = stack.pop()
+        total += 1
+        stack.extend(children.get(pk, ()))
+    return total
+
+
+def reply_counts(rows):
+    """
+    Считает количество ответов во всех поддеревьях ветки за O(n).
+
+    Аргументы:
+        rows: пары (id, parent_id) для всех узлов ветки
+
+    Возвращает:
+        Словарь {id: количество ответов на любой глубине}
+    """
+    rows = list(rows)
+    children = _children_map(rows)
+    parents = dict(rows)
+    counts = {pk: 0 for pk in parents}
+
+    order = []
+    queue = deque(pk for pk, parent_id in rows if parent_id not in parents)
+    while queue:
+        pk = queue.popleft()
+        order.append(pk)
+        queue.extend(children.get(pk, ()))
+
+    for pk in reversed(order):
+        parent_id = parents[pk]
+        if parent_id in counts:
+            counts[parent_id] += counts[pk] + 1
+    return counts
+
@@ -76,6 +76,10 @@ urlpatterns = [
     path('management/recipes/', views.AdminRecipeListView.as_view(), name='admin_recipe_list'),
     path('management/recipes/edit/<slug:slug>/', views.AdminRecipeUpdateView.as_view(), name='admin_recipe_update'),
     
+    # Профилирование запросов
+    path('management/profiling/', views.profiling_report, name='profiling_report'),
+    path('api/profiling/', views.profiling_report_api, name='api_profiling_report'),
+    
     # Комментарии к рецептам
     path('recipes/<slug:slug>/comment/<int:comment_id>/reply/', views.RecipeCommentReplyView.as_view(), name='recipe_comment_reply'),
     
@@ -101,11 +105,11 @@ urlpatterns = [
     path('forum/create-topic/', views.ForumTopicCreateView.as_view(), name='create_topic'),
     path('forum/<slug:category_slug>/create-topic/', views.ForumTopicCreateView.as_view(), name='create_topic_in_category'),
     path('forum/search/', views.ForumSearchView.as_view(), name='forum_search'),
+    path('forum/post/<int:post_id>/reply/', views.ForumPostReplyView.as_view(), name='forum_post_reply'),
+    path('forum/post/<int:post_id>/delete/', views.ForumPostDeleteView.as_view(), name='forum_post_delete'),
     path('forum/<slug:slug>/', views.ForumCategoryView.as_view(), name='forum_category'),
     path('forum/<slug:category_slug>/<slug:slug>/', views.ForumTopicDetailView.as_view(), name='forum_topic_detail'),
     path('forum/<slug:category_slug>/<slug:topic_slug>/reply/', views.ForumPostCreateView.as_view(), name='create_post_reply'),
-    path('forum/post/<int:post_id>/reply/', views.ForumPostReplyView.as_view(), name='forum_post_reply'),
-    path('forum/post/<int:post_id>/delete/', views.ForumPostDeleteView.as_view(), name='forum_post_delete'),
     
     # Информационные страницы
     path('about/', views.AboutView.as_view(), name='about'),
@@ -142,4 +146,6 @@ urlpatterns = [
     path('notifications/mark-read/<int:pk>/', views.mark_notification_as_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     path('api/notifications/count/', views.get_unread_notifications_count, name='api_notifications_count'),
+    path('api/notifications/stream/', views.notification_stream, name='api_notifications_stream'),
+    path('api/notifications/poll/', views.notification_poll, name='api_notifications_poll'),
 ] 
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Счетчик просмотров тем форума, статей и рецептов.
+
+Просмотр не записывается в базу сразу: приращения копятся в памяти
+процесса и раз в VIEW_COUNTER_FLUSH_INTERVAL секунд (или когда
+набралось VIEW_COUNTER_MAX_PENDING просмотров) сбрасываются запросами
+UPDATE ... SET views = views + n. Объекты одной модели с одинаковым
+приращением обновляются одним запросом. QuerySet.update не вызывает
+save(), поэтому updated_on (и порядок тем на форуме) от просмотров
+не меняется, а сигналы кэша страниц не срабатывают.
+
+Поле views входит в counter_fields моделей, так что обычное сохранение
+объекта не затирает накопленное значение. При остановке процесса
+остаток буфера сбрасывается; при аварийном завершении теряются
+просмотры не более чем за один интервал. Сброс по ходу запроса ошибок
+базы не пробрасывает: просмотры возвращаются в буфер, а страница
+открывается как обычно.
+
+Повторные просмотры отсекаются ключами в отдельном кэше 'views'
+(Redis или память процесса), а не в общем кэше страниц.
+"""
+import atexit
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Буфер приращений {(модель, id объекта): число просмотров}"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def record(self, model, pk):
+        """
+        Учитывает просмотр и при необходимости сбрасывает буфер.
+
+        Возвращает число незаписанных просмотров объекта до сброса —
+        столько нужно прибавить к значению, прочитанному из базы.
+        """
+        key = (model, pk)
+        with self._lock:
+            count = self._pending[key] = self._pending.get(key, 0) + 1
+            due = (
+                len(self._pending) >= settings.VIEW_COUNTER_MAX_PENDING
+                or time.monotonic() - self._flushed_at >= settings.VIEW_COUNTER_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush(raise_errors=False)
+        return count
+
+    def pending(self, model, pk):
+        """Просмотры объекта, еще не записанные в базу этим процессом"""
+        with self._lock:
+            return self._pending.get((model, pk), 0)
+
+    def flush(self, raise_errors=True):
+        """
+        Записывает накопленные просмотры, возвращает число обновленных объектов.
+        При raise_errors=False ошибка базы только записывается в лог.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        groups = {}
+        for (model, pk), count in pending.items():
+            groups.setdefault((model, count), []).append(pk)
+        written = {}
+        try:
+            for (model, count), pks in groups.items():
+                model.objects.filter(pk__in=pks).update(views=F('views') + count)
+                for pk in pks:
+                    written[(model, pk)] = count
+        except Exception:
+            # Незаписанные просмотры возвращаем в буфер до следующего сброса
+            logger.warning('Не удалось записать просмотры, %d объектов останутся в буфере',
+                           len(pending) - len(written), exc_info=not raise_errors)
+            with self._lock:
+                for key, count in pending.items():
+                    if key not in written:
+                        self._pending[key] = self._pending.get(key, 0) + count
+            if raise_errors:
+                raise
+        return len(written)
+
+
+counter = ViewCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        counter.flush()
+    except Exception:
+        logger.exception('Не удалось записать просмотры при завершении процесса')
+
+
+def _visitor(request):
+    """Посетитель: пользователь или, для анонимных, хэш IP и User-Agent"""
+    if request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.headers.get('User-Agent', '')}"
+    return 'a' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def record_view(request, instance):
+    """
+    Учитывает GET-просмотр объекта один раз за VIEW_COUNTER_DEDUP_TIMEOUT
+    для посетителя и добавляет к instance.views еще не записанные просмотры,
+    чтобы страница показывала актуальное число.
+
+    Повторы отсекаются ключом в кэше 'views', а не сессией: иначе каждый
+    анонимный посетитель без cookie (первый визит, поисковый робот) создавал
+    бы строку сессии в базе и получал Set-Cookie, из-за чего ответ нельзя
+    кэшировать.
+    """
+    model = type(instance)
+    if request.method != 'GET':
+        instance.views += counter.pending(model, instance.pk)
+        return
+    key = f'viewed:{model._meta.model_name}:{instance.pk}:{_visitor(request)}'
+    if caches['views'].add(key, 1, settings.VIEW_COUNTER_DEDUP_TIMEOUT):
+        instance.views += counter.record(model, instance.pk)
+    else:
+        instance.views += counter.pending(model, instance.pk)
@@ -4,19 +4,27 @@ from .models import Category, Post, Recipe, Challenge, UserProfile, ForumCategor
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView, LogoutView, PasswordResetView, PasswordResetDoneView
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
 from django.urls import reverse, reverse_lazy
-from django.http import JsonResponse, HttpResponse, Http404, HttpResponseRedirect
-from django.db.models import Q, Count, F, Max, Prefetch, Sum
+from django.http import JsonResponse, HttpResponse, Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q, F, Prefetch, Sum, Window
+from django.db.models.functions import RowNumber
 from .forms import CustomUserCreationForm as UserRegisterForm, UserProfileForm, CommentForm, UserPostForm, ForumTopicForm, ForumPostForm, RecipeCommentForm, UserRecipeForm, VIPPostForm, VIPCommentForm, NutritionGoalForm, FoodForm, MealPlanForm, MealForm, MealItemForm, QuickFoodForm
+import logging
 import random
 import json
 import re
 import datetime
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.utils.text import slugify
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django_ratelimit.decorators import ratelimit
@@ -28,16 +36,29 @@ from django.utils.decorators import method_decorator
 from django.core.exceptions import PermissionDenied
 from django.contrib.contenttypes.models import ContentType
 from django.views.decorators.csrf import csrf_exempt
-from .utils import generate_unique_slug
+from .page_cache import cache_section_page
+from .profiling import PROFILE_HEADER, build_report, get_store, make_profile_token
+from .related import related_posts as get_related_posts, related_recipes as get_related_recipes
+from .search import SearchResults
+from .seo import article_json_ld, recipe_json_ld
+from .site_stats import get_site_stats
+from .counters import count_subquery
+from .food_index import IndexedQuerySet, get_food_index
+from .meal_optimizer import MealPlanOptimizer
+from .meal_plans import create_week, replace_plan_contents
+from .notification_bus import get_bus
+from .nutrition import PlanNutrition
+from .view_counter import record_view
+
+logger = logging.getLogger(__name__)
 
 # Создаем контекстный процессор для уведомлений
 def notifications_processor(request):
     context = {}
     if request.user.is_authenticated:
-        context['unread_notifications_count'] = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False
-        ).count()
+        # Счетчик читается из кэша только если шаблон его выводит
+        user_id = request.user.id
+        context['unread_notifications_count'] = SimpleLazyObject(lambda: Notification.unread_count(user_id))
     
     # Добавляем текущую дату и время
     context['now'] = timezone.now()
@@ -46,22 +67,19 @@ def notifications_processor(request):
 
 # Create your views here.
 
+@method_decorator(cache_section_page('blog', 'recipes', 'challenges', 'users'), name='dispatch')
 class HomePageView(TemplateView):
     template_name = 'weightloss/home.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['featured_posts'] = Post.objects.filter(status='published').order_by('-created_on')[:3]
+        context['featured_posts'] = Post.objects.filter(status='published').select_related('category', 'author').order_by('-created_on')[:3]
         context['featured_recipes'] = Recipe.objects.filter(status='published').order_by('-created_on')[:3]
         context['challenges'] = Challenge.objects.filter(is_active=True)[:2]
-        
-        # Добавляем реальное количество пользователей, рецептов и статей
-        context['user_count'] = User.objects.count()
-        context['recipe_count'] = Recipe.objects.filter(status='published').count()
-        context['post_count'] = Post.objects.filter(status='published').count()
-        
+        # Итоги по сайту шаблон берет из site_stats (context_processors.site_stats_processor)
         return context
 
+@method_decorator(cache_section_page('blog', params=('page', 'author')), name='dispatch')
 class BlogListView(ListView):
     model = Post
     template_name = 'weightloss/blog_list.html'
@@ -69,31 +87,23 @@ class BlogListView(ListView):
     paginate_by = 9  # Показывать 9 постов на странице
     
     def get_queryset(self):
-        queryset = Post.objects.filter(status='published')
+        queryset = Post.objects.filter(status='published').select_related('category', 'author')
         
         # Фильтр по автору, если указан
         author_username = self.request.GET.get('author')
         if author_username:
             queryset = queryset.filter(author__username=author_username)
             
-        print(f"DEBUG - BlogListView get_queryset: found {queryset.count()} posts with status='published'")
-        if queryset.count() > 0:
-            for post in queryset:
-                print(f"DEBUG - Post '{post.title}' has status '{post.status}' and category '{post.category.name}'")
-        else:
-            print("DEBUG - No published posts found!")
+        # Подсчет — лишний запрос, поэтому только при включенном уровне DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('BlogListView: опубликованных статей %d (автор: %s)', queryset.count(), author_username or '-')
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # Количество опубликованных статей хранится в самой категории
         categories = Category.objects.all()
-        
-        # Add count of published posts for each category
-        for category in categories:
-            category.published_count = Post.objects.filter(category=category, status='published').count()
-            
         context['categories'] = categories
-        print(f"DEBUG - BlogListView context: posts={len(context.get('posts', []))}, categories={len(categories)}")
         return context
 
 class BlogDetailView(DetailView):
@@ -101,41 +111,24 @@ class BlogDetailView(DetailView):
     template_name = 'weightloss/blog_detail.html'
     context_object_name = 'post'
     
+    def get_object(self, queryset=None):
+        post = super().get_object(queryset)
+        record_view(self.request, post)
+        return post
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         post = context['post']
         categories = Category.objects.all()
-        related_posts = Post.objects.filter(status='published', category=post.category).exclude(id=post.id)[:3]
+        # Похожие статьи рассчитаны заранее по TF-IDF (related.py)
+        related_posts = get_related_posts(post)
         
-        # Добавляем недавние статьи для сайдбара
+        # Недавние статьи и категории — ленивые запросы: при попадании
+        # в кэш фрагмента сайдбара они не выполняются
         recent_posts = Post.objects.filter(status='published').order_by('-created_on')[:3]
         
-        # Get comments for this post - только комментарии верхнего уровня
-        comments = Comment.objects.filter(post=post, parent=None).select_related('author')
-        
-        # Используем префетч для оптимизации загрузки ответов
-        comments = comments.prefetch_related('replies', 'replies__author')
-        
-        # Подсчет общего количества комментариев, включая вложенные ответы
-        total_comments = comments.count()
-        for comment in comments:
-            # Добавляем количество непосредственных ответов
-            replies = comment.replies.all()
-            total_comments += replies.count()
-            
-            # Добавляем количество вложенных ответов на ответы (глубокая вложенность)
-            for reply in replies:
-                total_comments += reply.replies.count()
-                for nested_reply in reply.replies.all():
-                    total_comments += nested_reply.replies.count()
-        
-        # Для каждого комментария подсчитываем все его ответы с учетом вложенных
-        for comment in comments:
-            comment.total_replies_count = comment.replies.count()
-            for reply in comment.replies.all():
-                comment.total_replies_count += reply.replies.count()
-                for nested_reply in reply.replies.all():
-                    comment.total_replies_count += nested_reply.replies.count()
+        # Загружаем всю ветку комментариев одним запросом и собираем дерево в памяти
+        comments = Comment.load_thread(post)
         
         # Add comment form for authenticated users
         if self.request.user.is_authenticated:
@@ -145,8 +138,10 @@ class BlogDetailView(DetailView):
             'categories': categories,
             'related_posts': related_posts,
             'comments': comments,
-            'total_comments': total_comments,
+            'total_comments': comments.total_count,
             'recent_posts': recent_posts,
+            # Строится, только если шаблон выводит блок structured_data
+            'json_ld': article_json_ld(post, self.request),
         })
         return context
         
@@ -165,6 +160,7 @@ class BlogDetailView(DetailView):
                 messages.error(request, 'Произошла ошибка. Пожалуйста, проверьте введенные данные.')
         return redirect(post.get_absolute_url())
 
+@method_decorator(cache_section_page('blog'), name='dispatch')
 class CategoryDetailView(DetailView):
     model = Category
     template_name = 'weightloss/category_detail.html'
@@ -176,7 +172,7 @@ class CategoryDetailView(DetailView):
         category = self.get_object()
         
         # Get posts for this category
-        posts_list = Post.objects.filter(category=category, status='published')
+        posts_list = Post.objects.filter(category=category, status='published').select_related('author')
         
         # Add pagination
         page = self.request.GET.get('page', 1)
@@ -200,6 +196,7 @@ class CategoryDetailView(DetailView):
         
         return context
 
+@method_decorator(cache_section_page('recipes', params=('page', 'author')), name='dispatch')
 class RecipeListView(ListView):
     model = Recipe
     template_name = 'weightloss/recipe_list.html'
@@ -235,16 +232,19 @@ class RecipeDetailView(DetailView):
     template_name = 'weightloss/recipe_detail.html'
     context_object_name = 'recipe'
     
+    def get_object(self, queryset=None):
+        recipe = super().get_object(queryset)
+        record_view(self.request, recipe)
+        return recipe
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         recipe = context['recipe']
-        related_recipes = Recipe.objects.exclude(id=recipe.id).order_by('?')[:3]
+        # Похожие рецепты рассчитаны заранее (related.py)
+        related_recipes = get_related_recipes(recipe)
         
-        # Get comments for this recipe - only top-level comments
-        comments = RecipeComment.objects.filter(recipe=recipe, parent=None).select_related('author')
-        
-        # Use prefetch for optimizing loading of replies
-        comments = comments.prefetch_related('replies', 'replies__author')
+        # Load the whole comment thread in one query and build the tree in memory
+        comments = RecipeComment.load_thread(recipe)
         
         # Add comment form for authenticated users
         if self.request.user.is_authenticated:
@@ -253,6 +253,7 @@ class RecipeDetailView(DetailView):
         context.update({
             'related_recipes': related_recipes,
             'comments': comments,
+            'json_ld': recipe_json_ld(recipe, self.request),
         })
         return context
         
@@ -271,6 +272,7 @@ class RecipeDetailView(DetailView):
                 messages.error(request, 'Произошла ошибка. Пожалуйста, проверьте введенные данные.')
         return redirect(recipe.get_absolute_url())
 
+@method_decorator(cache_section_page('challenges'), name='dispatch')
 class ChallengeListView(ListView):
     model = Challenge
     template_name = 'weightloss/challenge_list.html'
@@ -324,14 +326,9 @@ class SearchResultsView(ListView):
     paginate_by = 10
     
     def get_queryset(self):
+        # Статьи ищем по полнотекстовому индексу в порядке релевантности
         query = self.request.GET.get('q', '')
-        if query:
-            post_results = Post.objects.filter(
-                Q(title__icontains=query) | Q(content__icontains=query),
-                status='published'
-            )
-            return post_results
-        return Post.objects.none()
+        return SearchResults('post', query, Post.objects.select_related('category'))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -341,16 +338,13 @@ class SearchResultsView(ListView):
             post_results = context['page_obj'].object_list
             
             # Recipe results - no pagination needed as they're displayed separately
-            recipe_results = Recipe.objects.filter(
-                Q(title__icontains=query) | Q(ingredients__icontains=query) | Q(instructions__icontains=query),
-                status='published'
-            )
+            recipe_results = SearchResults('recipe', query)
             
             context['results'] = {
                 'posts': post_results,
                 'recipes': recipe_results,
                 'query': query,
-                'total_posts': self.get_queryset().count(),
+                'total_posts': context['paginator'].count,
                 'total_recipes': recipe_results.count()
             }
         else:
@@ -411,25 +405,32 @@ class UserProfileDetailView(DetailView):
     def get_object(self):
         username = self.kwargs.get('username')
         user = get_object_or_404(User, username=username)
-        profile, created = UserProfile.objects.get_or_create(user=user)
+        profile, created = UserProfile.objects.select_related('user').get_or_create(user=user)
         return profile
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        profile = self.get_object()
+        profile = self.object
         user = profile.user
         
         # Получаем публичную информацию о пользователе
         context['user_posts'] = Post.objects.filter(author=user, status='published').order_by('-created_on')[:5]
         context['user_recipes'] = Recipe.objects.filter(author=user, status='published').order_by('-created_on')[:5]
-        context['forum_topics'] = ForumTopic.objects.filter(author=user).order_by('-created_on')[:5]
+        context['forum_topics'] = ForumTopic.objects.filter(author=user).select_related('category').order_by('-created_on')[:5]
         context['bmi'] = profile.bmi()
         
-        # Подсчитываем активность пользователя
-        context['posts_count'] = Post.objects.filter(author=user, status='published').count()
-        context['recipes_count'] = Recipe.objects.filter(author=user, status='published').count()
-        context['forum_posts_count'] = ForumPost.objects.filter(author=user).count()
-        context['comments_count'] = Comment.objects.filter(author=user).count() + RecipeComment.objects.filter(author=user).count()
+        # Подсчитываем активность пользователя одним запросом
+        activity = User.objects.filter(pk=user.pk).values(
+            posts_count=count_subquery(Post.objects.filter(status='published'), 'author'),
+            recipes_count=count_subquery(Recipe.objects.filter(status='published'), 'author'),
+            forum_posts_count=count_subquery(ForumPost.objects.all(), 'author'),
+            post_comments_count=count_subquery(Comment.objects.all(), 'author'),
+            recipe_comments_count=count_subquery(RecipeComment.objects.all(), 'author'),
+        ).get()
+        context['posts_count'] = activity['posts_count']
+        context['recipes_count'] = activity['recipes_count']
+        context['forum_posts_count'] = activity['forum_posts_count']
+        context['comments_count'] = activity['post_comments_count'] + activity['recipe_comments_count']
         
         return context
 
@@ -458,17 +459,19 @@ class UserPostsListView(LoginRequiredMixin, ListView):
     paginate_by = 10  # Показывать 10 постов на странице
     
     def get_queryset(self):
-        return Post.objects.filter(author=self.request.user).order_by('-created_on')
+        return Post.objects.filter(author=self.request.user).select_related('category').order_by('-created_on')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_posts = self.get_queryset()
         
-        # Add filtered posts by status
-        context['published_posts'] = user_posts.filter(status='published')
-        context['pending_posts'] = user_posts.filter(status='pending')
-        context['draft_posts'] = user_posts.filter(status='draft')
-        context['rejected_posts'] = user_posts.filter(status='rejected')
+        # Вкладки по статусам раскладываются из одного запроса
+        by_status = {'published': [], 'pending': [], 'draft': [], 'rejected': []}
+        for post in self.get_queryset():
+            by_status.setdefault(post.status, []).append(post)
+        context['published_posts'] = by_status['published']
+        context['pending_posts'] = by_status['pending']
+        context['draft_posts'] = by_status['draft']
+        context['rejected_posts'] = by_status['rejected']
         
         return context
 
@@ -482,9 +485,6 @@ class UserPostCreateView(LoginRequiredMixin, CreateView):
         form.instance.is_user_submitted = True
         form.instance.status = 'pending'  # Устанавливаем статус "на модерации"
         
-        # Используем улучшенную функцию генерации slug
-        form.instance.slug = generate_unique_slug(Post, form.instance.title)
-        
         return super().form_valid(form)
     
     def get_success_url(self):
@@ -514,32 +514,38 @@ class UserPostUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return reverse('user_posts')
 
 # Представления для форума
+@method_decorator(cache_section_page('forum', 'users'), name='dispatch')
 class ForumHomeView(ListView):
     model = ForumCategory
     template_name = 'weightloss/forum/forum_home.html'
     context_object_name = 'categories'
     
+    # Сколько последних тем показывать в карточке категории
+    LATEST_TOPICS = 3
+    
     def get_queryset(self):
-        return ForumCategory.objects.annotate(
-            topics_count=Count('topics'),
-            posts_count=Count('topics__forum_posts'),
-            last_post_date=Max('topics__forum_posts__created_on')
-        ).order_by('order')
+        # Счетчики тем и дата последней активности хранятся в самой категории,
+        # а последние темы всех категорий выбираются одним запросом
+        latest_topics = ForumTopic.objects.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('category'),
+                order_by=[F('is_pinned').desc(), F('updated_on').desc()],
+            )
+        ).filter(position__lte=self.LATEST_TOPICS).select_related('author__profile')
+        return ForumCategory.objects.order_by('order').prefetch_related(
+            Prefetch('topics', queryset=latest_topics, to_attr='latest_topics')
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Статистика форума
-        context['topic_count'] = ForumTopic.objects.count()
-        context['reply_count'] = ForumPost.objects.count()
-        context['member_count'] = User.objects.count()
-        
-        # Последний зарегистрированный пользователь
-        try:
-            context['latest_member'] = User.objects.latest('date_joined')
-        except User.DoesNotExist:
-            context['latest_member'] = None
-            
+        # Статистика форума и последний зарегистрированный пользователь — из снимка site_stats
+        stats = get_site_stats()
+        context['topic_count'] = stats['topics_total']
+        context['reply_count'] = stats['forum_posts_total']
+        context['member_count'] = stats['users_total']
+        context['latest_member'] = stats['latest_member']
         return context
 
 class ForumCategoryView(DetailView):
@@ -552,9 +558,9 @@ class ForumCategoryView(DetailView):
         category = self.get_object()
         
         # Сортируем темы
-        topics_list = ForumTopic.objects.filter(category=category).annotate(
-            last_post_date=Max('forum_posts__created_on')
-        ).select_related('author').order_by('-is_pinned', '-updated_on')
+        topics_list = ForumTopic.objects.filter(category=category).select_related(
+            'category', 'author', 'latest_post__author'
+        ).order_by('-is_pinned', '-updated_on')
         
         # Добавляем пагинацию
         page = self.request.GET.get('page', 1)
@@ -581,26 +587,16 @@ class ForumTopicDetailView(DetailView):
         category_slug = self.kwargs.get('category_slug')
         topic_slug = self.kwargs.get('slug')
         topic = get_object_or_404(ForumTopic, slug=topic_slug, category__slug=category_slug)
-        if not self.request.session.get(f'topic_viewed_{topic.id}'):
-            topic.views += 1
-            topic.save()
-            self.request.session[f'topic_viewed_{topic.id}'] = True
+        record_view(self.request, topic)
         return topic
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        topic = self.get_object()
-        
-        # Получаем все посты темы верхнего уровня
-        posts_list = ForumPost.objects.filter(topic=topic, parent=None).select_related('author')
+        topic = self.object
         
-        # Используем префетч для оптимизации загрузки ответов
-        posts_list = posts_list.prefetch_related('replies', 'replies__author', 'replies__replies', 'replies__replies__replies')
-        
-        # Для каждого поста подсчитываем все его ответы с учетом вложенных
-        for post in posts_list:
-            # Улучшенный рекурсивный подсчет всех вложенных ответов
-            post.total_replies_count = self._count_nested_replies(post)
+        # Загружаем все сообщения темы одним запросом и собираем дерево в памяти;
+        # количество вложенных ответов уже посчитано для каждого поста
+        posts_list = ForumPost.load_thread(topic).roots
         
         # Добавляем пагинацию
         page = self.request.GET.get('page', 1)
@@ -614,25 +610,13 @@ class ForumTopicDetailView(DetailView):
             posts = paginator.page(paginator.num_pages)
         
         context['posts'] = posts
-        context['total_posts_count'] = posts_list.count()  # Добавляем общее количество постов
+        context['total_posts_count'] = len(posts_list)  # Добавляем общее количество постов
         context['form'] = ForumPostForm()
         
         # Добавляем все категории форума для отображения в боковой панели
         context['forum_categories'] = ForumCategory.objects.all().order_by('order')
         
         return context
-    
-    def _count_nested_replies(self, post):
-        """
-        Рекурсивно подсчитывает все вложенные ответы для поста.
-        """
-        total = post.replies.count()
-        
-        # Рекурсивно обрабатываем все ответы
-        for reply in post.replies.all():
-            total += self._count_nested_replies(reply)
-            
-        return total
 
 class ForumTopicCreateView(LoginRequiredMixin, CreateView):
     model = ForumTopic
@@ -648,9 +632,6 @@ class ForumTopicCreateView(LoginRequiredMixin, CreateView):
             category = get_object_or_404(ForumCategory, slug=category_slug)
             form.instance.category = category
         
-        # Используем улучшенную функцию генерации slug
-        form.instance.slug = generate_unique_slug(ForumTopic, form.instance.title)
-        
         # Save the form to create the topic
         self.object = form.save(commit=True, user=self.request.user)
         
@@ -758,14 +739,7 @@ class CommentReplyView(LoginRequiredMixin, CreateView):
         try:
             post = Post.objects.get(slug=post_slug)
             parent_comment = Comment.objects.get(id=parent_id)
-            
-            # Добавляем отладку
-            is_nested = parent_comment.parent is not None
-            parent_of_parent_id = parent_comment.parent.id if is_nested else None
-            print(f"Creating reply to comment {parent_id}")
-            print(f"Is this a reply to a reply? {is_nested}")
-            if is_nested:
-                print(f"Original parent comment ID: {parent_of_parent_id}")
+            logger.debug('Ответ на комментарий %s (родитель: %s)', parent_id, parent_comment.parent_id)
             
             # Убираем ограничение на глубину вложенности - теперь комментарии могут быть любой глубины
             # Это убрано, так как мы поддерживаем любой уровень вложенности в шаблоне
@@ -793,8 +767,7 @@ class CommentReplyView(LoginRequiredMixin, CreateView):
         form.instance.parent = parent_comment  # Устанавливаем родительский комментарий
         self.object = form.save()
         
-        # Еще отладка после сохранения
-        print(f"Created comment {self.object.id} with parent {self.object.parent.id}")
+        logger.info('Создан ответ %s на комментарий %s к статье %s', self.object.pk, parent_comment.pk, post.pk)
         
         messages.success(self.request, 'Ваш ответ успешно добавлен.')
         return HttpResponseRedirect(self.get_success_url())
@@ -847,9 +820,6 @@ class UserRecipeCreateView(LoginRequiredMixin, CreateView):
         form.instance.is_user_submitted = True
         form.instance.status = 'pending'  # Устанавливаем статус "на модерации"
         
-        # Явно создаём человекопонятный slug
-        form.instance.slug = generate_unique_slug(Recipe, form.instance.title)
-        
         return super().form_valid(form)
     
     def get_success_url(self):
@@ -930,16 +900,9 @@ class ForumSearchView(ListView):
     paginate_by = 10  # Показывать 10 результатов на странице
     
     def get_queryset(self):
+        # Поиск по названию темы и содержанию всех ее сообщений
         query = self.request.GET.get('q', '')
-        if query:
-            # Поиск по названию темы или содержанию постов
-            topics = ForumTopic.objects.filter(
-                Q(title__icontains=query) | 
-                Q(content__icontains=query) |
-                Q(forum_posts__content__icontains=query)
-            ).distinct()
-            return topics
-        return ForumTopic.objects.none()
+        return SearchResults('topic', query, ForumTopic.objects.select_related('author', 'category'))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -969,15 +932,7 @@ class RecipeCommentReplyView(LoginRequiredMixin, CreateView):
         try:
             recipe = Recipe.objects.get(slug=recipe_slug)
             parent_comment = RecipeComment.objects.get(id=parent_id)
-            
-            # Add debugging
-            is_nested = parent_comment.parent is not None
-            parent_of_parent_id = parent_comment.parent.id if is_nested else None
-            
-            print(f"Creating reply to recipe comment {parent_id}")
-            print(f"Is this a reply to a reply? {is_nested}")
-            if is_nested:
-                print(f"Original parent comment ID: {parent_of_parent_id}")
+            logger.debug('Ответ на комментарий %s к рецепту (родитель: %s)', parent_id, parent_comment.parent_id)
             
             # Убираем ограничение на глубину вложенности - поддерживаем любой уровень вложенности
             """
@@ -1006,8 +961,7 @@ class RecipeCommentReplyView(LoginRequiredMixin, CreateView):
         form.instance.parent = parent_comment
         self.object = form.save()
         
-        # More debugging after saving
-        print(f"Created comment {self.object.id} with parent {self.object.parent.id}")
+        logger.info('Создан ответ %s на комментарий %s к рецепту %s', self.object.pk, parent_comment.pk, recipe.pk)
         
         messages.success(self.request, 'Ваш ответ успешно добавлен.')
         return HttpResponseRedirect(self.get_success_url())
@@ -1049,8 +1003,8 @@ class TestBlogView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        all_posts = Post.objects.all()
-        published_posts = Post.objects.filter(status='published')
+        all_posts = Post.objects.select_related('category', 'author')
+        published_posts = all_posts.filter(status='published')
         
         context['all_posts'] = all_posts
         context['published_posts'] = published_posts
@@ -1090,15 +1044,12 @@ class ForumPostReplyView(LoginRequiredMixin, View):
     Обработка AJAX-запросов на добавление ответов к постам в форуме
     """
     def post(self, request, post_id):
-        print(f"ForumPostReplyView: получен запрос на ответ к посту {post_id}")
-        print(f"POST данные: {request.POST}")
-        
         try:
             parent_post = get_object_or_404(ForumPost, id=post_id)
             topic = parent_post.topic
             
             if topic.is_closed:
-                print(f"Ошибка: тема {topic.id} закрыта для новых ответов")
+                logger.info('Ответ к сообщению %s отклонен: тема %s закрыта', post_id, topic.id)
                 return JsonResponse({
                     'status': 'error',
                     'message': 'This topic is closed for new replies.'
@@ -1106,14 +1057,13 @@ class ForumPostReplyView(LoginRequiredMixin, View):
             
             content = request.POST.get('content', '').strip()
             if not content:
-                print("Ошибка: содержимое ответа пустое")
+                logger.debug('Ответ к сообщению %s отклонен: пустое содержимое', post_id)
                 return JsonResponse({
                     'status': 'error',
                     'message': 'Reply content cannot be empty.'
                 }, status=400)
             
             # Создаем новый ответ
-            print(f"Создаем новый ответ к посту {post_id}, автор: {request.user.username}")
             reply = ForumPost.objects.create(
                 topic=topic,
                 author=request.user,
@@ -1124,22 +1074,21 @@ class ForumPostReplyView(LoginRequiredMixin, View):
             # Обновляем дату последнего обновления темы
             topic.updated_on = timezone.now()
             topic.save()
+            parent_post.refresh_from_db(fields=['replies_total'])
             
             # Рендерим HTML для нового ответа
             level = 1
             if parent_post.parent:  # Если отвечаем на вложенный ответ
                 level = 2  # Для простоты ограничимся двумя уровнями вложенности
             
-            print(f"Рендерим шаблон single_reply.html для ответа {reply.id}, уровень {level}")
             try:
                 html = render_to_string('weightloss/forum/single_reply.html', {
                     'reply': reply,
                     'level': level,
                     'user': request.user
                 }, request=request)
-                print(f"Шаблон успешно отрендерен, длина HTML: {len(html)}")
-            except Exception as e:
-                print(f"Ошибка при рендеринге шаблона: {str(e)}")
+            except Exception:
+                logger.exception('Не удалось отрендерить ответ %s на форуме', reply.id)
                 html = f"<div>Ответ добавлен, но не может быть отображен. Обновите страницу.</div>"
             
             return JsonResponse({
@@ -1150,9 +1099,7 @@ class ForumPostReplyView(LoginRequiredMixin, View):
                 'total_replies': parent_post.total_replies_count()
             })
         except Exception as e:
-            print(f"Необработанная ошибка в ForumPostReplyView: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Ошибка при создании ответа к сообщению %s на форуме', post_id)
             return JsonResponse({
                 'status': 'error',
                 'message': f'Внутренняя ошибка сервера: {str(e)}'
@@ -1181,6 +1128,7 @@ class ForumPostDeleteView(LoginRequiredMixin, View):
         
         # Возвращаем обновленное количество ответов, если есть родительский пост
         if parent_post:
+            parent_post.refresh_from_db(fields=['replies_total'])
             return JsonResponse({
                 'status': 'success',
                 'parent_id': parent_id,
@@ -1199,12 +1147,14 @@ class NotificationListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(recipient=self.request.user).select_related('sender').order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Отмечаем все уведомления как прочитанные при просмотре списка
-        Notification.objects.filter(recipient=self.request.user, is_read=False).update(is_read=True)
+        Notification.mark_all_as_read(self.request.user.id)
+        # Счетчик только что обнулен, считать его заново не нужно
+        context['unread_notifications_count'] = 0
         return context
 
 @login_required
@@ -1226,7 +1176,7 @@ def mark_notification_as_read(request, pk):
 
 @login_required
 def mark_all_notifications_read(request):
-    Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    Notification.mark_all_as_read(request.user.id)
     
     next_url = request.GET.get('next')
     if next_url:
@@ -1240,9 +1190,130 @@ def get_unread_notifications_count(request):
     API-метод для получения количества непрочитанных уведомлений
     через AJAX
     """
-    count = Notification.objects.filter(recipient=request.user, is_read=False).count()
+    count = Notification.unread_count(request.user.id)
     return JsonResponse({'count': count})
 
+def _stream_user_id(request):
+    # Сессия и пользователь загружаются синхронно, поэтому вне цикла событий
+    return request.user.id if request.user.is_authenticated else None
+
+def _sse_message(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+async def notification_stream(request):
+    """
+    Поток событий уведомлений (Server-Sent Events) для ASGI-сервера:
+    новые уведомления и счетчик непрочитанных приходят сразу, а ожидающее
+    соединение занимает только корутину. Под WSGI поток недоступен, и
+    ответ 204 переключает клиент на notification_poll.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user_id = await sync_to_async(_stream_user_id)(request)
+    if user_id is None:
+        return HttpResponse(status=403)
+    count = await sync_to_async(Notification.unread_count)(user_id)
+    subscription = get_bus().subscribe(user_id)
+    
+    async def events():
+        # Django 4.2 не сообщает об отключении клиента во время потока, поэтому
+        # соединение закрывается через NOTIFICATION_STREAM_MAX_AGE секунд,
+        # а браузер сам подключается заново
+        deadline = time.monotonic() + settings.NOTIFICATION_STREAM_MAX_AGE
+        try:
+            yield 'retry: 5000\n\n'
+            yield _sse_message({'type': 'unread', 'count': count})
+            while time.monotonic() < deadline:
+                received = await subscription.wait_async(settings.NOTIFICATION_STREAM_HEARTBEAT)
+                if not received:
+                    # Комментарий не дает прокси закрыть простаивающее соединение
+                    yield ': ping\n\n'
+                for event in received:
+                    yield _sse_message(event)
+        finally:
+            subscription.close()
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def notification_poll(request):
+    """
+    Long-poll для WSGI-развертываний (Passenger): отвечает сразу, если
+    счетчик непрочитанных отличается от переданного клиентом в count,
+    иначе ждет события не дольше NOTIFICATION_LONG_POLL_TIMEOUT секунд.
+    """
+    user_id = request.user.id
+    timeout = settings.NOTIFICATION_LONG_POLL_TIMEOUT
+    try:
+        known = int(request.GET.get('count', ''))
+    except ValueError:
+        known = None
+    
+    # Подписываемся до чтения счетчика, чтобы не пропустить событие между ними
+    subscription = get_bus().subscribe(user_id)
+    try:
+        count = Notification.unread_count(user_id)
+        received = []
+        if count == known and timeout > 0:
+            received = subscription.wait(timeout)
+            for event in received:
+                if event['type'] == 'unread':
+                    count = event['count']
+    finally:
+        subscription.close()
+    
+    return JsonResponse({
+        'count': count,
+        'notifications': [event for event in received if event['type'] == 'notification'],
+        # Без ожидания на сервере клиент сам делает паузу перед следующим запросом
+        'retry': 0 if timeout > 0 else settings.NOTIFICATION_POLL_INTERVAL * 1000,
+    })
+
+# Профилирование запросов (только для персонала)
+def _profiling_captures():
+    return [
+        {key: value for key, value in capture.items() if key != 'stats'}
+        for capture in reversed(get_store().captures)
+    ]
+
+def _profiling_capture(request):
+    capture_id = request.GET.get('capture')
+    if not capture_id or not capture_id.isdigit():
+        return None
+    for capture in get_store().captures:
+        if capture['id'] == int(capture_id):
+            return capture
+    raise Http404('Отчет профилирования не найден')
+
+@staff_member_required
+def profiling_report(request):
+    """Сводка выборочных замеров запросов и отчеты cProfile этого процесса"""
+    report = build_report()
+    for row in report['views']:
+        row['histogram'] = list(zip(report['buckets'] + ['∞'], row['histogram']))
+    return render(request, 'weightloss/management/profiling.html', {
+        'report': report,
+        'captures': _profiling_captures(),
+        'capture': _profiling_capture(request),
+        'profile_header': PROFILE_HEADER,
+        'profile_token': make_profile_token(request.user.id),
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+        'enabled': settings.PROFILING_ENABLED,
+    })
+
+@staff_member_required
+def profiling_report_api(request):
+    """То же, что profiling_report, в формате JSON; ?capture=<id> — отчет cProfile"""
+    capture = _profiling_capture(request)
+    if capture is not None:
+        return JsonResponse(capture)
+    report = build_report()
+    report['captures'] = _profiling_captures()
+    return JsonResponse(report)
+
 # VIP Views
 class VIPUserRequired(UserPassesTestMixin):
     """Миксин для проверки, что пользователь имеет VIP-статус"""
@@ -1271,37 +1342,13 @@ class VIPDetailView(LoginRequiredMixin, View):
         if hasattr(request.user, 'profile') and request.user.profile.has_active_vip():
             vip_post = get_object_or_404(VIPPost, slug=slug)
             
-            # Получаем комментарии только верхнего уровня
-            comments = vip_post.comments.filter(parent=None).select_related('author')
-            
-            # Используем prefetch для оптимизации загрузки ответов
-            comments = comments.prefetch_related('replies', 'replies__author', 'replies__replies', 'replies__replies__author')
-            
-            # Подсчет общего количества комментариев, включая вложенные ответы
-            total_comments = comments.count()
-            for comment in comments:
-                # Добавляем количество непосредственных ответов
-                replies = comment.replies.all()
-                total_comments += replies.count()
-                
-                # Добавляем количество вложенных ответов на ответы (глубокая вложенность)
-                for reply in replies:
-                    total_comments += reply.replies.count()
-                    for nested_reply in reply.replies.all():
-                        total_comments += nested_reply.replies.count()
-            
-            # Для каждого комментария подсчитываем все его ответы с учетом вложенных
-            for comment in comments:
-                comment.total_replies_count = comment.replies.count()
-                for reply in comment.replies.all():
-                    comment.total_replies_count += reply.replies.count()
-                    for nested_reply in reply.replies.all():
-                        comment.total_replies_count += nested_reply.replies.count()
+            # Загружаем всю ветку комментариев одним запросом и собираем дерево в памяти
+            comments = VIPComment.load_thread(vip_post)
             
             return render(request, 'weightloss/vip/vip_detail.html', {
                 'post': vip_post,
                 'comments': comments,
-                'total_comments': total_comments,
+                'total_comments': comments.total_count,
                 'comment_form': VIPCommentForm()
             })
         else:
@@ -1320,22 +1367,13 @@ class VIPDetailView(LoginRequiredMixin, View):
                 new_comment.author = request.user
                 new_comment.save()
                 
-                # Создаем уведомление для автора статьи
-                if request.user != vip_post.author:
-                    Notification.objects.create(
-                        recipient=vip_post.author,
-                        sender=request.user,
-                        content_object=vip_post,
-                        notification_type='comment',
-                        message=f'{request.user.username} оставил(а) комментарий к вашей VIP-статье "{vip_post.title}"'
-                    )
-                
                 return redirect('vip_detail', slug=slug)
             
-            comments = vip_post.comments.filter(parent=None).order_by('created_on')
+            comments = VIPComment.load_thread(vip_post)
             return render(request, 'weightloss/vip/vip_detail.html', {
                 'post': vip_post,
                 'comments': comments,
+                'total_comments': comments.total_count,
                 'comment_form': form
             })
         else:
@@ -1354,16 +1392,6 @@ class VIPCommentReplyView(LoginRequiredMixin, VIPUserRequired, View):
             new_comment.author = request.user
             new_comment.save()
             
-            # Создаем уведомление для автора родительского комментария
-            if request.user != parent_comment.author:
-                Notification.objects.create(
-                    recipient=parent_comment.author,
-                    sender=request.user,
-                    content_object=vip_post,
-                    notification_type='reply',
-                    message=f'{request.user.username} ответил(а) на ваш комментарий к VIP-статье "{vip_post.title}"'
-                )
-            
             return redirect('vip_detail', slug=slug)
         
         return redirect('vip_detail', slug=slug)
@@ -1383,26 +1411,7 @@ class VIPPostCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
         form.instance.author = self.request.user
         # Сохраняем форму без коммита, чтобы получить экземпляр
         self.object = form.save(commit=False, user=self.request.user)
-        # Убедимся, что slug существует и не пустой
-        if not self.object.slug:
-            from django.utils.text import slugify
-            import random
-            import string
-            base_slug = slugify(self.object.title)
-            if not base_slug:
-                random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-                base_slug = f"vip-post-{random_string}"
-            
-            self.object.slug = base_slug
-            
-            # Проверяем уникальность слага
-            counter = 1
-            original_slug = self.object.slug
-            while VIPPost.objects.filter(slug=self.object.slug).exists():
-                self.object.slug = f"{original_slug}-{counter}"
-                counter += 1
-                
-        # Теперь сохраняем объект
+        # Пустой slug выдаст модель при сохранении
         self.object.save()
         return HttpResponseRedirect(self.get_success_url())
     
@@ -1425,26 +1434,7 @@ class VIPPostUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         form.instance.author = self.request.user
         # Сохраняем форму без коммита, чтобы получить экземпляр
         self.object = form.save(commit=False, user=self.request.user)
-        # Убедимся, что slug существует и не пустой
-        if not self.object.slug:
-            from django.utils.text import slugify
-            import random
-            import string
-            base_slug = slugify(self.object.title)
-            if not base_slug:
-                random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-                base_slug = f"vip-post-{random_string}"
-            
-            self.object.slug = base_slug
-            
-            # Проверяем уникальность слага
-            counter = 1
-            original_slug = self.object.slug
-            while VIPPost.objects.filter(slug=self.object.slug).exclude(pk=self.object.pk).exists():
-                self.object.slug = f"{original_slug}-{counter}"
-                counter += 1
-                
-        # Теперь сохраняем объект
+        # Пустой slug выдаст модель при сохранении
         self.object.save()
         return HttpResponseRedirect(self.get_success_url())
     
@@ -1495,16 +1485,6 @@ class VIPCommentReplyFormView(LoginRequiredMixin, VIPUserRequired, CreateView):
         form.instance.parent = parent_comment
         self.object = form.save()
         
-        # Создаем уведомление для автора родительского комментария
-        if self.request.user != parent_comment.author:
-            Notification.objects.create(
-                recipient=parent_comment.author,
-                sender=self.request.user,
-                content_object=vip_post,
-                notification_type='reply',
-                message=f'{self.request.user.username} ответил(а) на ваш комментарий к VIP-статье "{vip_post.title}"'
-            )
-        
         messages.success(self.request, 'Ваш ответ успешно добавлен.')
         return HttpResponseRedirect(self.get_success_url())
     
@@ -1636,21 +1616,13 @@ class MealPlanCreateView(LoginRequiredMixin, CreateView):
         kwargs['user'] = self.request.user
         return kwargs
     
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.user = self.request.user
         response = super().form_valid(form)
         
         # После сохранения плана питания автоматически создаем стандартные приемы пищи для каждого дня
-        meal_types = ['breakfast', 'lunch', 'dinner', 'snack']
-        days_of_week = range(1, 8)  # 1-7 (Понедельник - Воскресенье)
-        
-        for day in days_of_week:
-            for meal_type in meal_types:
-                Meal.objects.create(
-                    plan=self.object,
-                    meal_type=meal_type,
-                    day_of_week=day
-                )
+        create_week(self.object)
         
         return response
     
@@ -1664,39 +1636,29 @@ class MealPlanDetailView(DetailView):
     
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return MealPlan.objects.filter(user=self.request.user)
+            return MealPlan.objects.filter(user=self.request.user).select_related('nutrition_goal')
         return MealPlan.objects.none()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         meal_plan = self.object
         
+        # Итоги по приемам пищи и дням — одним сгруппированным запросом
+        nutrition = PlanNutrition.for_plan(meal_plan)
+        meals = meal_plan.meals.prefetch_related(
+            Prefetch('meal_items', queryset=MealItem.objects.select_related('food'))
+        )
+        
         # Группировка блюд по дням недели
         days_of_week = {}
-        days_totals = {}  # Словарь для хранения итогов по дням
-        
-        for meal in meal_plan.meals.all():
-            day = meal.day_of_week
-            if day not in days_of_week:
-                days_of_week[day] = []
-                days_totals[day] = {
-                    'calories': 0,
-                    'protein': 0,
-                    'fats': 0,
-                    'carbs': 0
-                }
-            days_of_week[day].append(meal)
-            
-            # Суммируем значения для дня
-            days_totals[day]['calories'] += meal.total_calories()
-            days_totals[day]['protein'] += meal.total_protein()
-            days_totals[day]['fats'] += meal.total_fats()
-            days_totals[day]['carbs'] += meal.total_carbs()
+        for meal in meals:
+            meal.nutrition = nutrition.for_meal(meal.pk)
+            days_of_week.setdefault(meal.day_of_week, []).append(meal)
         
         # Создаем список кортежей (день, блюда, итоги)
         days_data = []
-        for day, meals in sorted(days_of_week.items()):
-            days_data.append((day, meals, days_totals[day]))
+        for day, day_meals in sorted(days_of_week.items()):
+            days_data.append((day, day_meals, nutrition.for_day(day)))
         
         # Добавляем в контекст
         context['days_data'] = days_data
@@ -1704,11 +1666,11 @@ class MealPlanDetailView(DetailView):
         # Сортировка дней недели (сохраняем для обратной совместимости)
         context['days_of_week'] = sorted(days_of_week.items())
         
-        # Подсчет общих макронутриентов
-        context['total_calories'] = meal_plan.total_calories()
-        context['total_protein'] = meal_plan.total_protein()
-        context['total_fats'] = meal_plan.total_fats()
-        context['total_carbs'] = meal_plan.total_carbs()
+        # Общие макронутриенты хранятся в строке плана
+        context['total_calories'] = meal_plan.calories_total
+        context['total_protein'] = meal_plan.protein_total
+        context['total_fats'] = meal_plan.fats_total
+        context['total_carbs'] = meal_plan.carbs_total
         
         # Добавление формы для создания приема пищи
         context['meal_form'] = MealForm()
@@ -1812,23 +1774,8 @@ class MealItemCreateView(LoginRequiredMixin, CreateView):
         context['meal_plan'] = self.meal.plan
         context['quick_food_form'] = QuickFoodForm()
         
-        # Добавляем данные о продуктах для JavaScript
-        # Получаем все доступные продукты
-        foods = Food.objects.filter(
-            Q(is_custom=False) | Q(is_custom=True, user=self.request.user)
-        )
-        # Преобразуем в JSON для передачи в шаблон
-        foods_json = []
-        for food in foods:
-            foods_json.append({
-                'id': food.id,
-                'name': food.name,
-                'calories': food.calories,
-                'protein': food.protein,
-                'fat': food.fats,
-                'carbs': food.carbs
-            })
-        context['foods_json'] = json.dumps(foods_json)
+        # Добавляем данные о продуктах для JavaScript из индекса каталога
+        context['foods_json'] = get_food_index().foods_json(self.request.user.id)
         
         return context
     
@@ -1853,23 +1800,8 @@ class MealItemUpdateView(LoginRequiredMixin, UpdateView):
         context['meal'] = self.object.meal
         context['meal_plan'] = self.object.meal.plan
         
-        # Добавляем данные о продуктах для JavaScript
-        # Получаем все доступные продукты
-        foods = Food.objects.filter(
-            Q(is_custom=False) | Q(is_custom=True, user=self.request.user)
-        )
-        # Преобразуем в JSON для передачи в шаблон
-        foods_json = []
-        for food in foods:
-            foods_json.append({
-                'id': food.id,
-                'name': food.name,
-                'calories': food.calories,
-                'protein': food.protein,
-                'fat': food.fats,
-                'carbs': food.carbs
-            })
-        context['foods_json'] = json.dumps(foods_json)
+        # Добавляем данные о продуктах для JavaScript из индекса каталога
+        context['foods_json'] = get_food_index().foods_json(self.request.user.id)
         
         return context
     
@@ -1893,42 +1825,21 @@ class FoodListView(ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        queryset = Food.objects.filter(Q(is_custom=False) | Q(is_custom=True, user=self.request.user))
-        
-        # Поиск
+        # Поиск и фильтрация идут по индексу каталога в памяти,
+        # из базы загружаются только продукты текущей страницы
+        index = get_food_index()
         search_query = self.request.GET.get('search', '').strip()
-        if search_query:
-            print(f"Поисковый запрос: '{search_query}'")
-            # Улучшенный поиск - делаем "грубое" сравнение строк с неявной кодировкой
-            matching_foods = []
-            search_query_lower = search_query.lower()
-            print(f"Поисковый запрос в нижнем регистре: '{search_query_lower}'")
-            
-            for food in queryset:
-                # Преобразуем имя продукта в нижний регистр для сравнения
-                food_name_lower = food.name.lower()
-                
-                # Если поисковый запрос содержится в имени продукта
-                if search_query_lower in food_name_lower:
-                    matching_foods.append(food.id)
-                    print(f"Найдено совпадение: '{food.name}' (ID: {food.id})")
-            
-            # Фильтруем queryset по найденным ID
-            if matching_foods:
-                print(f"Найдено {len(matching_foods)} совпадений с помощью улучшенного поиска")
-                queryset = queryset.filter(id__in=matching_foods)
-            else:
-                # Если ничего не найдено с нашим методом, все равно попробуем стандартный
-                print("Улучшенный поиск не дал результатов, пробуем стандартный")
-                queryset = queryset.filter(name__icontains=search_query)
-                print(f"Стандартный поиск вернул {queryset.count()} результатов")
-        
-        # Фильтрация по категории
         category_id = self.request.GET.get('category', '')
-        if category_id and category_id.isdigit():
-            queryset = queryset.filter(category_id=category_id)
+        category_id = int(category_id) if category_id.isdigit() else None
         
-        return queryset.order_by('name')
+        positions = index.search(search_query, self.request.user.id, category_id)
+        if search_query:
+            # Для списка совпадения показываем по алфавиту
+            positions = sorted(positions)
+        return IndexedQuerySet(
+            (index.ids[position] for position in positions),
+            Food.objects.select_related('category'),
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1937,15 +1848,10 @@ class FoodListView(ListView):
         context['selected_category'] = self.request.GET.get('category', '')
         
         # Подсчитываем количество продуктов в каждой категории
-        categories_with_counts = []
-        for category in context['categories']:
-            count = Food.objects.filter(
-                Q(category=category) & 
-                (Q(is_custom=False) | Q(is_custom=True, user=self.request.user))
-            ).count()
-            categories_with_counts.append((category, count))
-        
-        context['categories_with_counts'] = categories_with_counts
+        counts = get_food_index().category_counts(self.request.user.id)
+        context['categories_with_counts'] = [
+            (category, counts.get(category.id, 0)) for category in context['categories']
+        ]
         
         return context
 
@@ -1999,15 +1905,10 @@ class FoodCategoryListView(ListView):
         context = super().get_context_data(**kwargs)
         
         # Подсчитываем количество продуктов в каждой категории
-        categories_with_counts = []
-        for category in context['categories']:
-            count = Food.objects.filter(
-                Q(category=category) & 
-                (Q(is_custom=False) | Q(is_custom=True, user=self.request.user))
-            ).count()
-            categories_with_counts.append((category, count))
-        
-        context['categories_with_counts'] = categories_with_counts
+        counts = get_food_index().category_counts(self.request.user.id)
+        context['categories_with_counts'] = [
+            (category, counts.get(category.id, 0)) for category in context['categories']
+        ]
         
         return context
 
@@ -2126,50 +2027,15 @@ def nutrition_calculate_api(request):
 
 @login_required
 def food_search_api(request):
-    """API для поиска продуктов"""
+    """API для поиска продуктов (отвечает из индекса каталога без запросов к базе)"""
     if request.method == 'GET':
         query = request.GET.get('query', '').strip()
         category_id = request.GET.get('category', '')
+        category_id = int(category_id) if category_id.isdigit() else None
         
-        queryset = Food.objects.filter(Q(is_custom=False) | Q(is_custom=True, user=request.user))
-        
-        if query:
-            # Улучшенный поиск - делаем "грубое" сравнение строк с неявной кодировкой
-            matching_foods = []
-            query_lower = query.lower()
-            
-            for food in queryset:
-                # Преобразуем имя продукта в нижний регистр для сравнения
-                food_name_lower = food.name.lower()
-                
-                # Если поисковый запрос содержится в имени продукта
-                if query_lower in food_name_lower:
-                    matching_foods.append(food.id)
-            
-            # Фильтруем queryset по найденным ID
-            if matching_foods:
-                queryset = queryset.filter(id__in=matching_foods)
-            else:
-                # Если ничего не найдено с нашим методом, все равно попробуем стандартный
-                queryset = queryset.filter(name__icontains=query)
-        
-        if category_id and category_id.isdigit():
-            queryset = queryset.filter(category_id=category_id)
-        
-        foods = []
-        for food in queryset[:20]:  # Ограничиваем результаты
-            foods.append({
-                'id': food.id,
-                'name': food.name,
-                'calories': food.calories,
-                'protein': food.protein,
-                'fats': food.fats,
-                'carbs': food.carbs,
-                'category': {
-                    'id': food.category.id,
-                    'name': food.category.name
-                }
-            })
+        index = get_food_index()
+        positions = index.search(query, request.user.id, category_id, limit=20)  # Ограничиваем результаты
+        foods = [index.as_dict(position) for position in positions]
         
         return JsonResponse({'foods': foods})
     
@@ -2225,650 +2091,40 @@ def meal_plan_auto_fill(request, meal_plan_id):
     - Основные приемы пищи имеют структуру: белок + крупа/картофель + овощи/фрукты
     - Перекусы состоят из легких продуктов (йогурт, фрукты, орехи)
     """
-    print(f"Получен запрос на автозаполнение плана {meal_plan_id} от пользователя {request.user}")
-    print(f"Метод запроса: {request.method}")
-    
     if request.method != 'POST':
-        print("Ошибка: Метод запроса не POST")
         messages.error(request, 'Требуется POST запрос')
         return redirect('meal_plan_detail', pk=meal_plan_id)
     
     # Получаем план питания
     try:
         meal_plan = MealPlan.objects.get(pk=meal_plan_id, user=request.user)
-        print(f"План питания найден: {meal_plan.name}")
     except MealPlan.DoesNotExist:
-        print(f"Ошибка: План питания с ID {meal_plan_id} не найден")
+        logger.info('Автозаполнение: план %s пользователя %s не найден', meal_plan_id, request.user.id)
         messages.error(request, 'План питания не найден')
         return redirect('meal_plan_list')
     
     # Получаем цель по питанию
     nutrition_goal = meal_plan.nutrition_goal
     if not nutrition_goal:
-        print("Ошибка: Отсутствует цель по питанию для этого плана")
         messages.error(request, 'Для автозаполнения необходимо указать цель по питанию')
         return redirect('meal_plan_detail', pk=meal_plan_id)
     
-    # Получаем все продукты
-    foods = Food.objects.all()
-    if foods.count() < 5:
-        print("Ошибка: Недостаточно продуктов в базе данных")
+    # Каталог продуктов берется из индекса в памяти
+    optimizer = MealPlanOptimizer(get_food_index(), user_id=request.user.id, seed=meal_plan.pk)
+    if optimizer.size < 5:
+        logger.warning('Автозаполнение плана %s: в каталоге только %d продуктов', meal_plan_id, optimizer.size)
         messages.error(request, 'Для автозаполнения необходимо добавить хотя бы 5 продуктов')
         return redirect('meal_plan_detail', pk=meal_plan_id)
     
-    # Получаем все приемы пищи плана
-    meals = Meal.objects.filter(plan=meal_plan)
-    
-    # Распределение макронутриентов по приемам пищи
-    meal_distribution = {
-        'breakfast': {'calories': 0.25, 'protein': 0.25, 'fats': 0.2, 'carbs': 0.3},
-        'lunch': {'calories': 0.35, 'protein': 0.35, 'fats': 0.3, 'carbs': 0.35},
-        'dinner': {'calories': 0.3, 'protein': 0.3, 'fats': 0.35, 'carbs': 0.25},
-        'snack': {'calories': 0.1, 'protein': 0.1, 'fats': 0.15, 'carbs': 0.1},
-    }
-    
-    # Удаляем все существующие продукты из приемов пищи
-    MealItem.objects.filter(meal__in=meals).delete()
-    print("Удалены все существующие продукты из плана питания")
-    
-    # Распределяем продукты по приемам пищи
-    for meal in meals:
-        meal_type = meal.meal_type
-        if meal_type not in meal_distribution:
-            continue
-        
-        distribution = meal_distribution[meal_type]
-        
-        # Вычисляем целевые значения для этого приема пищи
-        target_calories = nutrition_goal.target_calories * distribution['calories']
-        target_protein = nutrition_goal.protein_daily * distribution['protein']
-        target_fats = nutrition_goal.fats_daily * distribution['fats']
-        target_carbs = nutrition_goal.carbs_daily * distribution['carbs']
-        
-        print(f"Подбор продуктов для {meal.get_meal_type_display()} на {meal.get_day_of_week_display()}")
-        print(f"Целевые значения: К: {target_calories:.1f} ккал, Б: {target_protein:.1f}г, Ж: {target_fats:.1f}г, У: {target_carbs:.1f}г")
-        
-        # Подбираем продукты для этого приема пищи
-        selected_foods = get_foods_for_meal(foods, target_calories, target_protein, target_fats, target_carbs)
-        
-        # Добавляем выбранные продукты в прием пищи
-        for food, amount in selected_foods:
-            # Создаем элемент приема пищи
-            MealItem.objects.create(
-                meal=meal,
-                food=food,
-                amount=amount,
-            )
-            print(f"Добавлен продукт {food.name} ({amount}г) к {meal.get_meal_type_display()} на {meal.get_day_of_week_display()}")
+    # Получаем все приемы пищи плана и подбираем продукты сразу на всю неделю
+    meals = list(Meal.objects.filter(plan=meal_plan))
+    selection = optimizer.fill_week(meals, nutrition_goal)
     
-    print("Автозаполнение плана питания завершено")
+    # Неизменившиеся продукты остаются, остальные заменяются одной транзакцией
+    created, updated, deleted = replace_plan_contents(meals, selection)
+    logger.info(
+        'Автозаполнение плана %s: продуктов добавлено %d, изменено %d, удалено %d',
+        meal_plan_id, created, updated, deleted,
+    )
     
     return redirect('meal_plan_detail', pk=meal_plan_id)
-
-def get_foods_for_meal(foods, target_calories, target_protein, target_fats, target_carbs):
-    """
-    Функция подбора продуктов для приема пищи
-    с учетом целевых показателей по КБЖУ
-    и следующих правил совместимости:
-    - В один прием пищи нельзя добавлять два разных вида мяса
-    - В один прием пищи нельзя добавлять мясо и рыбу одновременно
-    - В один прием пищи можно добавлять только один вид рыбы
-    - В один прием пищи можно добавлять только один вид крупы
-    - Основные приемы пищи должны иметь структуру: белок + крупа/картофель + овощи/фрукты
-    - Перекусы должны быть легкими (йогурт, фрукты, орехи)
-    """
-    import random
-    
-    print(f"Целевые значения: Калории: {target_calories:.1f}, Белки: {target_protein:.1f}г, Жиры: {target_fats:.1f}г, Углеводы: {target_carbs:.1f}г")
-    
-    # Получаем категории продуктов по их названиям
-    meat_categories = list(FoodCategory.objects.filter(name__icontains='Мясо'))
-    fish_categories = list(FoodCategory.objects.filter(name__icontains='Рыба'))
-    grains_categories = list(FoodCategory.objects.filter(name__icontains='Крупы'))
-    vegetable_categories = list(FoodCategory.objects.filter(name__icontains='Овощи'))
-    fruit_categories = list(FoodCategory.objects.filter(name__icontains='Фрукты'))
-    dairy_categories = list(FoodCategory.objects.filter(name__icontains='Молоч'))
-    nuts_categories = list(FoodCategory.objects.filter(name__icontains='Орехи'))
-    
-    # Получаем идентификаторы категорий для удобного поиска
-    meat_category_ids = [cat.id for cat in meat_categories]
-    fish_category_ids = [cat.id for cat in fish_categories]
-    grains_category_ids = [cat.id for cat in grains_categories]
-    vegetable_category_ids = [cat.id for cat in vegetable_categories]
-    fruit_category_ids = [cat.id for cat in fruit_categories]
-    dairy_category_ids = [cat.id for cat in dairy_categories]
-    nuts_category_ids = [cat.id for cat in nuts_categories]
-    
-    print(f"Категории мяса: {meat_category_ids}")
-    print(f"Категории рыбы: {fish_category_ids}")
-    print(f"Категории круп: {grains_category_ids}")
-    print(f"Категории овощей: {vegetable_category_ids}")
-    print(f"Категории фруктов: {fruit_category_ids}")
-    print(f"Категории молочных: {dairy_category_ids}")
-    print(f"Категории орехов: {nuts_category_ids}")
-    
-    # Если категории не найдены, установим их вручную на основе известных названий
-    if not meat_category_ids:
-        meat_categories_by_name = FoodCategory.objects.filter(name__in=["Мясо и птица", "Мясо"])
-        meat_category_ids = [cat.id for cat in meat_categories_by_name]
-    
-    if not fish_category_ids:
-        fish_categories_by_name = FoodCategory.objects.filter(name__in=["Рыба и морепродукты", "Рыба", "Морепродукты"])
-        fish_category_ids = [cat.id for cat in fish_categories_by_name]
-    
-    if not grains_category_ids:
-        grains_categories_by_name = FoodCategory.objects.filter(name__in=["Крупы и злаки", "Крупы", "Злаки"])
-        grains_category_ids = [cat.id for cat in grains_categories_by_name]
-        
-    if not vegetable_category_ids:
-        vegetable_categories_by_name = FoodCategory.objects.filter(name__in=["Овощи"])
-        vegetable_category_ids = [cat.id for cat in vegetable_categories_by_name]
-        
-    if not fruit_category_ids:
-        fruit_categories_by_name = FoodCategory.objects.filter(name__in=["Фрукты и ягоды", "Фрукты", "Ягоды"])
-        fruit_category_ids = [cat.id for cat in fruit_categories_by_name]
-        
-    if not dairy_category_ids:
-        dairy_categories_by_name = FoodCategory.objects.filter(name__in=["Молочные продукты", "Молочка"])
-        dairy_category_ids = [cat.id for cat in dairy_categories_by_name]
-        
-    if not nuts_category_ids:
-        nuts_categories_by_name = FoodCategory.objects.filter(name__in=["Орехи и семена", "Орехи"])
-        nuts_category_ids = [cat.id for cat in nuts_categories_by_name]
-    
-    # Определяем, это перекус или основной приём пищи
-    is_snack = target_calories < 300  # Если калорий меньше 300, считаем это перекусом
-    
-    # Проверяем, похоже ли это на завтрак по количеству калорий
-    is_breakfast = 400 <= target_calories <= 700  # Предположительно завтрак по калориям
-    
-    # Отбираем подходящие продукты по типам, берем больше продуктов для лучшего подбора
-    protein_foods = list(foods.filter(protein__gt=10).order_by('?')[:25])  # продукты с высоким содержанием белка
-    fat_foods = list(foods.filter(fats__gt=10).order_by('?')[:25])  # продукты с высоким содержанием жиров
-    carb_foods = list(foods.filter(carbs__gt=15).order_by('?')[:25])  # продукты с высоким содержанием углеводов
-    
-    # Создаем специализированные списки продуктов для разных категорий
-    meat_foods = list(foods.filter(category_id__in=meat_category_ids).order_by('?')[:15])
-    fish_foods = list(foods.filter(category_id__in=fish_category_ids).order_by('?')[:15])
-    grain_foods = list(foods.filter(category_id__in=grains_category_ids).order_by('?')[:15])
-    vegetable_foods = list(foods.filter(category_id__in=vegetable_category_ids).order_by('?')[:15])
-    fruit_foods = list(foods.filter(category_id__in=fruit_category_ids).order_by('?')[:15])
-    dairy_foods = list(foods.filter(category_id__in=dairy_category_ids).order_by('?')[:15])
-    nuts_foods = list(foods.filter(category_id__in=nuts_category_ids).order_by('?')[:15])
-    
-    # Для перекусов выбираем подходящие продукты
-    snack_foods = dairy_foods + fruit_foods + nuts_foods
-    
-    # Объединяем все продукты, убираем дубликаты и перемешиваем
-    all_foods = protein_foods + fat_foods + carb_foods + vegetable_foods + fruit_foods + dairy_foods + nuts_foods
-    unique_foods = []
-    food_ids = set()
-    
-    for food in all_foods:
-        if food.id not in food_ids:
-            food_ids.add(food.id)
-            unique_foods.append(food)
-    random.shuffle(unique_foods)
-    
-    # Если продуктов меньше 3, не удастся нормально заполнить
-    if len(unique_foods) < 3:
-        return []
-    
-    # Создаем начальную популяцию из потенциальных комбинаций продуктов
-    population_size = 20  # Увеличиваем размер популяции для большего разнообразия
-    population = []
-    
-    for _ in range(population_size):
-        selected_foods = []
-        current_calories = 0
-        current_protein = 0
-        current_fats = 0
-        current_carbs = 0
-        
-        # Отслеживаем, какие категории продуктов уже выбраны
-        has_meat = False
-        has_fish = False
-        has_grain = False
-        has_vegetable = False
-        has_fruit = False
-        has_dairy = False
-        has_nuts = False
-        fish_count = 0
-        grain_count = 0
-        meat_types = set()
-        fish_types = set()
-        grain_types = set()
-        
-        # Структура приема пищи зависит от того, это перекус или основной прием
-        if is_snack:
-            # Перекус: 1-2 легких продукта (молочные, фрукты, орехи)
-            # Добавляем молочный продукт (например, йогурт или кефир)
-            if dairy_foods:
-                food = random.choice(dairy_foods)
-                # Устанавливаем меньшее количество для перекуса
-                amount = random.choice([100, 150, 200])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_dairy = True
-            
-            # Добавляем фрукты или ягоды
-            if fruit_foods and random.random() < 0.7:  # 70% шанс добавить фрукты/ягоды
-                food = random.choice(fruit_foods)
-                amount = random.choice([50, 100, 150])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_fruit = True
-            
-            # Добавляем орехи или семена (небольшое количество)
-            if nuts_foods and random.random() < 0.4:  # 40% шанс добавить орехи/семена
-                food = random.choice(nuts_foods)
-                # Для орехов маленькие порции, т.к. они калорийные
-                amount = random.choice([10, 15, 20])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_nuts = True
-                
-        elif is_breakfast:
-            # Специальная структура для завтрака - реалистичный человеческий завтрак
-            
-            # 1. Сначала добавляем основу для завтрака (каша, хлопья, тосты)
-            if grain_foods and not has_grain and grain_count == 0:
-                # Отбираем подходящие для завтрака крупы (овсянка, хлопья, и т.д.)
-                breakfast_grains = [f for f in grain_foods if any(name in f.name.lower() for name in 
-                                   ["овсян", "хлопья", "мюсли", "каша", "хлеб", "тост", "булк", "рис", "злак"])]
-                
-                if breakfast_grains:
-                    food = random.choice(breakfast_grains)
-                else:
-                    food = random.choice(grain_foods)
-                    
-                # Более крупная порция для основного компонента завтрака
-                amount = random.choice([40, 50, 60])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_grain = True
-                grain_count += 1
-                grain_types.add(food.name)
-                
-            # 2. Добавляем молочный продукт (молоко, йогурт, творог)
-            if dairy_foods and not has_dairy:
-                # Отбираем подходящие для завтрака молочные продукты
-                breakfast_dairy = [f for f in dairy_foods if any(name in f.name.lower() for name in 
-                                  ["молок", "йогурт", "творог", "кефир", "ряженк", "сметан"])]
-                
-                if breakfast_dairy:
-                    food = random.choice(breakfast_dairy)
-                else:
-                    food = random.choice(dairy_foods)
-                    
-                # Типичная порция молочного продукта на завтрак
-                if "молок" in food.name.lower():
-                    amount = random.choice([150, 200, 250])
-                else:
-                    amount = random.choice([100, 150, 200])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_dairy = True
-                
-            # 3. Добавляем фрукты или ягоды как традиционный компонент завтрака
-            if fruit_foods and not has_fruit:
-                food = random.choice(fruit_foods)
-                amount = random.choice([50, 100, 150])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_fruit = True
-                
-            # 4. С некоторой вероятностью добавляем яйца или небольшую порцию белка
-            if random.random() < 0.5:  # 50% шанс
-                # Ищем яйца среди продуктов
-                eggs = [f for f in foods if "яйц" in f.name.lower()]
-                
-                if eggs:
-                    food = random.choice(eggs)
-                    amount = random.choice([25, 50])  # 0.5-1 яйцо
-                elif meat_foods:
-                    # Если нет яиц, добавляем небольшую порцию мяса
-                    food = random.choice(meat_foods)
-                    amount = random.choice([20, 30, 40])  # Маленькая порция
-                else:
-                    # Пропускаем, если нет подходящих продуктов
-                    food = None
-                
-                if food:
-                    selected_foods.append((food, amount))
-                    calorie_factor = amount / 100.0
-                    current_calories += food.calories * calorie_factor
-                    current_protein += food.protein * calorie_factor
-                    current_fats += food.fats * calorie_factor
-                    current_carbs += food.carbs * calorie_factor
-                    
-                    if "яйц" not in food.name.lower() and food.category_id in meat_category_ids:
-                        has_meat = True
-                        meat_types.add(food.name)
-                
-            # 5. С некоторой вероятностью добавляем орехи или сухофрукты
-            if random.random() < 0.3 and nuts_foods:  # 30% шанс
-                food = random.choice(nuts_foods)
-                amount = random.choice([5, 10, 15])  # Небольшая порция
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_nuts = True
-                
-        else:
-            # Основной прием пищи (обед/ужин): белок + крупа/картофель + овощи
-            # 1. Добавляем белковый продукт (мясо или рыба)
-            protein_source = random.choice(['meat', 'fish']) if random.random() < 0.7 else 'none'
-            if protein_source == 'meat' and meat_foods:
-                food = random.choice(meat_foods)
-                # Рассчитываем количество для получения примерно 30-50% от целевого белка
-                protein_fraction = random.uniform(0.3, 0.5)
-                amount_needed = (target_protein * protein_fraction * 100) / max(food.protein, 0.1)
-                # Округляем до ближайшего кратного 20
-                amount = min(max(20, (int(amount_needed // 20) * 20)), 160)
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_meat = True
-                meat_types.add(food.name)
-                
-            elif protein_source == 'fish' and fish_foods:
-                food = random.choice(fish_foods)
-                protein_fraction = random.uniform(0.3, 0.5)
-                amount_needed = (target_protein * protein_fraction * 100) / max(food.protein, 0.1)
-                amount = min(max(20, (int(amount_needed // 20) * 20)), 160)
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_fish = True
-                fish_count += 1
-                fish_types.add(food.name)
-                
-            # 2. Добавляем крупу/картофель (источник углеводов)
-            if grain_foods and not has_grain and grain_count == 0:
-                food = random.choice(grain_foods)
-                carb_fraction = random.uniform(0.3, 0.5)
-                carb_needed = target_carbs - current_carbs
-                amount_needed = (carb_needed * carb_fraction * 100) / max(food.carbs, 0.1)
-                amount = min(max(20, (int(amount_needed // 20) * 20)), 140)
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_grain = True
-                grain_count += 1
-                grain_types.add(food.name)
-                
-            # 3. Добавляем овощи
-            if vegetable_foods and not has_vegetable:
-                food = random.choice(vegetable_foods)
-                amount = random.choice([100, 150, 200])
-                
-                selected_foods.append((food, amount))
-                calorie_factor = amount / 100.0
-                current_calories += food.calories * calorie_factor
-                current_protein += food.protein * calorie_factor
-                current_fats += food.fats * calorie_factor
-                current_carbs += food.carbs * calorie_factor
-                has_vegetable = True
-        
-        # Проверяем дефицит по основным целям
-        calories_deficit = target_calories - current_calories
-        protein_deficit = target_protein - current_protein
-        fats_deficit = target_fats - current_fats
-        carbs_deficit = target_carbs - current_carbs
-        
-        # Если после добавления основных продуктов мы далеки от целевых значений,
-        # пытаемся добавить сбалансированные продукты для коррекции
-        available_foods = [f for f in unique_foods if not any(f.id == sf[0].id for sf in selected_foods)]
-        random.shuffle(available_foods)
-        
-        # Максимум 6 продуктов в приеме пищи (для перекуса - максимум 3)
-        max_foods = 3 if is_snack else 6
-        
-        while len(selected_foods) < max_foods and available_foods:
-            food = available_foods.pop(0)
-            
-            # Проверяем совместимость
-            can_add = True
-            
-            # Проверки для разных категорий продуктов
-            if food.category_id in meat_category_ids:
-                if has_meat or has_fish or food.name in meat_types:
-                    can_add = False
-                else:
-                    has_meat = True
-                    meat_types.add(food.name)
-            elif food.category_id in fish_category_ids:
-                if has_meat or fish_count >= 1:
-                    can_add = False
-                else:
-                    has_fish = True
-                    fish_count += 1
-                    fish_types.add(food.name)
-            elif food.category_id in grains_category_ids:
-                if has_grain or grain_count >= 1 or food.name in grain_types:
-                    can_add = False
-                else:
-                    has_grain = True
-                    grain_count += 1
-                    grain_types.add(food.name)
-                    
-            # Для перекуса добавляем только определенные категории продуктов
-            if is_snack and not (food.category_id in dairy_category_ids or 
-                               food.category_id in fruit_category_ids or 
-                               food.category_id in nuts_category_ids):
-                can_add = False
-            
-            if not can_add:
-                continue
-            
-            # Определяем, какой макронутриент нужно скорректировать больше всего
-            # Используем относительный дефицит (% от цели)
-            protein_rel_deficit = protein_deficit / target_protein if target_protein > 0 else 0
-            fats_rel_deficit = fats_deficit / target_fats if target_fats > 0 else 0
-            carbs_rel_deficit = carbs_deficit / target_carbs if target_carbs > 0 else 0
-            calories_rel_deficit = calories_deficit / target_calories if target_calories > 0 else 0
-            
-            # Если все цели почти достигнуты (в пределах 10%), прекращаем добавлять продукты
-            if all(abs(d) < 0.1 for d in [protein_rel_deficit, fats_rel_deficit, carbs_rel_deficit, calories_rel_deficit]):
-                break
-            
-            # Определяем размер порции в зависимости от категории продукта и дефицита
-            if is_snack:
-                # Для перекуса - небольшие порции
-                if food.category_id in dairy_category_ids:
-                    amount = random.choice([100, 150, 200])
-                elif food.category_id in fruit_category_ids:
-                    amount = random.choice([50, 100, 150])
-                elif food.category_id in nuts_category_ids:
-                    amount = random.choice([10, 15, 20])
-                else:
-                    amount = random.choice([20, 30, 50])
-            else:
-                # Для основного приема
-                if protein_rel_deficit > 0.15 and food.protein > 5:
-                    # Нужен белок
-                    amount_needed = (protein_deficit * 0.5 * 100) / food.protein
-                    amount = min(max(20, (int(amount_needed // 20) * 20)), 120)
-                elif fats_rel_deficit > 0.15 and food.fats > 5:
-                    # Нужны жиры
-                    amount_needed = (fats_deficit * 0.5 * 100) / food.fats
-                    amount = min(max(20, (int(amount_needed // 20) * 20)), 120)
-                elif carbs_rel_deficit > 0.15 and food.carbs > 5:
-                    # Нужны углеводы
-                    amount_needed = (carbs_deficit * 0.5 * 100) / food.carbs
-                    amount = min(max(20, (int(amount_needed // 20) * 20)), 120)
-                else:
-                    # Берем средний вес
-                    amount = random.choice([20, 40, 60])
-            
-            if amount >= 10:  # Минимальная порция 10г
-                calorie_factor = amount / 100.0
-                new_calories = current_calories + food.calories * calorie_factor
-                new_protein = current_protein + food.protein * calorie_factor
-                new_fats = current_fats + food.fats * calorie_factor
-                new_carbs = current_carbs + food.carbs * calorie_factor
-                
-                # Проверка на улучшение баланса макронутриентов
-                # Мы хотим, чтобы добавление продукта улучшало общий баланс
-                current_error = (
-                    abs(calories_deficit / target_calories) * 1.5 + 
-                    abs(protein_deficit / target_protein) + 
-                    abs(fats_deficit / target_fats) + 
-                    abs(carbs_deficit / target_carbs)
-                ) / 4
-                
-                new_error = (
-                    abs((target_calories - new_calories) / target_calories) * 1.5 + 
-                    abs((target_protein - new_protein) / target_protein) + 
-                    abs((target_fats - new_fats) / target_fats) + 
-                    abs((target_carbs - new_carbs) / target_carbs)
-                ) / 4
-                
-                # Если новая ошибка меньше текущей, добавляем продукт в список
-                if new_error < current_error:
-                    selected_foods.append((food, amount))
-                    current_calories = new_calories
-                    current_protein = new_protein
-                    current_fats = new_fats
-                    current_carbs = new_carbs
-                    
-                    # Обновляем информацию о дефиците
-                    calories_deficit = target_calories - current_calories
-                    protein_deficit = target_protein - current_protein
-                    fats_deficit = target_fats - current_fats
-                    carbs_deficit = target_carbs - current_carbs
-        
-        # Рассчитываем "фитнес" этой комбинации (насколько она близка к цели)
-        # Меньшее значение = лучше
-        fitness = (
-            abs(current_calories - target_calories) / target_calories * 1.5 +  # Больший вес для калорий
-            abs(current_protein - target_protein) / target_protein +
-            abs(current_fats - target_fats) / target_fats +
-            abs(current_carbs - target_carbs) / target_carbs
-        ) / 4  # Среднее по всем параметрам
-        
-        population.append((selected_foods, fitness))
-    
-    # Сортируем популяцию по фитнесу (от лучшего к худшему)
-    population.sort(key=lambda x: x[1])
-    
-    # Выводим информацию о лучшей комбинации продуктов
-    best_combo, best_fitness = population[0] if population else ([], float('inf'))
-    
-    if best_combo:
-        # Объединяем одинаковые продукты перед возвратом результата
-        combined_foods = {}
-        for food, amount in best_combo:
-            if food.id in combined_foods:
-                # Если продукт уже есть в списке, суммируем количество
-                combined_foods[food.id]['amount'] += amount
-            else:
-                # Если продукта еще нет, добавляем его
-                combined_foods[food.id] = {'food': food, 'amount': amount}
-        
-        # Преобразуем обратно в список кортежей (food, amount)
-        final_combo = [(item['food'], item['amount']) for item in combined_foods.values()]
-        
-        # Еще раз проверяем правила совместимости в финальной комбинации
-        has_meat = False
-        has_fish = False
-        has_grain = False
-        fish_count = 0
-        grain_count = 0
-        meat_types = set()
-        fish_types = set()
-        grain_types = set()
-        final_filtered_combo = []
-        
-        for food, amount in final_combo:
-            should_add = True
-            
-            if food.category_id in meat_category_ids:
-                if has_meat or has_fish or food.name in meat_types:
-                    should_add = False
-                else:
-                    has_meat = True
-                    meat_types.add(food.name)
-            elif food.category_id in fish_category_ids:
-                if has_meat or fish_count >= 1:
-                    should_add = False
-                else:
-                    has_fish = True
-                    fish_count += 1
-                    fish_types.add(food.name)
-            elif food.category_id in grains_category_ids:
-                if has_grain or grain_count >= 1 or food.name in grain_types:
-                    should_add = False
-                else:
-                    has_grain = True
-                    grain_count += 1
-                    grain_types.add(food.name)
-                    
-            if should_add:
-                final_filtered_combo.append((food, amount))
-        
-        # Рассчитываем общие значения для объединенной комбинации
-        total_calories = sum(food.calories * amount / 100.0 for food, amount in final_filtered_combo)
-        total_protein = sum(food.protein * amount / 100.0 for food, amount in final_filtered_combo)
-        total_fats = sum(food.fats * amount / 100.0 for food, amount in final_filtered_combo)
-        total_carbs = sum(food.carbs * amount / 100.0 for food, amount in final_filtered_combo)
-        
-        print(f"Объединенная комбинация (было: {len(best_combo)}, стало: {len(final_filtered_combo)} продуктов):")
-        print(f"Получено: Калории: {total_calories:.1f}, Белки: {total_protein:.1f}г, Жиры: {total_fats:.1f}г, Углеводы: {total_carbs:.1f}г")
-        print(f"Отклонение: К: {abs(total_calories-target_calories)/target_calories*100:.1f}%, Б: {abs(total_protein-target_protein)/target_protein*100:.1f}%, Ж: {abs(total_fats-target_fats)/target_fats*100:.1f}%, У: {abs(total_carbs-target_carbs)/target_carbs*100:.1f}%")
-        
-        # Выводим информацию о объединенных продуктах
-        for food, amount in final_filtered_combo:
-            calorie_factor = amount / 100.0
-            print(f"  • {food.name} ({amount}г): К: {food.calories * calorie_factor:.1f}, Б: {food.protein * calorie_factor:.1f}г, Ж: {food.fats * calorie_factor:.1f}г, У: {food.carbs * calorie_factor:.1f}г")
-        
-        return final_filtered_combo
-    
-    return best_combo